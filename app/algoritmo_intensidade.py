@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from typing import Any
 
+from .estado_compacto import IntensidadesCompactas
+from .metricas import cronometrado
+
 
 def _bucket(valor: float) -> int:
     # bucket simples p/ escolher mensagens (sem stress)
@@ -13,6 +16,10 @@ def _decair_outros(perfil: Any, estado_atual: str) -> None:
     Quando se muda de estado, todos os outros perdem 0.25 até um mínimo de 0.0.
     """
     # isto ajuda a "esquecer" estados antigos de forma gradual
+    if isinstance(perfil.intensidades, IntensidadesCompactas):
+        # O(1): o decaimento dos outros só é aplicado quando forem lidos
+        perfil.intensidades.decair_exceto(estado_atual, 0.25)
+        return
     for est, info in list(perfil.intensidades.items()):
         if est == estado_atual:
             continue
@@ -22,6 +29,7 @@ def _decair_outros(perfil: Any, estado_atual: str) -> None:
             perfil.intensidades[est] = info
 
 
+@cronometrado("intensidade.calcular")
 def calcular_intensidade(perfil: Any, estado: str) -> int:
     """
     Regras:
@@ -37,6 +45,9 @@ def calcular_intensidade(perfil: Any, estado: str) -> int:
     if not hasattr(perfil, "streak_estado"):
         perfil.streak_estado = 0
 
+    if isinstance(perfil.intensidades, IntensidadesCompactas):
+        return _calcular_compacto(perfil, estado)
+
     if perfil.ultimo_estado != estado:
         # mudou de estado -> decay nos outros + boost leve no atual
         _decair_outros(perfil, estado)
@@ -66,3 +77,31 @@ def calcular_intensidade(perfil: Any, estado: str) -> int:
     perfil.intensidades[estado] = info
 
     return _bucket(novo_valor)
+
+
+def _calcular_compacto(perfil: Any, estado: str) -> int:
+    # mesmas regras e mesmas contas de floats, mas sem dicts intermédios;
+    # a posição do estado é resolvida uma vez por chamada
+    intensidades: IntensidadesCompactas = perfil.intensidades
+    i = intensidades.posicao(estado)
+
+    if perfil.ultimo_estado != estado:
+        intensidades.decair_exceto_em(i, 0.25)
+        perfil.ultimo_estado = estado
+        perfil.streak_estado = 1
+        valor = max(0.0, intensidades.valor(i))
+        valor = min(5.0, valor * 1.05)
+        intensidades.definir(i, valor)
+        return _bucket(valor)
+
+    perfil.streak_estado += 1
+    if perfil.streak_estado == 2:
+        mult = 1.25
+    elif perfil.streak_estado == 3:
+        mult = 1.15
+    else:
+        mult = 1.05
+
+    novo_valor = min(5.0, intensidades.valor(i) * mult)
+    intensidades.definir(i, novo_valor)
+    return _bucket(novo_valor)
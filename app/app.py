@@ -1,11 +1,76 @@
 from __future__ import annotations
 
-from .dominio import EntradaSessao
-from .historico import Historico
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from .algoritmo_intensidade import calcular_intensidade
+from .aprendizagem import AprendizagemBasica
+from .concorrencia import ExecutorLimitado, LocksUtilizador
+from .dominio import EntradaSessao, Mensagem
+from .historico import Historico, HistoricoAsync
+from .historico_arquivo import ArquivoHistorico
+from .perfil import PerfilUtilizador
+from .perfil_store_async import IPerfilStoreAsync
 from .pipeline import PipelineBase
 from .mensagens import MensagemCatalogo
 
 
+def registo_sessao(entrada: EntradaSessao, texto: str) -> dict:
+    # o que interessa p/ histórico do utilizador (igual no HelpApp e no AsyncHelpApp)
+    return {
+        "data": getattr(entrada, "data", ""),
+        "estado": entrada.estado,
+        "intensidade": entrada.intensidade,
+        "mensagem": texto,
+    }
+
+
+def registo_perfil(entrada: EntradaSessao, id_mensagem: Optional[str], texto: str) -> dict:
+    """
+    Entrada do histórico do perfil: guarda o id da mensagem em vez do texto
+    (o texto é resolvido ao mostrar, ver ResolvedorMensagens). Sem id, guarda o texto.
+    """
+    registo = {
+        "data": getattr(entrada, "data", ""),
+        "estado": entrada.estado,
+        "intensidade": entrada.intensidade,
+    }
+    if id_mensagem is None:
+        registo["mensagem"] = texto
+    else:
+        registo["id"] = id_mensagem
+    return registo
+
+
+def _passo_sessao(
+    pipeline: PipelineBase, msg: Mensagem, entrada: EntradaSessao, com_id: bool = False
+) -> tuple[Optional[str], str, dict]:
+    """
+    Uma sessão, comum ao HelpApp e ao AsyncHelpApp: (id da mensagem ou None, texto, registo do Historico).
+    Cada classe só faz o registar (direto ou com await).
+    """
+    if com_id:
+        id_mensagem, texto = pipeline.processar_com_id(msg, entrada)
+    else:
+        id_mensagem, texto = None, pipeline.processar(msg, entrada)
+    return id_mensagem, texto, registo_sessao(entrada, texto)
+
+
+def _passos_lote(
+    pipeline: PipelineBase, msg: Mensagem, entradas: Iterable[EntradaSessao], tamanho_bloco: int
+) -> Iterator[tuple[list[str], list[dict]]]:
+    """
+    correr_sessoes dos dois HelpApp: consome as entradas aos blocos e dá (textos, registos) de cada um,
+    por isso a memória não cresce com o total.
+    """
+    it = iter(entradas)
+    while True:
+        bloco = list(islice(it, tamanho_bloco))
+        if not bloco:
+            return
+        textos = pipeline.processar_lote(msg, bloco)
+        yield textos, [registo_sessao(e, t) for e, t in zip(bloco, textos)]
+
 
 class HelpApp:
     def __init__(self, pipeline: PipelineBase, historico: Historico):
@@ -13,17 +78,101 @@ class HelpApp:
         self.historico = historico
 
     def correr_sessao(self, msg: MensagemCatalogo, entrada: EntradaSessao) -> str:
-        texto = self.pipeline.processar(msg, entrada)
-        # guardamos o que interessa p/ histórico do utilizador
-        self.historico.registar(
-            {
-                "data": getattr(entrada, "data", ""),
-                "estado": entrada.estado,
-                "intensidade": entrada.intensidade,
-                "mensagem": texto,
-            }
-        )
+        _, texto, registo = _passo_sessao(self.pipeline, msg, entrada)
+        self.historico.registar(registo)
         return texto
 
+    def correr_sessao_com_id(self, msg: MensagemCatalogo, entrada: EntradaSessao) -> tuple[Optional[str], str]:
+        """
+        Como correr_sessao, mas devolve também o id da mensagem (para registo_perfil).
+        """
+        id_mensagem, texto, registo = _passo_sessao(self.pipeline, msg, entrada, com_id=True)
+        self.historico.registar(registo)
+        return id_mensagem, texto
+
+    def correr_sessoes(
+        self, msg: MensagemCatalogo, entradas: Iterable[EntradaSessao], tamanho_bloco: int = 1024
+    ) -> Iterator[str]:
+        """
+        Versão em lote de correr_sessao (replays/imports offline).
+        Consome as entradas aos blocos, por isso a memória não cresce com o total.
+        """
+        for textos, registos in _passos_lote(self.pipeline, msg, entradas, tamanho_bloco):
+            self.historico.registar_lote(registos)
+            yield from textos
+
     def ver_historico(self, n: int = 5) -> list[str]:
         return self.historico.obter_ultimas(n)
+
+
+class AsyncHelpApp:
+    """
+    HelpApp para asyncio (muitos utilizadores num só processo, sem uma thread por utilizador).
+    - o pipeline corre no loop (é só CPU e rápido);
+    - histórico e perfis são async (ex: PersistenciaAsync/PerfilStoreAsync, I/O no executor);
+    - as operações do mesmo utilizador são serializadas por um asyncio.Lock próprio.
+
+    sessao() faz o ciclo completo do main.py: carregar perfil -> intensidade -> mensagem ->
+    aprendizagem -> histórico do perfil -> guardar. criar_mensagem(perfil) dá a Mensagem a usar.
+    """
+
+    def __init__(
+        self,
+        pipeline: PipelineBase,
+        historico: HistoricoAsync,
+        store: Optional[IPerfilStoreAsync] = None,
+        criar_mensagem: Optional[Callable[[PerfilUtilizador], Mensagem]] = None,
+        aprendizagem: Optional[AprendizagemBasica] = None,
+        arquivo: Optional[ArquivoHistorico] = None,
+        executor: Optional[ExecutorLimitado] = None,
+    ):
+        self.pipeline = pipeline
+        self.historico = historico
+        self.store = store
+        self.criar_mensagem = criar_mensagem
+        self.aprendizagem = aprendizagem or AprendizagemBasica()
+        self.arquivo = arquivo
+        self.executor = executor
+        self.locks = LocksUtilizador()
+
+    async def correr_sessao(self, msg: Mensagem, entrada: EntradaSessao) -> str:
+        async with self.locks.lock(entrada.utilizador):
+            _, texto, registo = _passo_sessao(self.pipeline, msg, entrada)
+            await self.historico.registar(registo)
+        return texto
+
+    async def correr_sessoes(
+        self, msg: Mensagem, entradas: Iterable[EntradaSessao], tamanho_bloco: int = 1024
+    ) -> AsyncIterator[str]:
+        # lote offline: não passa pelos locks por utilizador (mesma semântica que HelpApp.correr_sessoes)
+        for textos, registos in _passos_lote(self.pipeline, msg, entradas, tamanho_bloco):
+            await self.historico.registar_lote(registos)
+            for t in textos:
+                yield t
+
+    async def ver_historico(self, n: int = 5) -> list[dict]:
+        return await self.historico.obter_ultimas(n)
+
+    async def sessao(self, nome: str, estado: str) -> tuple[PerfilUtilizador, EntradaSessao, str]:
+        if self.store is None or self.criar_mensagem is None:
+            raise RuntimeError("AsyncHelpApp.sessao precisa de store e criar_mensagem")
+
+        async with self.locks.lock(nome):
+            perfil = await self.store.carregar(nome)
+            intensidade = calcular_intensidade(perfil, estado)
+            entrada = EntradaSessao(estado=estado, intensidade=intensidade, utilizador=perfil.nome)
+
+            id_mensagem, texto, registo = _passo_sessao(
+                self.pipeline, self.criar_mensagem(perfil), entrada, com_id=True
+            )
+            await self.historico.registar(registo)
+
+            self.aprendizagem.atualizar(perfil, entrada)
+            perfil.historico.append(registo_perfil(entrada, id_mensagem, texto))
+            if self.arquivo is not None:
+                if self.executor is not None:
+                    await self.executor.correr(self.arquivo.limitar, perfil)
+                else:
+                    self.arquivo.limitar(perfil)
+            await self.store.guardar(perfil)
+        return perfil, entrada, texto
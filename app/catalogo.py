@@ -1,21 +1,122 @@
 from __future__ import annotations
-import json
-import hashlib
 import unicodedata
 from pathlib import Path
-from typing import Dict, List
+from typing import Iterator, Optional, Sequence
 
 from .dominio import EntradaSessao
+from .catalogo_binario import FonteBinaria, FonteJSON, arquivar_versao, chave_grupo, garantir_compilado
+from .metricas import cronometrado
+from .seletores import ISeletor, SeletorMistura
+
+MENSAGEM_VAZIA = "Estou aqui contigo. Vamos com calma."
+
+
+def _k_esimo_livre(mascara: int, k: int) -> int:
+    # posição do k-ésimo bit a 0 (k começa em 0); custo limitado ao tamanho do grupo
+    pos = 0
+    while True:
+        if not (mascara >> pos) & 1:
+            if k == 0:
+                return pos
+            k -= 1
+        pos += 1
+
+
+def texto_de_id(fonte: FonteBinaria | FonteJSON, id_mensagem: str) -> Optional[str]:
+    """
+    Texto (antes do pipeline) de um id "versão:estado:grupo:índice" numa fonte;
+    None se o id for de outra versão ou não existir nela.
+    """
+    versao, _, resto = id_mensagem.partition(":")
+    if versao != fonte.versao:
+        return None
+    try:
+        estado, chave, idx = resto.rsplit(":", 2)
+        idx = int(idx)
+    except ValueError:
+        return None
+    if idx < 0:
+        return MENSAGEM_VAZIA
+    inicio, n = fonte.indice.get(estado, {}).get(chave, (0, 0))
+    return fonte.texto(inicio + idx) if idx < n else None
 
 
 class CatalogoMensagens:
-    def __init__(self, json_path: str | Path):
+    def __init__(
+        self,
+        json_path: str | Path,
+        compilado: bool = False,
+        bin_path: str | Path | None = None,
+        seletor: ISeletor | None = None,
+        pre_normalizar: bool = False,
+        fonte: FonteBinaria | FonteJSON | None = None,
+    ):
+        """
+        compilado=True usa o binário (mmap) gerado a partir do JSON,
+        recompilado automaticamente quando o JSON muda.
+        seletor escolhe o índice dentro do grupo (default: SeletorMistura).
+        pre_normalizar=True aplica normalizar_texto a todo o catálogo ao carregar.
+        fonte: fonte já aberta (ex: FontePartilhada); o JSON não é lido.
+        """
         self._path = Path(json_path)
-        with self._path.open("r", encoding="utf-8") as f:
-            self._data: Dict[str, List[str]] = json.load(f)
+        self.seletor = seletor or SeletorMistura()
+        self._compilado = compilado
+        self._bin_path = bin_path
+        self._pre_normalizar = pre_normalizar
+        # snapshot imutável (índice + textos); cada chamada lê self._fonte uma só vez,
+        # por isso trocá-la (ver CatalogoRecarregavel) não precisa de lock
+        self._fonte = fonte if fonte is not None else self._abrir_fonte()
+
+    def _abrir_fonte(self) -> FonteBinaria | FonteJSON:
+        if self._compilado:
+            try:
+                bin_path = garantir_compilado(self._path, self._bin_path, self._pre_normalizar)
+                return FonteBinaria(bin_path, self._pre_normalizar)
+            except OSError:
+                # ex: pasta só de leitura -> volta ao JSON
+                pass
+        return FonteJSON(self._path, self._pre_normalizar)
+
+    def fechar(self) -> None:
+        self._fonte.fechar()
+
+    @property
+    def versao(self) -> str:
+        """
+        Muda sempre que o conteúdo do JSON muda (hash); faz parte dos ids das mensagens.
+        """
+        return self._fonte.versao
+
+    def id_mensagem(self, estado: str, chave: str, idx: int) -> str:
+        # versão:estado:grupo:índice (índice -1 = mensagem de recurso)
+        return self._id(self._fonte, estado, chave, idx)
+
+    def texto_por_id(self, id_mensagem: str) -> Optional[str]:
+        """
+        Inverso de obter_com_id: texto de um id desta versão do catálogo (None se não for).
+        """
+        return texto_de_id(self._fonte, id_mensagem)
+
+    def iterar_com_id(self) -> Iterator[tuple[str, str, str]]:
+        # (estado, id, texto) de todas as mensagens da versão atual
+        fonte = self._fonte
+        for estado, grupos in fonte.indice.items():
+            for chave, (inicio, n) in grupos.items():
+                for idx in range(n):
+                    yield estado, self._id(fonte, estado, chave, idx), fonte.texto(inicio + idx)
+
+    def guardar_versao(self, pasta: str | Path) -> Path:
+        """
+        Cópia compilada desta versão em pasta/<versao>.bin (ver ResolvedorMensagens).
+        """
+        return arquivar_versao(self._path, pasta, self._pre_normalizar, self.versao)
 
     def estados(self) -> list[str]:
-        return sorted(self._data.keys())
+        return sorted(self._fonte.indice.keys())
+
+    @staticmethod
+    def _id(fonte: FonteBinaria | FonteJSON, estado: str, chave: str, idx: int) -> str:
+        return f"{fonte.versao}:{estado}:{chave}:{idx}"
     
     def normalizar_estado(self, estado:str) -> str:
         estado = estado.strip().lower()
@@ -33,30 +134,123 @@ class CatalogoMensagens:
         return mapa.get(estado, estado)
 
     def validar_minimo(self, estados: list[str], minimo: int = 50) -> None:
-        for estado in estados:
-            msgs = self._data.get(estado, {})
-            total = 0
+        self._validar(self._fonte, estados, minimo)
 
-            if isinstance(msgs, dict):
-                for _, lst in msgs.items():
-                    total += len(lst)
-            else:
-                total = len(msgs)
+    @staticmethod
+    def _validar(fonte: FonteBinaria | FonteJSON, estados: list[str], minimo: int) -> None:
+        for estado in estados:
+            grupos = fonte.indice.get(estado, {})
+            total = sum(n for _, n in grupos.values())
 
             if total < minimo:
                 raise ValueError(f"Estado '{estado}' tem {total} mensagens (minimo {minimo}).")
 
+    @cronometrado("catalogo.obter")
     def obter(self, estado: str, entrada: EntradaSessao) -> str:
-        msgs = self._data.get(estado, [])
-        if isinstance(msgs, dict):
-            # intensidade vem em 1..5, escolhemos o grupo certo
-            msgs = msgs.get(str(max(1, min(5, entrada.intensidade))), [])
-        if not msgs:
-            return "Estou aqui contigo. Vamos com calma."
+        fonte = self._fonte
+        inicio, n = self._grupo(fonte, estado, entrada.intensidade)
+        if not n:
+            return MENSAGEM_VAZIA
 
         # determinístico por entrada (muda com o timestamp da sessão)
-        data = getattr(entrada, "data", "")
-        chave = f"{estado}|{entrada.intensidade}|{getattr(entrada, 'utilizador', '')}|{data}"
-        h = hashlib.sha256(chave.encode("utf-8")).hexdigest()
-        idx = int(h[:8], 16) % len(msgs)
-        return str(msgs[idx]).strip()
+        idx = self.seletor.escolher(estado, entrada, n)
+        return fonte.texto(inicio + idx)
+
+    @cronometrado("catalogo.obter")
+    def obter_com_id(self, estado: str, entrada: EntradaSessao) -> tuple[str, str]:
+        """
+        Como obter, mas devolve também o id estável da mensagem (ver id_mensagem).
+        """
+        fonte = self._fonte
+        chave, inicio, n = self._grupo_chave(fonte, estado, entrada.intensidade)
+        if not n:
+            return self._id(fonte, estado, chave, -1), MENSAGEM_VAZIA
+        idx = self.seletor.escolher(estado, entrada, n)
+        return self._id(fonte, estado, chave, idx), fonte.texto(inicio + idx)
+
+    def obter_sem_repeticao(self, estado: str, entrada: EntradaSessao, vistas: dict[str, str]) -> str:
+        """
+        Igual a obter, mas não repete mensagens do mesmo grupo até as esgotar.
+        vistas guarda um bitset (hex) e a última mensagem por "estado|grupo" e é atualizado aqui.
+        """
+        return self.obter_sem_repeticao_com_id(estado, entrada, vistas)[1]
+
+    @cronometrado("catalogo.obter_sem_repeticao")
+    def obter_sem_repeticao_com_id(
+        self, estado: str, entrada: EntradaSessao, vistas: dict[str, str]
+    ) -> tuple[str, str]:
+        fonte = self._fonte
+        chave, inicio, n = self._grupo_chave(fonte, estado, entrada.intensidade)
+        if not n:
+            return self._id(fonte, estado, chave, -1), MENSAGEM_VAZIA
+
+        chave_vistas = f"{estado}|{chave}"
+        cheio = (1 << n) - 1
+        # "<bitset hex>:<último índice>" (perfis antigos só têm o bitset)
+        bits, _, ultimo = vistas.get(chave_vistas, "0").partition(":")
+        mascara = int(bits, 16) & cheio
+        if mascara == cheio:
+            # grupo esgotado -> recomeça a rotação, mas sem a última mostrada:
+            # senão podia sair a mesma frase duas vezes seguidas
+            mascara = 0
+            if ultimo and n > 1 and int(ultimo) < n:
+                mascara = 1 << int(ultimo)
+
+        livres = n - mascara.bit_count()
+        k = self.seletor.escolher(estado, entrada, livres)
+        idx = _k_esimo_livre(mascara, k)
+
+        vistas[chave_vistas] = f"{mascara | (1 << idx):x}:{idx}"
+        return self._id(fonte, estado, chave, idx), fonte.texto(inicio + idx)
+
+    @staticmethod
+    def _grupo(fonte: FonteBinaria | FonteJSON, estado: str, intensidade: int) -> tuple[int, int]:
+        grupos = fonte.indice.get(estado, {})
+        # intensidade vem em 1..5, escolhemos o grupo certo
+        return grupos.get(chave_grupo(grupos, intensidade), (0, 0))
+
+    @staticmethod
+    def _grupo_chave(fonte: FonteBinaria | FonteJSON, estado: str, intensidade: int) -> tuple[str, int, int]:
+        grupos = fonte.indice.get(estado, {})
+        chave = chave_grupo(grupos, intensidade)
+        inicio, n = grupos.get(chave, (0, 0))
+        return chave, inicio, n
+
+    def _indices_lote(
+        self, fonte: FonteBinaria | FonteJSON, entradas: Sequence[EntradaSessao]
+    ) -> tuple[list[tuple[str, int, int]], list[int]]:
+        grupos = [self._grupo_chave(fonte, e.estado, e.intensidade) for e in entradas]
+        validas = [i for i, (_, _, n) in enumerate(grupos) if n]
+        escolhidos = self.seletor.escolher_lote(
+            [entradas[i] for i in validas], [grupos[i][2] for i in validas]
+        )
+        out = [-1] * len(entradas)
+        for i, idx in zip(validas, escolhidos):
+            out[i] = idx
+        return grupos, out
+
+    def indices_lote(self, entradas: Sequence[EntradaSessao]) -> list[int]:
+        """
+        Índices (dentro do grupo) para muitas entradas de uma vez; -1 se o grupo estiver vazio.
+        """
+        return self._indices_lote(self._fonte, entradas)[1]
+
+    @cronometrado("catalogo.obter_lote")
+    def obter_lote(self, entradas: Sequence[EntradaSessao]) -> list[str]:
+        fonte = self._fonte
+        grupos, indices = self._indices_lote(fonte, entradas)
+        texto = fonte.texto
+        return [
+            MENSAGEM_VAZIA if idx < 0 else texto(inicio + idx)
+            for (_, inicio, _), idx in zip(grupos, indices)
+        ]
+
+    @cronometrado("catalogo.obter_lote")
+    def obter_lote_com_id(self, entradas: Sequence[EntradaSessao]) -> list[tuple[str, str]]:
+        fonte = self._fonte
+        grupos, indices = self._indices_lote(fonte, entradas)
+        texto = fonte.texto
+        return [
+            (self._id(fonte, e.estado, chave, idx), MENSAGEM_VAZIA if idx < 0 else texto(inicio + idx))
+            for e, (chave, inicio, _), idx in zip(entradas, grupos, indices)
+        ]
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .dominio import normalizar_texto
+
+# formato (little-endian):
+#   cabeçalho | índice (JSON pequeno) | offsets u32 (n+1) | blob UTF-8
+# o índice é {estado: {chave: [inicio, n]}}; chave "" = lista sem intensidades
+# cabeçalho: magic, mtime/tamanho/sha256 do JSON, tamanho do índice, nº de textos, flags
+MAGIC = b"HCAT0002"
+_CABECALHO = struct.Struct("<8sqq32sIII")
+# flags: textos já passados por normalizar_texto
+NORMALIZADO = 1
+_OFFSET = struct.Struct("<I")
+
+Indice = Dict[str, Dict[str, Tuple[int, int]]]
+
+
+def _achatar(data: dict, normalizar: bool = False) -> tuple[Indice, List[str]]:
+    """
+    Converte estado -> intensidade -> lista numa lista única + índice de grupos.
+    normalizar=True aplica já normalizar_texto a todas as mensagens.
+    """
+    indice: Indice = {}
+    textos: List[str] = []
+    for estado, msgs in data.items():
+        grupos = msgs if isinstance(msgs, dict) else {"": msgs}
+        indice[estado] = {}
+        for chave, lst in grupos.items():
+            indice[estado][str(chave)] = (len(textos), len(lst))
+            textos.extend(normalizar_texto(str(m)) if normalizar else str(m).strip() for m in lst)
+    return indice, textos
+
+
+def chave_grupo(grupos: Dict[str, Tuple[int, int]], intensidade: int) -> str:
+    # intensidade vem em 1..5; listas simples ficam na chave ""
+    if "" in grupos:
+        return ""
+    return str(max(1, min(5, intensidade)))
+
+
+def _hash_ficheiro(path: Path) -> bytes:
+    return hashlib.sha256(path.read_bytes()).digest()
+
+
+def compilar_catalogo(json_path: str | Path, bin_path: str | Path, normalizar: bool = False) -> None:
+    """
+    Compila o mensagens.json para o formato binário (escrita atómica).
+    """
+    json_path = Path(json_path)
+    bin_path = Path(bin_path)
+
+    raw = json_path.read_bytes()
+    st = json_path.stat()
+    indice, textos = _achatar(json.loads(raw.decode("utf-8")), normalizar)
+
+    blobs = [t.encode("utf-8") for t in textos]
+    offsets = bytearray()
+    pos = 0
+    for b in blobs:
+        offsets += _OFFSET.pack(pos)
+        pos += len(b)
+    offsets += _OFFSET.pack(pos)
+
+    indice_raw = json.dumps(indice, ensure_ascii=False).encode("utf-8")
+    cabecalho = _CABECALHO.pack(
+        MAGIC,
+        st.st_mtime_ns,
+        st.st_size,
+        hashlib.sha256(raw).digest(),
+        len(indice_raw),
+        len(textos),
+        NORMALIZADO if normalizar else 0,
+    )
+
+    # .tmp por processo: vários workers podem recompilar ao mesmo tempo (recarga a quente)
+    tmp = bin_path.with_name(f"{bin_path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(cabecalho)
+        f.write(indice_raw)
+        f.write(offsets)
+        for b in blobs:
+            f.write(b)
+    os.replace(tmp, bin_path)
+
+
+def _ler_cabecalho(bin_path: Path) -> Optional[tuple]:
+    try:
+        with bin_path.open("rb") as f:
+            raw = f.read(_CABECALHO.size)
+    except OSError:
+        return None
+    if len(raw) != _CABECALHO.size:
+        return None
+    cab = _CABECALHO.unpack(raw)
+    return cab if cab[0] == MAGIC else None
+
+
+def garantir_compilado(json_path: str | Path, bin_path: str | Path | None = None, normalizar: bool = False) -> Path:
+    """
+    Garante que o binário está atualizado face ao JSON (mtime/tamanho, depois hash).
+    Se só o mtime mudou mas o conteúdo é igual, atualiza apenas o cabeçalho.
+    Um binário com a normalização trocada (ex: bin_path explícito) é sempre recompilado.
+    """
+    json_path = Path(json_path)
+    # o binário pré-normalizado é outro ficheiro: os dois podem coexistir
+    bin_path = Path(bin_path) if bin_path else json_path.with_suffix(".norm.bin" if normalizar else ".bin")
+
+    cab = _ler_cabecalho(bin_path)
+    if cab is not None and bool(cab[6] & NORMALIZADO) != normalizar:
+        cab = None
+    st = json_path.stat()
+    if cab is not None and cab[1] == st.st_mtime_ns and cab[2] == st.st_size:
+        return bin_path
+
+    if cab is not None and cab[3] == _hash_ficheiro(json_path):
+        novo = _CABECALHO.pack(MAGIC, st.st_mtime_ns, st.st_size, cab[3], cab[4], cab[5], cab[6])
+        with bin_path.open("r+b") as f:
+            f.write(novo)
+        return bin_path
+
+    compilar_catalogo(json_path, bin_path, normalizar)
+    return bin_path
+
+
+def arquivar_versao(
+    json_path: str | Path, pasta: str | Path, normalizar: bool = False, versao: Optional[str] = None
+) -> Path:
+    """
+    Guarda esta versão do JSON compilada em pasta/<versao>.bin (uma vez por versão), para
+    os ids de mensagens guardados no histórico continuarem a ter texto depois de o JSON mudar.
+    versao (se já conhecida) evita compilar quando o ficheiro já existe.
+    """
+    pasta = Path(pasta)
+    if versao is not None and _ler_cabecalho(pasta / f"{versao}.bin") is not None:
+        # (um ficheiro de um formato antigo volta a ser compilado)
+        return pasta / f"{versao}.bin"
+    pasta.mkdir(parents=True, exist_ok=True)
+    tmp = pasta / f".{os.getpid()}.bin"
+    compilar_catalogo(json_path, tmp, normalizar)
+    # o nome vem do hash dentro do binário (o JSON pode ter mudado entretanto)
+    destino = pasta / f"{_ler_cabecalho(tmp)[3].hex()[:12]}{'n' if normalizar else ''}.bin"
+    os.replace(tmp, destino)
+    return destino
+
+
+class FonteJSON:
+    """
+    Fonte em memória: lê o JSON inteiro (comportamento original).
+    """
+
+    def __init__(self, json_path: str | Path, normalizar: bool = False):
+        raw = Path(json_path).read_bytes()
+        self.indice, self._textos = _achatar(json.loads(raw.decode("utf-8")), normalizar)
+        self.versao = hashlib.sha256(raw).hexdigest()[:12] + ("n" if normalizar else "")
+
+    def texto(self, pos: int) -> str:
+        return self._textos[pos]
+
+    def fechar(self) -> None:
+        pass
+
+
+class FonteBinaria:
+    """
+    Fonte mmap: só o índice é lido; cada texto é descodificado quando pedido.
+    """
+
+    def __init__(self, bin_path: str | Path, normalizar: bool = False):
+        with Path(bin_path).open("rb") as f:
+            # o mmap fica com o seu próprio descritor; sem referências, fecha-se sozinho
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._ler_indice(self._mm, normalizar)
+
+    def _ler_indice(self, buf, normalizar: bool) -> None:
+        magic, _, _, sha, indice_len, n, flags = _CABECALHO.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("catálogo binário com formato desconhecido")
+        if bool(flags & NORMALIZADO) != normalizar:
+            # servir textos crus como normalizados (ou o contrário) mudava as mensagens
+            raise ValueError("catálogo binário com normalização diferente da pedida")
+        # versão = hash do JSON de origem (igual à da FonteJSON para o mesmo ficheiro)
+        self.versao = sha.hex()[:12] + ("n" if normalizar else "")
+        pos = _CABECALHO.size
+        bruto = json.loads(str(buf[pos:pos + indice_len], "utf-8"))
+        self.indice: Indice = {e: {k: tuple(v) for k, v in g.items()} for e, g in bruto.items()}
+
+        self._offsets = pos + indice_len
+        self._blob = self._offsets + (n + 1) * _OFFSET.size
+        self._n = n
+
+    def texto(self, pos: int) -> str:
+        if not 0 <= pos < self._n:
+            raise IndexError(pos)
+        ini, fim = struct.unpack_from("<II", self._mm, self._offsets + pos * _OFFSET.size)
+        return self._mm[self._blob + ini:self._blob + fim].decode("utf-8")
+
+    def fechar(self) -> None:
+        self._mm.close()
+
+
+def publicar_catalogo(bin_path: str | Path):
+    """
+    Copia o .bin para um bloco novo de multiprocessing.shared_memory (quem chama faz unlink).
+    Os workers abrem-no com FontePartilhada(shm.name).
+    """
+    from multiprocessing import shared_memory
+
+    raw = Path(bin_path).read_bytes()
+    shm = shared_memory.SharedMemory(create=True, size=len(raw))
+    shm.buf[:len(raw)] = raw
+    return shm
+
+
+class FontePartilhada(FonteBinaria):
+    """
+    O mesmo formato do .bin, lido de um bloco de memória partilhada criado pelo processo pai.
+    Todos os workers mapeiam as mesmas páginas; aqui só se lê (vista read-only).
+    """
+
+    def __init__(self, nome: str, normalizar: bool = False):
+        from multiprocessing import shared_memory
+
+        self._shm = shared_memory.SharedMemory(nome)
+        self._buf = self._shm.buf.toreadonly()
+        self._ler_indice(self._buf, normalizar)
+
+    def texto(self, pos: int) -> str:
+        if not 0 <= pos < self._n:
+            raise IndexError(pos)
+        ini, fim = struct.unpack_from("<II", self._buf, self._offsets + pos * _OFFSET.size)
+        return str(self._buf[self._blob + ini:self._blob + fim], "utf-8")
+
+    def fechar(self) -> None:
+        # o bloco só é apagado (unlink) pelo processo que o publicou
+        self._buf.release()
+        self._shm.close()
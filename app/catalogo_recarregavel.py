@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .catalogo import CatalogoMensagens
+from .metricas import METRICAS
+
+
+class CatalogoRecarregavel(CatalogoMensagens):
+    """
+    Catálogo que apanha alterações ao mensagens.json sem reiniciar o processo.
+
+    Uma thread verifica o mtime/tamanho do JSON a cada `intervalo` segundos; quando mudam,
+    constrói uma geração nova (snapshot imutável), valida-a com validar_minimo e troca-a
+    numa só atribuição. Cada pedido lê a geração uma vez e usa-a até ao fim, por isso
+    obter continua sem locks. A geração antiga é libertada quando o último pedido a larga.
+
+    `estados` são os estados que a geração nova tem de ter com pelo menos `minimo`
+    mensagens (default: os estados da geração atual). Com pasta_versoes, cada geração nova
+    fica também guardada lá (ver guardar_versao).
+    """
+
+    def __init__(
+        self,
+        json_path: str | Path,
+        intervalo: Optional[float] = 2.0,
+        minimo: int = 50,
+        estados: Optional[list[str]] = None,
+        pasta_versoes: str | Path | None = None,
+        **kwargs,
+    ):
+        # assinatura antes de ler: uma edição a meio do arranque ainda é apanhada
+        self._assinatura = self._ler_assinatura(Path(json_path))
+        super().__init__(json_path, **kwargs)
+        self.intervalo = intervalo
+        self.minimo = minimo
+        self.estados_obrigatorios = estados
+        self.pasta_versoes = pasta_versoes
+
+        self.geracao = 1
+        self.recargas = 0
+        self.falhas = 0
+        self.ultima_duracao_s = 0.0
+        self.ultimo_erro: Optional[str] = None
+        self.recarregado_em: Optional[float] = None
+
+        # só serializa recargas entre si; quem lê o catálogo nunca o apanha
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if intervalo:
+            self._thread = threading.Thread(target=self._vigiar, name="catalogo-recarga", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _ler_assinatura(path: Path) -> Optional[tuple[int, int, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            # ex: editor a meio de gravar (apaga e volta a criar)
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _vigiar(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            assinatura = self._ler_assinatura(self._path)
+            if assinatura is not None and assinatura != self._assinatura:
+                self.recarregar()
+
+    def recarregar(self) -> bool:
+        """
+        Lê o JSON outra vez e troca a geração se o conteúdo mudou e é válido.
+        Devolve True se trocou. Erros (JSON inválido, estados em falta) ficam em
+        falhas/ultimo_erro e a geração atual continua ativa.
+        """
+        with self._lock:
+            t0 = time.perf_counter()
+            assinatura = self._ler_assinatura(self._path)
+            try:
+                nova = self._abrir_fonte()
+            except (OSError, ValueError) as e:
+                return self._falhou(assinatura, e)
+
+            atual = self._fonte
+            if nova.versao == atual.versao:
+                # só o mtime mudou (ex: touch): nada a trocar
+                self._assinatura = assinatura
+                nova.fechar()
+                return False
+            try:
+                estados = self.estados_obrigatorios if self.estados_obrigatorios is not None else self.estados()
+                self._validar(nova, estados, self.minimo)
+            except ValueError as e:
+                nova.fechar()
+                return self._falhou(assinatura, e)
+
+            # troca atómica: pedidos a meio ficam com `atual` até acabarem
+            self._fonte = nova
+            self._assinatura = assinatura
+            self.geracao += 1
+            self.recargas += 1
+            self.ultima_duracao_s = time.perf_counter() - t0
+            self.ultimo_erro = None
+            self.recarregado_em = time.time()
+        if self.pasta_versoes is not None:
+            try:
+                self.guardar_versao(self.pasta_versoes)
+            except (OSError, ValueError):
+                pass
+        if METRICAS.ativo:
+            METRICAS.contar("catalogo.recargas")
+            METRICAS.observar("catalogo.recarregar", self.ultima_duracao_s)
+        return True
+
+    def _falhou(self, assinatura: Optional[tuple[int, int, int]], erro: Exception) -> bool:
+        # não volta a tentar o mesmo ficheiro: espera pela próxima alteração
+        self._assinatura = assinatura
+        self.falhas += 1
+        self.ultimo_erro = f"{type(erro).__name__}: {erro}"
+        if METRICAS.ativo:
+            METRICAS.contar("catalogo.recargas_falhadas")
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "geracao": self.geracao,
+            "versao": self.versao,
+            "recargas": self.recargas,
+            "falhas": self.falhas,
+            "ultima_duracao_s": self.ultima_duracao_s,
+            "ultimo_erro": self.ultimo_erro,
+            "recarregado_em": self.recarregado_em,
+        }
+
+    def fechar(self) -> None:
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+        super().fechar()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from .perfil_store import normalizar_nome, slug
+
+
+class ExecutorLimitado:
+    """
+    Threads para I/O bloqueante (ficheiros, sqlite) usadas a partir de asyncio.
+    - max_workers: threads no pool (default como o ThreadPoolExecutor: cpu + 4, máx 32)
+    - max_pendentes: trabalhos submetidos ao mesmo tempo; acima disso quem chama espera
+      (a fila do pool não cresce sem limite com milhares de utilizadores)
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pendentes: int | None = None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.max_pendentes = max_pendentes or self.max_workers * 4
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="help-io")
+        self._semaforos: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _semaforo(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        # um semáforo por event loop (asyncio.run cria um loop novo de cada vez)
+        sem = self._semaforos.get(loop)
+        if sem is None:
+            sem = self._semaforos[loop] = asyncio.Semaphore(self.max_pendentes)
+        return sem
+
+    async def correr(self, f: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        async with self._semaforo(loop):
+            return await loop.run_in_executor(self._pool, partial(f, *args, **kwargs))
+
+    def fechar(self, esperar: bool = True) -> None:
+        self._pool.shutdown(wait=esperar)
+
+
+class LocksUtilizador:
+    """
+    Um asyncio.Lock por utilizador (chave = slug do nome normalizado, como nos stores).
+    Os locks só existem enquanto alguém os usa: milhares de utilizadores não acumulam memória.
+    """
+
+    def __init__(self) -> None:
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def lock(self, nome: str) -> asyncio.Lock:
+        chave = slug(normalizar_nome(nome))
+        lock = self._locks.get(chave)
+        if lock is None:
+            lock = self._locks[chave] = asyncio.Lock()
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -3,6 +3,12 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from time import time_ns
+from typing import Optional, Sequence
+
+
+def normalizar_texto(texto: str) -> str:
+    # espaços a mais (início, fim e no meio) -> um só espaço
+    return " ".join(texto.strip().split())
 
 @dataclass(frozen=True)
 class EntradaSessao:
@@ -16,3 +22,16 @@ class Mensagem(ABC):
     @abstractmethod
     def gerar_texto(self, entrada: EntradaSessao) -> str:
         ...
+
+    def gerar_textos(self, entradas: Sequence[EntradaSessao]) -> list[str]:
+        # subclasses podem fazer melhor (ex: escolher todos os índices de uma vez)
+        return [self.gerar_texto(e) for e in entradas]
+
+    def gerar_com_id(self, entrada: EntradaSessao) -> tuple[Optional[str], str]:
+        """
+        (id estável da mensagem, texto). Sem id (None), o pipeline não pode memorizar.
+        """
+        return None, self.gerar_texto(entrada)
+
+    def gerar_textos_com_id(self, entradas: Sequence[EntradaSessao]) -> list[tuple[Optional[str], str]]:
+        return [self.gerar_com_id(e) for e in entradas]
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import math
+import threading
+from array import array
+from collections.abc import MutableMapping
+from typing import Iterable, Iterator
+
+
+class IndiceEstados:
+    """
+    Mapa estado -> posição, partilhado por todos os perfis do processo.
+    Começa com os estados do catálogo (registar_estados) e cresce só para estados antigos (ex: "calmo").
+    """
+
+    __slots__ = ("_ids", "_nomes", "_lock")
+
+    def __init__(self, estados: Iterable[str] = ()) -> None:
+        self._ids: dict[str, int] = {}
+        self._nomes: list[str] = []
+        self._lock = threading.Lock()
+        for e in estados:
+            self.id(e)
+
+    def id(self, estado: str, criar: bool = True) -> int:
+        i = self._ids.get(estado)
+        if i is not None or not criar:
+            return -1 if i is None else i
+        with self._lock:
+            i = self._ids.get(estado)
+            if i is None:
+                i = len(self._nomes)
+                self._nomes.append(estado)
+                self._ids[estado] = i
+        return i
+
+    def nome(self, i: int) -> str:
+        return self._nomes[i]
+
+    def __len__(self) -> int:
+        return len(self._nomes)
+
+
+INDICE = IndiceEstados(["ansioso", "triste", "zangado", "cansado", "feliz", "motivado"])
+
+
+def registar_estados(estados: Iterable[str]) -> None:
+    for e in estados:
+        INDICE.id(e)
+
+
+class VetorEstados(MutableMapping):
+    """
+    Mapping estado -> número guardado num array compacto indexado por INDICE.
+    Continua a ler-se como um dict (get/items/...), mas sem um dict por perfil.
+    """
+
+    __slots__ = ("_v",)
+    TIPO = "q"
+
+    def __init__(self, dados: dict | None = None) -> None:
+        self._v = array(self.TIPO)
+        if dados:
+            for k, x in dados.items():
+                self[k] = x
+
+    @staticmethod
+    def _ausente(x) -> bool:
+        return x == 0
+
+    def _vazio(self):
+        return 0
+
+    def _pos(self, estado: str) -> int:
+        i = INDICE.id(estado)
+        if i >= len(self._v):
+            self._v.extend([self._vazio()] * (i + 1 - len(self._v)))
+        return i
+
+    def _ler(self, estado: str):
+        i = INDICE.id(estado, criar=False)
+        if i < 0 or i >= len(self._v) or self._ausente(self._v[i]):
+            raise KeyError(estado)
+        return self._v[i]
+
+    def __getitem__(self, estado: str):
+        return self._ler(estado)
+
+    def __setitem__(self, estado: str, valor) -> None:
+        self._v[self._pos(estado)] = valor
+
+    def __delitem__(self, estado: str) -> None:
+        self._ler(estado)
+        self._v[INDICE.id(estado)] = self._vazio()
+
+    def __iter__(self) -> Iterator[str]:
+        for i, x in enumerate(self._v):
+            if not self._ausente(x):
+                yield INDICE.nome(i)
+
+    def __len__(self) -> int:
+        return sum(1 for x in self._v if not self._ausente(x))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.para_dict()!r})"
+
+    def somar(self, estado: str, n) -> None:
+        i = self._pos(estado)
+        self._v[i] += n
+
+    def copia(self):
+        novo = type(self)()
+        novo._v = array(self.TIPO, self._v)
+        return novo
+
+    def para_dict(self) -> dict:
+        return dict(self.items())
+
+
+class ContagemEstados(VetorEstados):
+    """
+    Contadores inteiros por estado (contagem_estados, soma_intensidade). 0 = estado ausente.
+    """
+
+    __slots__ = ()
+
+
+class IntensidadesCompactas(VetorEstados):
+    """
+    Intensidade por estado em array('d'); NaN = estado ainda sem intensidade.
+    Por compatibilidade lê/escreve no formato antigo {"valor": x}.
+
+    O decaimento é preguiçoso: cada valor guarda o nº de mudanças de estado em que foi
+    escrito (_marca) e os `passo * k` pendentes só se aplicam quando o estado é lido ou
+    escrito. decair_exceto fica O(1), por mais estados (ex: "calmo") que o perfil tenha.
+    """
+
+    __slots__ = ("_marca", "_mudancas", "_passo")
+    TIPO = "d"
+
+    def __init__(self, dados: dict | None = None) -> None:
+        self._marca = array("q")
+        self._mudancas = 0
+        self._passo = 0.0
+        super().__init__(dados)
+
+    @staticmethod
+    def _ausente(x) -> bool:
+        return math.isnan(x)
+
+    def _vazio(self):
+        return math.nan
+
+    def _pos(self, estado: str) -> int:
+        i = super()._pos(estado)
+        if i >= len(self._marca):
+            self._marca.extend([self._mudancas] * (i + 1 - len(self._marca)))
+        return i
+
+    def _efetivo(self, i: int) -> float:
+        x = self._v[i]
+        k = self._mudancas - self._marca[i]
+        # NaN e valores <= 0 não decaem, como no ciclo antigo. Com passo = 0.25 (exato em
+        # binário) x - 0.25*k dá o mesmo float que k subtrações seguidas.
+        if k and x > 0.0:
+            x = max(0.0, x - self._passo * k)
+        return x
+
+    def _escrever(self, i: int, valor: float) -> None:
+        self._v[i] = valor
+        self._marca[i] = self._mudancas
+
+    def _ler(self, estado: str):
+        i = INDICE.id(estado, criar=False)
+        if i < 0 or i >= len(self._v) or self._ausente(self._v[i]):
+            raise KeyError(estado)
+        return self._efetivo(i)
+
+    def __getitem__(self, estado: str) -> dict:
+        return {"valor": self._ler(estado)}
+
+    def __setitem__(self, estado: str, info) -> None:
+        valor = info.get("valor", 3.0) if isinstance(info, dict) else info
+        self._escrever(self._pos(estado), float(valor))
+
+    def somar(self, estado: str, n) -> None:
+        i = self._pos(estado)
+        self._escrever(i, self._efetivo(i) + n)
+
+    def copia(self):
+        novo = super().copia()
+        novo._marca = array("q", self._marca)
+        novo._mudancas = self._mudancas
+        novo._passo = self._passo
+        return novo
+
+    # --- acesso direto por posição (sem dicts nem INDICE), usado por algoritmo_intensidade ---
+    def posicao(self, estado: str) -> int:
+        """
+        Posição de `estado` nos arrays (criada se faltar), para valor/definir/decair_exceto_em.
+        """
+        i = INDICE.id(estado)
+        if i >= len(self._marca):
+            self._pos(estado)
+        return i
+
+    def valor(self, i: int, default: float = 3.0) -> float:
+        # _efetivo em linha: é o caminho de cada sessão
+        x = self._v[i]
+        if x != x:
+            return default
+        k = self._mudancas - self._marca[i]
+        if k and x > 0.0:
+            x = max(0.0, x - self._passo * k)
+        return x
+
+    def definir(self, i: int, valor: float) -> None:
+        self._v[i] = valor
+        self._marca[i] = self._mudancas
+
+    def materializar(self) -> None:
+        """
+        Aplica o decaimento pendente a todos os estados (O(n)).
+        """
+        for i in range(len(self._v)):
+            self._escrever(i, self._efetivo(i))
+
+    def decair_exceto(self, estado: str, passo: float) -> None:
+        """
+        Todos os estados presentes (menos `estado`) perdem `passo` até 0.0.
+        Só avança o contador de mudanças e fixa o valor de `estado`; os outros decaem ao ser lidos.
+        """
+        self.decair_exceto_em(self._pos(estado), passo)
+
+    def decair_exceto_em(self, i: int, passo: float) -> None:
+        if passo != self._passo:
+            # o pendente foi contado com o passo antigo
+            self.materializar()
+            self._passo = passo
+        x = self._efetivo(i)
+        self._mudancas += 1
+        self._escrever(i, x)
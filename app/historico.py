@@ -1,15 +1,52 @@
 from __future__ import annotations
 
-from .persistence import IPersistencia
+from typing import Optional
+
+from .metricas import cronometrado
+from .persistence import IPersistencia, IPersistenciaAsync
 
 
 class Historico:
     def __init__(self, persistencia: IPersistencia) -> None:
         self._p = persistencia
 
+    @cronometrado("historico.registar")
     def registar(self, entrada: dict) -> None:
         # delega a persistência (memória, ficheiro, etc.)
         self._p.registar(entrada)
 
+    @cronometrado("historico.registar_lote")
+    def registar_lote(self, entradas: list[dict]) -> None:
+        self._p.registar_lote(entradas)
+
     def obter_ultimas(self, n: int) -> list[dict]:
         return self._p.obter_ultimas(n)
+
+    @cronometrado("historico.obter_intervalo")
+    def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        # t0 <= data < t1 em time_ns (ex: "a última semana")
+        return self._p.obter_intervalo(t0, t1)
+
+    @cronometrado("historico.obter_por_estado")
+    def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        return self._p.obter_por_estado(estado, limite)
+
+
+class HistoricoAsync:
+    def __init__(self, persistencia: IPersistenciaAsync) -> None:
+        self._p = persistencia
+
+    async def registar(self, entrada: dict) -> None:
+        await self._p.registar(entrada)
+
+    async def registar_lote(self, entradas: list[dict]) -> None:
+        await self._p.registar_lote(entradas)
+
+    async def obter_ultimas(self, n: int) -> list[dict]:
+        return await self._p.obter_ultimas(n)
+
+    async def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        return await self._p.obter_intervalo(t0, t1)
+
+    async def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        return await self._p.obter_por_estado(estado, limite)
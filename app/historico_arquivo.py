@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import gzip
+import json
+from pathlib import Path
+from typing import Iterator
+
+from .perfil import PerfilUtilizador
+from .perfil_store import escrever_atomico, normalizar_nome, slug
+
+
+class ArquivoHistorico:
+    """
+    Histórico em dois níveis:
+    - quente: perfil.historico, limitado a `maximo` entradas (as mais recentes);
+    - frio: segmentos JSONL comprimidos com gzip, um por despejo.
+      Ex: data/perfis/micael.arquivo/0000000000.jsonl.gz
+
+    O nome do segmento é o índice global da 1ª entrada; com perfil.historico_arquivado
+    sabe-se sempre que entradas já saíram do perfil, mesmo se o perfil não chegou a ser gravado.
+    """
+
+    def __init__(self, base_dir: str | Path, maximo: int = 200, bloco: int = 100):
+        self._base = Path(base_dir)
+        self._base.mkdir(parents=True, exist_ok=True)
+        self.maximo = maximo
+        # só despeja quando passa maximo + bloco: menos segmentos e menos reescritas do perfil
+        self.bloco = bloco
+
+    def _pasta(self, nome: str) -> Path:
+        return self._base / f"{slug(normalizar_nome(nome))}.arquivo"
+
+    def limitar(self, perfil: PerfilUtilizador) -> int:
+        """
+        Move as entradas mais antigas para o arquivo. Devolve quantas saíram do perfil.
+        """
+        excesso = len(perfil.historico) - self.maximo
+        if excesso < self.bloco:
+            return 0
+
+        inicio = perfil.historico_arquivado
+        linhas = "".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in perfil.historico[:excesso]
+        )
+        pasta = self._pasta(perfil.nome)
+        pasta.mkdir(exist_ok=True)
+        escrever_atomico(pasta / f"{inicio:010d}.jsonl.gz", gzip.compress(linhas.encode("utf-8")))
+
+        del perfil.historico[:excesso]
+        perfil.historico_arquivado = inicio + excesso
+        return excesso
+
+    def _segmentos(self, nome: str) -> list[tuple[int, Path]]:
+        pasta = self._pasta(nome)
+        if not pasta.exists():
+            return []
+        segs = []
+        for p in pasta.glob("*.jsonl.gz"):
+            try:
+                segs.append((int(p.name.split(".", 1)[0]), p))
+            except ValueError:
+                continue
+        return sorted(segs)
+
+    def iterar_arquivo(self, perfil: PerfilUtilizador) -> Iterator[dict]:
+        """
+        Entradas arquivadas, da mais antiga para a mais recente, lidas segmento a segmento.
+        """
+        limite = perfil.historico_arquivado
+        proximo = 0
+        for inicio, path in self._segmentos(perfil.nome):
+            if inicio >= limite:
+                # despejo cujo perfil não chegou a ser gravado: as entradas ainda estão no perfil
+                break
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for i, linha in enumerate(f, start=inicio):
+                    if i < proximo:
+                        continue
+                    if i >= limite:
+                        break
+                    yield json.loads(linha)
+                    proximo = i + 1
+
+    def iterar(self, perfil: PerfilUtilizador) -> Iterator[dict]:
+        """
+        Histórico completo (arquivo + perfil) sem o carregar todo para memória.
+        """
+        yield from self.iterar_arquivo(perfil)
+        yield from list(perfil.historico)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from .catalogo import CatalogoMensagens, texto_de_id
+from .catalogo_binario import FonteBinaria
+from .dominio import normalizar_texto
+from .perfil import PerfilUtilizador
+
+# entrada com id de uma versão do catálogo que não foi guardada (ver CatalogoMensagens.guardar_versao)
+TEXTO_INDISPONIVEL = "(mensagem de uma versão antiga do catálogo)"
+
+
+class ResolvedorMensagens:
+    """
+    Texto das entradas do histórico do perfil, que guardam só o id da mensagem (ver registo_perfil).
+    - entradas antigas com "mensagem" ficam como estão;
+    - ids da versão atual vêm do catálogo;
+    - ids de versões anteriores vêm de pasta_versoes/<versao>.bin, abertos quando são precisos.
+    processar é aplicado ao texto do catálogo (o que o pipeline faria; default: normalizar_texto).
+    """
+
+    def __init__(
+        self,
+        catalogo: CatalogoMensagens,
+        pasta_versoes: str | Path | None = None,
+        processar: Callable[[str], str] = normalizar_texto,
+    ):
+        self.catalogo = catalogo
+        self.pasta_versoes = Path(pasta_versoes) if pasta_versoes else None
+        self.processar = processar
+        self._versoes: dict[str, Optional[FonteBinaria]] = {}
+
+    def _fonte_versao(self, versao: str) -> Optional[FonteBinaria]:
+        if versao not in self._versoes:
+            path = self.pasta_versoes / f"{versao}.bin" if self.pasta_versoes else None
+            try:
+                self._versoes[versao] = FonteBinaria(path, versao.endswith("n")) if path else None
+            except (OSError, ValueError):
+                self._versoes[versao] = None
+        return self._versoes[versao]
+
+    def texto(self, entrada: dict) -> str:
+        texto = entrada.get("mensagem")
+        if texto is not None:
+            return texto
+        id_mensagem = entrada.get("id")
+        if not id_mensagem:
+            return ""
+        texto = self.catalogo.texto_por_id(id_mensagem)
+        if texto is None:
+            fonte = self._fonte_versao(id_mensagem.partition(":")[0])
+            texto = texto_de_id(fonte, id_mensagem) if fonte is not None else None
+        return self.processar(texto) if texto is not None else TEXTO_INDISPONIVEL
+
+    def resolver(self, entradas: Iterable[dict]) -> list[dict]:
+        """
+        Cópias das entradas com "mensagem" preenchida (ex: resposta do GET /historico).
+        """
+        return [e if "mensagem" in e else {**e, "mensagem": self.texto(e)} for e in entradas]
+
+    def fechar(self) -> None:
+        for fonte in self._versoes.values():
+            if fonte is not None:
+                fonte.fechar()
+        self._versoes.clear()
+
+
+def indice_textos(catalogo: CatalogoMensagens) -> dict[tuple[str, str], str]:
+    # (estado, texto normalizado) -> id, para reconhecer o texto guardado nas entradas antigas
+    indice: dict[tuple[str, str], str] = {}
+    for estado, id_mensagem, texto in catalogo.iterar_com_id():
+        indice.setdefault((estado, normalizar_texto(texto)), id_mensagem)
+    return indice
+
+
+def migrar_perfil(
+    perfil: PerfilUtilizador, catalogo: CatalogoMensagens, indice: Optional[dict[tuple[str, str], str]] = None
+) -> int:
+    """
+    Troca "mensagem" por "id" nas entradas cujo texto existe no catálogo atual.
+    As restantes (texto de versões antigas, mensagem de recurso) ficam com o texto.
+    Devolve quantas entradas mudaram.
+    """
+    indice = indice_textos(catalogo) if indice is None else indice
+    mudou = 0
+    for i, e in enumerate(perfil.historico):
+        texto = e.get("mensagem")
+        if texto is None:
+            continue
+        id_mensagem = indice.get((e.get("estado"), normalizar_texto(texto)))
+        if id_mensagem is None:
+            continue
+        novo = {k: v for k, v in e.items() if k != "mensagem"}
+        novo["id"] = id_mensagem
+        # entrada nova em vez de alterar: PerfilUtilizador.copia() partilha as entradas
+        perfil.historico[i] = novo
+        mudou += 1
+    return mudou
+
+
+def migrar_pasta(perfis_dir: str | Path, catalogo: CatalogoMensagens, store=None) -> dict[str, int]:
+    """
+    Migra todos os perfis de uma pasta (PerfilStoreJSON ou PerfilStoreLog; default: log).
+    Os perfis alterados são reescritos por inteiro. Devolve {nome: entradas migradas}.
+    """
+    from .perfil_store_log import PerfilStoreLog
+
+    perfis_dir = Path(perfis_dir)
+    store = store or PerfilStoreLog(perfis_dir)
+    # reescrita completa: guardar() do PerfilStoreLog só acrescentava as entradas novas
+    reescrever = getattr(store, "compactar", store.guardar)
+    indice = indice_textos(catalogo)
+
+    nomes = sorted({p.name.split(".", 1)[0] for p in perfis_dir.glob("*") if p.suffix in (".json", ".log")})
+    out = {}
+    for nome in nomes:
+        perfil = store.carregar(nome)
+        out[nome] = migrar_perfil(perfil, catalogo, indice)
+        if out[nome]:
+            reescrever(perfil)
+    return out
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+
+
+def data_ns(entrada: dict) -> Optional[int]:
+    # "data" é time_ns (EntradaSessao); entradas sem data numérica ficam fora do índice por tempo
+    try:
+        return int(entrada.get("data"))
+    except (TypeError, ValueError):
+        return None
+
+
+def filtrar_intervalo(entradas: list[dict], t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+    """
+    Versão sem índice de IndiceHistorico.intervalo: ordena as datas (O(n log n)) e corta com bisect.
+    """
+    pares = sorted((d, pos) for pos, e in enumerate(entradas) if (d := data_ns(e)) is not None)
+    datas = [d for d, _ in pares]
+    i = bisect_left(datas, t0) if t0 is not None else 0
+    j = bisect_left(datas, t1) if t1 is not None else len(datas)
+    return [entradas[pos] for _, pos in pares[i:j]]
+
+
+def filtrar_por_estado(entradas: list[dict], estado: str, limite: Optional[int] = None) -> list[dict]:
+    """
+    Versão sem índice de IndiceHistorico.por_estado (varrimento linear).
+    """
+    if limite is not None and limite <= 0:
+        return []
+    todas = [e for e in entradas if e.get("estado") == estado]
+    return todas[-limite:] if limite is not None else todas
+
+
+class IndiceHistorico:
+    """
+    Índices sobre uma lista de entradas do histórico (append-only no fim):
+    - datas ordenadas (array 'q') + posição de cada uma, para intervalos com bisect;
+    - posições por estado (posting lists), pela ordem de registo.
+
+    A lista é da persistência (ou perfil.historico), que avisa o índice: acrescentar()
+    depois de cada registo e cortar_inicio(k) em vez de `del lista[:k]`. Listas mexidas
+    por fora (ex: ArquivoHistorico.limitar num perfil partilhado) pedem reconstruir().
+    Consultas são O(log n + k).
+    """
+
+    def __init__(self, entradas: list[dict]) -> None:
+        self._entradas = entradas
+        self._lock = threading.Lock()
+        self._limpar()
+        self._indexar()
+
+    def _limpar(self) -> None:
+        self._n = 0
+        self._datas = array("q")
+        self._posicoes = array("q")
+        self._por_estado: dict[str, array] = {}
+
+    def _indexar(self) -> None:
+        # chamado com o lock (ou no __init__): indexa as entradas a partir de self._n
+        entradas = self._entradas
+        datas, posicoes, por_estado = self._datas, self._posicoes, self._por_estado
+        for pos in range(self._n, len(entradas)):
+            e = entradas[pos]
+            d = data_ns(e)
+            if d is not None:
+                if not datas or d >= datas[-1]:
+                    datas.append(d)
+                    posicoes.append(pos)
+                else:
+                    # relógio que andou para trás: raro, paga o insert
+                    i = bisect_right(datas, d)
+                    datas.insert(i, d)
+                    posicoes.insert(i, pos)
+            estado = e.get("estado")
+            if estado is not None:
+                lista = por_estado.get(estado)
+                if lista is None:
+                    lista = por_estado[estado] = array("q")
+                lista.append(pos)
+        self._n = len(entradas)
+
+    def acrescentar(self) -> None:
+        """
+        Indexa as entradas acrescentadas ao fim da lista desde a última chamada.
+        """
+        with self._lock:
+            if len(self._entradas) < self._n:
+                # encolheu sem cortar_inicio: não dá para saber o quê
+                self._limpar()
+            self._indexar()
+
+    def cortar_inicio(self, k: int) -> None:
+        """
+        Apaga as k primeiras entradas da lista e desloca as posições das outras
+        (tudo com o lock, para uma consulta não ver a lista já cortada e o índice não).
+        """
+        if k <= 0:
+            return
+        with self._lock:
+            del self._entradas[:k]
+            manter = [(d, p - k) for d, p in zip(self._datas, self._posicoes) if p >= k]
+            self._datas = array("q", [d for d, _ in manter])
+            self._posicoes = array("q", [p for _, p in manter])
+            por_estado = {}
+            for estado, lista in self._por_estado.items():
+                resto = lista[bisect_left(lista, k):]
+                if resto:
+                    por_estado[estado] = array("q", [p - k for p in resto])
+            self._por_estado = por_estado
+            self._n -= k
+
+    def reconstruir(self) -> None:
+        with self._lock:
+            self._limpar()
+            self._indexar()
+
+    def intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        """
+        Entradas com t0 <= data < t1 (ns), por ordem de data. None = sem limite.
+        """
+        with self._lock:
+            datas = self._datas
+            i = bisect_left(datas, t0) if t0 is not None else 0
+            j = bisect_left(datas, t1) if t1 is not None else len(datas)
+            entradas, posicoes = self._entradas, self._posicoes
+            return [entradas[posicoes[k]] for k in range(i, j)]
+
+    def por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        """
+        Entradas de um estado pela ordem de registo; com limite, só as últimas `limite`.
+        """
+        if limite is not None and limite <= 0:
+            return []
+        with self._lock:
+            posicoes = self._por_estado.get(estado, ())
+            if limite is not None:
+                posicoes = posicoes[-limite:]
+            entradas = self._entradas
+            return [entradas[p] for p in posicoes]
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Iterable, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy usa-se o algoritmo escalar, perfil a perfil
+    np = None
+
+from .algoritmo_intensidade import calcular_intensidade
+from .historico_arquivo import ArquivoHistorico
+
+
+@dataclass
+class ResultadoLote:
+    """
+    Resultado de recalcular_lote, com U utilizadores, S estados e T sessões (máx).
+    - valores[u][s]: intensidade final (só conta onde presentes[u][s])
+    - buckets[u][t]: intensidade devolvida na sessão t (0 onde não há sessão)
+    - ultimo[u]: id do último estado (-1 se nenhum), streak[u]: sessões seguidas nesse estado
+    """
+
+    estados: list[str]
+    valores: Any
+    presentes: Any
+    ultimo: Any
+    streak: Any
+    buckets: Any
+
+    def intensidades(self, u: int) -> dict[str, dict]:
+        return {
+            est: {"valor": float(self.valores[u][s])}
+            for s, est in enumerate(self.estados)
+            if self.presentes[u][s]
+        }
+
+
+def codificar(historicos: Sequence[Iterable[str]], estados: Sequence[str] = ()) -> tuple[list[str], list[list[int]]]:
+    """
+    Converte sequências de nomes de estado em ids (estados extra, ex: "calmo", entram no fim).
+    """
+    ordem = list(estados)
+    ids = {e: i for i, e in enumerate(ordem)}
+    seqs = []
+    for hist in historicos:
+        seq = []
+        for est in hist:
+            if est not in ids:
+                ids[est] = len(ordem)
+                ordem.append(est)
+            seq.append(ids[est])
+        seqs.append(seq)
+    return ordem, seqs
+
+
+def _iniciais(perfis: Sequence[Any] | None, estados: list[str], u: int):
+    ids = {e: i for i, e in enumerate(estados)}
+    valores = [[3.0] * len(estados) for _ in range(u)]
+    presentes = [[False] * len(estados) for _ in range(u)]
+    ultimo = [-1] * u
+    streak = [0] * u
+    for i, p in enumerate(perfis or ()):
+        for est, info in (getattr(p, "intensidades", None) or {}).items():
+            valores[i][ids[est]] = float(info.get("valor", 3.0))
+            presentes[i][ids[est]] = True
+        ult = getattr(p, "ultimo_estado", None)
+        ultimo[i] = ids[ult] if ult is not None else -1
+        streak[i] = getattr(p, "streak_estado", 0)
+    return valores, presentes, ultimo, streak
+
+
+def recalcular_lote(
+    sequencias: Sequence[Sequence[int]],
+    estados: Sequence[str],
+    perfis: Sequence[Any] | None = None,
+) -> ResultadoLote:
+    """
+    Corre calcular_intensidade para U utilizadores ao mesmo tempo (numpy: um passo por sessão,
+    vetorizado por utilizadores e estados). Dá exatamente os mesmos floats que a versão escalar.
+
+    sequencias[u] = ids de estado (ver codificar); perfis[u] (opcional) dá o estado inicial,
+    senão começa como um perfil novo. Os estados de perfis têm de estar em `estados`.
+    """
+    estados = list(estados)
+    u_total = len(sequencias)
+    valores, presentes, ultimo, streak = _iniciais(perfis, estados, u_total)
+
+    if np is None:
+        return _recalcular_escalar(sequencias, estados, valores, presentes, ultimo, streak)
+
+    s_total = len(estados)
+    t_total = max((len(s) for s in sequencias), default=0)
+
+    seq = np.full((u_total, t_total), -1, dtype=np.int64)
+    for i, s in enumerate(sequencias):
+        seq[i, : len(s)] = s
+
+    V = np.array(valores, dtype=np.float64).reshape(u_total, s_total)
+    P = np.array(presentes, dtype=bool).reshape(u_total, s_total)
+    ult = np.array(ultimo, dtype=np.int64)
+    stk = np.array(streak, dtype=np.int64)
+    buckets = np.zeros((u_total, t_total), dtype=np.int64)
+    linhas = np.arange(u_total)
+    colunas = np.arange(s_total)
+
+    for t in range(t_total):
+        e = seq[:, t]
+        ativo = e >= 0
+        mudou = ativo & (e != ult)
+        igual = ativo & (e == ult)
+        e_seguro = np.where(ativo, e, 0)
+
+        # mudou de estado: os outros (já presentes) perdem 0.25 até 0.0
+        decai = mudou[:, None] & P & (colunas[None, :] != e_seguro[:, None])
+        V = np.where(decai & (V > 0.0), np.maximum(0.0, V - 0.25), V)
+
+        atual = np.where(P[linhas, e_seguro], V[linhas, e_seguro], 3.0)
+
+        novo_mudou = np.minimum(5.0, np.maximum(0.0, atual) * 1.05)
+
+        stk = np.where(mudou, 1, np.where(igual, stk + 1, stk))
+        mult = np.where(stk == 2, 1.25, np.where(stk == 3, 1.15, 1.05))
+        novo_igual = np.minimum(5.0, atual * mult)
+
+        novo = np.where(mudou, novo_mudou, novo_igual)
+        idx = linhas[ativo]
+        V[idx, e[ativo]] = novo[ativo]
+        P[idx, e[ativo]] = True
+        ult = np.where(ativo, e, ult)
+
+        b = np.clip(np.trunc(novo).astype(np.int64), 1, 5)
+        buckets[:, t] = np.where(ativo, b, 0)
+
+    return ResultadoLote(estados, V, P, ult, stk, buckets)
+
+
+def _recalcular_escalar(sequencias, estados, valores, presentes, ultimo, streak) -> ResultadoLote:
+    buckets = []
+    for i, seq in enumerate(sequencias):
+        p = SimpleNamespace(
+            intensidades={est: {"valor": valores[i][s]} for s, est in enumerate(estados) if presentes[i][s]},
+            ultimo_estado=estados[ultimo[i]] if ultimo[i] >= 0 else None,
+            streak_estado=streak[i],
+        )
+        buckets.append([calcular_intensidade(p, estados[s]) for s in seq])
+        for s, est in enumerate(estados):
+            if est in p.intensidades:
+                valores[i][s] = float(p.intensidades[est]["valor"])
+                presentes[i][s] = True
+        ultimo[i] = estados.index(p.ultimo_estado) if p.ultimo_estado is not None else -1
+        streak[i] = p.streak_estado
+
+    t_total = max((len(s) for s in sequencias), default=0)
+    buckets = [b + [0] * (t_total - len(b)) for b in buckets]
+    return ResultadoLote(estados, valores, presentes, ultimo, streak, buckets)
+
+
+def recalcular_perfis(
+    perfis: Sequence[Any], estados: Sequence[str] = (), arquivo: Optional[ArquivoHistorico] = None
+) -> ResultadoLote:
+    """
+    Recalcula intensidades/ultimo_estado/streak_estado de cada perfil a partir do seu histórico,
+    como se as sessões fossem repetidas num perfil novo, e escreve o resultado nos perfis.
+    Com arquivo, as sessões já arquivadas (ver ArquivoHistorico) entram primeiro; sem ele só
+    conta perfil.historico, que nos perfis limitados é só o fim do histórico.
+    """
+    historicos = [arquivo.iterar(p) if arquivo is not None else p.historico for p in perfis]
+    ordem, seqs = codificar([[e.get("estado") for e in h] for h in historicos], estados)
+    res = recalcular_lote(seqs, ordem)
+    for u, p in enumerate(perfis):
+        # clear/update mantém o tipo do perfil (dict ou IntensidadesCompactas)
+        p.intensidades.clear()
+        p.intensidades.update(res.intensidades(u))
+        p.ultimo_estado = ordem[int(res.ultimo[u])] if int(res.ultimo[u]) >= 0 else None
+        p.streak_estado = int(res.streak[u])
+    return res
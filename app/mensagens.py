@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from typing import Sequence
+
 from .dominio import Mensagem, EntradaSessao
 from .catalogo import CatalogoMensagens
+from .perfil import PerfilUtilizador
 
 
 class MensagemCatalogo(Mensagem):
@@ -10,3 +13,28 @@ class MensagemCatalogo(Mensagem):
 
     def gerar_texto(self, entrada: EntradaSessao) -> str:
         return self._catalogo.obter(entrada.estado, entrada)
+
+    def gerar_textos(self, entradas: Sequence[EntradaSessao]) -> list[str]:
+        return self._catalogo.obter_lote(entradas)
+
+    def gerar_com_id(self, entrada: EntradaSessao) -> tuple[str, str]:
+        return self._catalogo.obter_com_id(entrada.estado, entrada)
+
+    def gerar_textos_com_id(self, entradas: Sequence[EntradaSessao]) -> list[tuple[str, str]]:
+        return self._catalogo.obter_lote_com_id(entradas)
+
+
+class MensagemCatalogoSemRepeticao(Mensagem):
+    """
+    Não repete mensagens ao mesmo utilizador até esgotar o grupo (estado, intensidade).
+    """
+
+    def __init__(self, catalogo: CatalogoMensagens, perfil: PerfilUtilizador):
+        self._catalogo = catalogo
+        self._perfil = perfil
+
+    def gerar_texto(self, entrada: EntradaSessao) -> str:
+        return self._catalogo.obter_sem_repeticao(entrada.estado, entrada, self._perfil.mensagens_vistas)
+
+    def gerar_com_id(self, entrada: EntradaSessao) -> tuple[str, str]:
+        return self._catalogo.obter_sem_repeticao_com_id(entrada.estado, entrada, self._perfil.mensagens_vistas)
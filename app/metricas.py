@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import itertools
+import json
+import re
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+# limites dos buckets (segundos): 100ns .. ~100s, 4 buckets por potência de 2 (erro < 19%)
+_LIMITES = [1e-7 * 2 ** (i / 4) for i in range(121)]
+QUANTIS = (0.5, 0.95, 0.99)
+
+
+class Histograma:
+    """
+    Histograma de tempos com buckets fixos em escala logarítmica (memória constante).
+    Os percentis devolvem o limite superior do bucket (nunca acima do máximo visto).
+    """
+
+    __slots__ = ("contagens", "n", "soma", "minimo", "maximo")
+
+    def __init__(self) -> None:
+        self.contagens = [0] * (len(_LIMITES) + 1)
+        self.n = 0
+        self.soma = 0.0
+        self.minimo = float("inf")
+        self.maximo = 0.0
+
+    def observar(self, segundos: float) -> None:
+        self.contagens[bisect.bisect_left(_LIMITES, segundos)] += 1
+        self.n += 1
+        self.soma += segundos
+        if segundos < self.minimo:
+            self.minimo = segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, q: float) -> float:
+        if not self.n:
+            return 0.0
+        alvo = q * self.n
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            acumulado += c
+            if acumulado >= alvo and c:
+                limite = _LIMITES[i] if i < len(_LIMITES) else self.maximo
+                return min(max(limite, self.minimo), self.maximo)
+        return self.maximo
+
+    def resumo(self) -> dict:
+        return {
+            "n": self.n,
+            "soma_s": self.soma,
+            "min_s": self.minimo if self.n else 0.0,
+            "max_s": self.maximo,
+            **{f"p{int(q * 100)}_s": self.percentil(q) for q in QUANTIS},
+        }
+
+
+class RegistoMetricas:
+    """
+    Contadores e histogramas por nome (ex: "catalogo.obter", "pipeline.normalizar").
+    Desligado por defeito: o código instrumentado só lê `ativo` e segue em frente.
+    """
+
+    def __init__(self, ativo: bool = False) -> None:
+        self.ativo = ativo
+        self.contadores: dict[str, int] = {}
+        self.histogramas: dict[str, Histograma] = {}
+        self._lock = threading.Lock()
+        # chave -> ref; cada WeakMethod tira a sua entrada quando o objeto morre
+        self._ouvintes: dict[int, Callable[[], Optional[Callable[[], None]]]] = {}
+        self._proximo_ouvinte = itertools.count()
+        # (classe, atributo, original, medido) dos métodos com @cronometrado
+        self._metodos: list[tuple[type, str, Callable, Callable]] = []
+
+    # --- ligar/desligar ---
+    def ao_mudar(self, callback: Callable[[], None]) -> None:
+        """
+        callback() é chamado quando as métricas ligam/desligam (ex: o pipeline recompila).
+        Métodos ficam com referência fraca: o objeto pode ser apagado normalmente.
+        """
+        chave = next(self._proximo_ouvinte)
+        if hasattr(callback, "__self__"):
+            # sem isto cada PipelineCompilado apagado deixava cá uma entrada morta
+            ref = weakref.WeakMethod(callback, lambda _, c=chave: self._ouvintes.pop(c, None))
+        else:
+            ref = lambda: callback
+        self._ouvintes[chave] = ref
+
+    def instrumentar(self, dono: type, atributo: str, original: Callable, medido: Callable) -> None:
+        self._metodos.append((dono, atributo, original, medido))
+        setattr(dono, atributo, medido if self.ativo else original)
+
+    def _avisar(self) -> None:
+        for dono, atributo, original, medido in self._metodos:
+            setattr(dono, atributo, medido if self.ativo else original)
+        for ref in list(self._ouvintes.values()):
+            f = ref()
+            if f is not None:
+                f()
+
+    def ativar(self) -> None:
+        if not self.ativo:
+            self.ativo = True
+            self._avisar()
+
+    def desativar(self) -> None:
+        if self.ativo:
+            self.ativo = False
+            self._avisar()
+
+    # --- registo ---
+    def contar(self, nome: str, n: int = 1) -> None:
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def observar(self, nome: str, segundos: float) -> None:
+        with self._lock:
+            h = self.histogramas.get(nome)
+            if h is None:
+                h = self.histogramas[nome] = Histograma()
+            h.observar(segundos)
+
+    @contextmanager
+    def medir(self, nome: str) -> Iterator[None]:
+        if not self.ativo:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - t0)
+
+    def instantaneo(self) -> dict:
+        with self._lock:
+            return {
+                "contadores": dict(self.contadores),
+                "tempos": {nome: h.resumo() for nome, h in self.histogramas.items()},
+            }
+
+    def limpar(self) -> None:
+        with self._lock:
+            self.contadores.clear()
+            self.histogramas.clear()
+
+
+METRICAS = RegistoMetricas()
+
+
+def _medido(nome: str, f: Callable, registo: "RegistoMetricas") -> Callable:
+    @functools.wraps(f)
+    def medido(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            registo.observar(nome, time.perf_counter() - t0)
+
+    return medido
+
+
+class _Cronometrado:
+    """
+    Resultado de @cronometrado.
+    - num corpo de classe: __set_name__ põe lá o método original e regista-o em METRICAS,
+      que troca pela versão medida só enquanto estiver ativo (desligado = custo zero);
+    - numa função de módulo: fica este objeto, que só mede quando METRICAS.ativo.
+    """
+
+    def __init__(self, nome: str, f: Callable):
+        self._nome = nome
+        self._f = f
+        self._medido = _medido(nome, f, METRICAS)
+        functools.update_wrapper(self, f)
+
+    def __set_name__(self, dono: type, atributo: str) -> None:
+        METRICAS.instrumentar(dono, atributo, self._f, self._medido)
+
+    def __call__(self, *args, **kwargs):
+        if not METRICAS.ativo:
+            return self._f(*args, **kwargs)
+        return self._medido(*args, **kwargs)
+
+
+def cronometrado(nome: str) -> Callable[[Callable], Any]:
+    """
+    Decorador: cada chamada vai para o histograma `nome` quando METRICAS está ligado.
+    """
+
+    def decorador(f: Callable) -> Any:
+        return _Cronometrado(nome, f)
+
+    return decorador
+
+
+# --- exportação ---
+class ISinkMetricas(ABC):
+    @abstractmethod
+    def exportar(self, instantaneo: dict) -> None:
+        ...
+
+
+class SinkLog(ISinkMetricas):
+    """
+    Uma linha por métrica com tempos, para um logger com registar() (ou print).
+    """
+
+    def __init__(self, logger: Any = None) -> None:
+        self._escrever = getattr(logger, "registar", None) or print
+
+    def exportar(self, instantaneo: dict) -> None:
+        for nome, r in sorted(instantaneo["tempos"].items()):
+            self._escrever(
+                f"[METRICAS] {nome} n={r['n']} p50={r['p50_s'] * 1e6:.1f}us "
+                f"p95={r['p95_s'] * 1e6:.1f}us p99={r['p99_s'] * 1e6:.1f}us max={r['max_s'] * 1e6:.1f}us"
+            )
+        for nome, n in sorted(instantaneo["contadores"].items()):
+            self._escrever(f"[METRICAS] {nome} total={n}")
+
+
+class SinkJSON(ISinkMetricas):
+    """
+    Reescreve um ficheiro JSON com o último instantâneo (escrita atómica).
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def exportar(self, instantaneo: dict) -> None:
+        from .perfil_store import escrever_atomico
+
+        dados = {"data": time.time(), **instantaneo}
+        escrever_atomico(self.path, json.dumps(dados, ensure_ascii=False, indent=2))
+
+
+def _nome_prometheus(nome: str) -> str:
+    return "help_app_" + re.sub(r"[^a-zA-Z0-9_]", "_", nome)
+
+
+def texto_prometheus(instantaneo: dict) -> str:
+    """
+    Formato de texto do Prometheus: contadores como counter e tempos como summary (quantis).
+    """
+    linhas = []
+    for nome, n in sorted(instantaneo["contadores"].items()):
+        p = _nome_prometheus(nome) + "_total"
+        linhas += [f"# TYPE {p} counter", f"{p} {n}"]
+    for nome, r in sorted(instantaneo["tempos"].items()):
+        p = _nome_prometheus(nome) + "_seconds"
+        linhas.append(f"# TYPE {p} summary")
+        for q in QUANTIS:
+            linhas.append(f'{p}{{quantile="{q}"}} {r[f"p{int(q * 100)}_s"]:.9g}')
+        linhas += [f"{p}_sum {r['soma_s']:.9g}", f"{p}_count {r['n']}"]
+    return "\n".join(linhas) + "\n"
+
+
+class SinkPrometheus(ISinkMetricas):
+    """
+    Guarda o último texto Prometheus (o serviço HTTP devolve-o em GET /metrics).
+    """
+
+    def __init__(self) -> None:
+        self.texto = ""
+
+    def exportar(self, instantaneo: dict) -> None:
+        self.texto = texto_prometheus(instantaneo)
+
+
+class ExportadorPeriodico:
+    """
+    Thread que exporta METRICAS (ou outro registo) para os sinks a cada `intervalo` segundos.
+    """
+
+    def __init__(self, sinks: list[ISinkMetricas], intervalo: float = 10.0, registo: Optional[RegistoMetricas] = None):
+        self.sinks = sinks
+        self.intervalo = intervalo
+        self.registo = registo or METRICAS
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._ciclo, name="metricas", daemon=True)
+        self._thread.start()
+
+    def exportar(self) -> None:
+        inst = self.registo.instantaneo()
+        for s in self.sinks:
+            s.exportar(inst)
+
+    def _ciclo(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self.exportar()
+
+    def fechar(self) -> None:
+        self._parar.set()
+        self._thread.join()
+        self.exportar()
@@ -1,30 +1,82 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import Dict
+from dataclasses import dataclass, field, fields, replace
 
+from .estado_compacto import ContagemEstados, IntensidadesCompactas, VetorEstados
 
-@dataclass
+# campos que só existem em memória (não vão para o JSON)
+_TRANSITORIOS = {"streak_estado"}
+
+
+@dataclass(slots=True)
 class PerfilUtilizador:
+    """
+    Stats por estado guardadas em arrays compactos (ver app.estado_compacto); leem-se como dicts.
+    Nos stores, usar para_dict()/PerfilUtilizador(**dados) em vez de asdict.
+    """
+
     nome: str
     total_sessoes: int = 0
-    contagem_estados: Dict[str, int] = field(default_factory=dict)
-    soma_intensidade: Dict[str, int] = field(default_factory=dict)
+    contagem_estados: ContagemEstados = field(default_factory=ContagemEstados)
+    soma_intensidade: ContagemEstados = field(default_factory=ContagemEstados)
     historico: list[dict] = field(default_factory=list)
+    # nº de entradas mais antigas já movidas para o arquivo (ver app.historico_arquivo)
+    historico_arquivado: int = 0
 
     #necessario para algoritmo de calculo de intensidade dos estados de espirito 
-    intensidades: dict[str, dict] = field(default_factory=dict)
+    intensidades: IntensidadesCompactas = field(default_factory=IntensidadesCompactas)
     ultimo_estado: str | None = None
     streal_estado: int = 0
+    # com __slots__ o algoritmo já não pode criar o atributo à mão; continua a não ser gravado
+    streak_estado: int = 0
+
+    # rotação sem repetição: bitset em hex por "estado|grupo" (ver CatalogoMensagens.obter_sem_repeticao)
+    mensagens_vistas: dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        # JSON/SQLite entregam dicts: converte para a forma compacta
+        if not isinstance(self.contagem_estados, ContagemEstados):
+            self.contagem_estados = ContagemEstados(self.contagem_estados)
+        if not isinstance(self.soma_intensidade, ContagemEstados):
+            self.soma_intensidade = ContagemEstados(self.soma_intensidade)
+        if not isinstance(self.intensidades, IntensidadesCompactas):
+            self.intensidades = IntensidadesCompactas(self.intensidades)
 
     def registar_sessao(self, estado: str, intensidade: int) -> None:
         # stats simples por estado
         self.total_sessoes += 1
-        self.contagem_estados[estado] = self.contagem_estados.get(estado, 0) + 1
-        self.soma_intensidade[estado] = self.soma_intensidade.get(estado, 0) + int(intensidade)
+        self.contagem_estados.somar(estado, 1)
+        self.soma_intensidade.somar(estado, int(intensidade))
 
     def media_intensidade(self, estado: str) -> float:
         c = self.contagem_estados.get(estado, 0)
         if c == 0:
             return 0.0
         return self.soma_intensidade.get(estado, 0) / c
-    
+
+    def copia(self) -> "PerfilUtilizador":
+        """
+        Cópia barata: copia os contentores (e dicts dentro de dicts),
+        mas partilha as entradas do histórico, que não são alteradas depois de criadas.
+        """
+        novos = {}
+        for f in fields(self):
+            v = getattr(self, f.name)
+            if isinstance(v, VetorEstados):
+                novos[f.name] = v.copia()
+            elif isinstance(v, dict):
+                novos[f.name] = {k: (dict(x) if isinstance(x, dict) else x) for k, x in v.items()}
+            elif isinstance(v, list):
+                novos[f.name] = list(v)
+        return replace(self, **novos)
+
+    def para_dict(self) -> dict:
+        """
+        Forma JSON do perfil (igual à antiga: dicts por nome de estado).
+        """
+        out = {}
+        for f in fields(self):
+            if f.name in _TRANSITORIOS:
+                continue
+            v = getattr(self, f.name)
+            out[f.name] = v.para_dict() if isinstance(v, VetorEstados) else v
+        return out
@@ -1,14 +1,86 @@
 from __future__ import annotations
 
 import json
+import os
+import tempfile
 import unicodedata
 from abc import ABC, abstractmethod
-from dataclasses import asdict
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem locks advisory, fica só a escrita atómica
+    fcntl = None
+
+from .metricas import cronometrado
 from .perfil import PerfilUtilizador
 
 
+def normalizar_nome(nome: str) -> str:
+    nome = nome.strip().lower()
+    nome = unicodedata.normalize("NFD", nome)
+    nome = "".join(c for c in nome if unicodedata.category(c) != "Mn")
+    return nome
+
+
+def slug(nome_norm: str) -> str:
+    # nome_norm já vem normalizado (sem acentos, lower)
+    seguro = "".join(ch for ch in nome_norm if ch.isalnum() or ch in ("_", "-"))
+    return seguro or "utilizador"
+
+
+def escrever_atomico(path: Path, conteudo: str | bytes) -> None:
+    """
+    Escreve num ficheiro temporário na mesma pasta, faz fsync e troca com os.replace.
+    Quem lê vê sempre o ficheiro antigo ou o novo, nunca um meio-termo.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        modo = {"mode": "wb"} if isinstance(conteudo, bytes) else {"mode": "w", "encoding": "utf-8"}
+        with os.fdopen(fd, **modo) as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    # garante que o rename também sobrevive a um crash (nem todos os SO deixam abrir pastas)
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+@contextmanager
+def bloqueio(lock_path: Path, exclusivo: bool) -> Iterator[None]:
+    """
+    Lock advisory (fcntl.flock) num ficheiro .lock ao lado dos dados.
+    Não se pode bloquear o próprio ficheiro de dados: o os.replace troca-lhe o inode.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 class IPerfilStore(ABC):
     @abstractmethod
     def carregar(self, nome: str) -> PerfilUtilizador:
@@ -22,31 +94,58 @@ class IPerfilStore(ABC):
 class PerfilStoreJSON(IPerfilStore):
     """
     Guarda um perfil por utilizador em JSON.
-    Ex: data/perfis/micael.json
+    Ex: data/perfis/micael.json (+ micael.lock para coordenar processos)
+
+    Escritas são atómicas e com lock exclusivo por utilizador; leituras usam lock partilhado,
+    por isso vários processos podem partilhar a mesma pasta.
     """
 
     def __init__(self, base_dir: str | Path):
         self._base = Path(base_dir)
         self._base.mkdir(parents=True, exist_ok=True)
+        # assinatura dos ficheiros logo a seguir à nossa última escrita (ainda com o lock)
+        self._ultimas: dict[str, tuple] = {}
 
     def _normalizar_nome(self, nome: str) -> str:
-        nome = nome.strip().lower()
-        nome = unicodedata.normalize("NFD", nome)
-        nome = "".join(c for c in nome if unicodedata.category(c) != "Mn")
-        return nome
+        return normalizar_nome(nome)
 
     def _slug(self, nome_norm: str) -> str:
-        # nome_norm já vem normalizado (sem acentos, lower)
-        seguro = "".join(ch for ch in nome_norm if ch.isalnum() or ch in ("_", "-"))
-        return seguro or "utilizador"
+        return slug(nome_norm)
 
     def _path(self, nome: str) -> Path:
         nome_norm = self._normalizar_nome(nome)
         return self._base / f"{self._slug(nome_norm)}.json"
 
+    def _bloqueio(self, nome: str, exclusivo: bool):
+        return bloqueio(self._path(nome).with_suffix(".lock"), exclusivo)
+
+    def _ficheiros(self, nome: str) -> list[Path]:
+        return [self._path(nome)]
+
+    def assinatura(self, nome: str) -> tuple:
+        """
+        (inode, mtime_ns, tamanho) de cada ficheiro do perfil; muda sempre que alguém o reescreve.
+        """
+        out = []
+        for p in self._ficheiros(nome):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                out.append(None)
+                continue
+            out.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(out)
+
+    def ultima_escrita(self, nome: str) -> tuple | None:
+        return self._ultimas.get(self._slug(self._normalizar_nome(nome)))
+
+    def _registar_escrita(self, nome: str) -> None:
+        self._ultimas[self._slug(self._normalizar_nome(nome))] = self.assinatura(nome)
+
     def existe(self, nome: str) -> bool:
         return self._path(nome).exists()
 
+    @cronometrado("perfil_store_json.carregar")
     def carregar(self, nome: str) -> PerfilUtilizador:
         nome_norm = self._normalizar_nome(nome)
         path = self._base / f"{self._slug(nome_norm)}.json"
@@ -56,8 +155,9 @@ class PerfilStoreJSON(IPerfilStore):
             self.guardar(perfil)
             return perfil
 
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        with self._bloqueio(nome, exclusivo=False):
+            with path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
 
         # Garantia mínima: se no ficheiro não vier nome, força o nome_norm
         if "nome" not in data or not data["nome"]:
@@ -68,8 +168,11 @@ class PerfilStoreJSON(IPerfilStore):
         return PerfilUtilizador(**data)
     
     
+    @cronometrado("perfil_store_json.guardar")
     def guardar(self, perfil: PerfilUtilizador) -> None:
         # garante consistência: grava SEMPRE no path normalizado
         path = self._path(perfil.nome)
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(asdict(perfil), f, ensure_ascii=False, indent=2)
+        conteudo = json.dumps(perfil.para_dict(), ensure_ascii=False, indent=2)
+        with self._bloqueio(perfil.nome, exclusivo=True):
+            escrever_atomico(path, conteudo)
+            self._registar_escrita(perfil.nome)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+
+from .concorrencia import ExecutorLimitado
+from .perfil import PerfilUtilizador
+from .perfil_store import IPerfilStore
+
+
+class IPerfilStoreAsync(ABC):
+    @abstractmethod
+    async def carregar(self, nome: str) -> PerfilUtilizador:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def guardar(self, perfil: PerfilUtilizador) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def existe(self, nome: str) -> bool:
+        raise NotImplementedError
+
+
+class PerfilStoreAsync(IPerfilStoreAsync):
+    """
+    Envolve um IPerfilStore síncrono (JSON, Log, SQLite, Cache, WriteBehind...):
+    o I/O corre no ExecutorLimitado e o event loop fica livre.
+    Não serializa por utilizador: isso é feito pelo AsyncHelpApp (LocksUtilizador).
+    """
+
+    def __init__(self, interno: IPerfilStore, executor: ExecutorLimitado):
+        self._interno = interno
+        self._executor = executor
+
+    async def existe(self, nome: str) -> bool:
+        existe = getattr(self._interno, "existe", None)
+        if not callable(existe):
+            # carregar não serve: cria o perfil em falta
+            raise TypeError(f"{type(self._interno).__name__} não implementa existe()")
+        return await self._executor.correr(existe, nome)
+
+    async def carregar(self, nome: str) -> PerfilUtilizador:
+        return await self._executor.correr(self._interno.carregar, nome)
+
+    async def guardar(self, perfil: PerfilUtilizador) -> None:
+        await self._executor.correr(self._interno.guardar, perfil)
+
+    def stats(self) -> dict:
+        stats = getattr(self._interno, "stats", None)
+        return stats() if callable(stats) else {}
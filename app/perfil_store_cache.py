@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from .perfil import PerfilUtilizador
+from .perfil_store import IPerfilStore, normalizar_nome, slug
+
+# bytes em memória por byte de JSON em disco (dicts/str do Python pesam mais que o texto)
+_FATOR_MEMORIA = 4
+
+
+class PerfilStoreCache(IPerfilStore):
+    """
+    Cache LRU em frente a outro IPerfilStore (limite por nº de perfis e por bytes aproximados).
+
+    Se o store interno tiver assinatura()/ultima_escrita() (PerfilStoreJSON, PerfilStoreLog),
+    cada acesso compara o inode/mtime/tamanho dos ficheiros: se outro processo escreveu,
+    a entrada é descartada e o perfil relido. Sem isso, a cache só vê as escritas feitas por ela.
+    """
+
+    def __init__(self, interno: IPerfilStore, max_perfis: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self._interno = interno
+        self.max_perfis = max_perfis
+        self.max_bytes = max_bytes
+
+        # chave -> (perfil, assinatura, bytes)
+        self._lru: OrderedDict[str, tuple[PerfilUtilizador, tuple | None, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidacoes = 0
+
+    def _assinatura(self, nome: str) -> tuple | None:
+        f = getattr(self._interno, "assinatura", None)
+        return f(nome) if callable(f) else None
+
+    @staticmethod
+    def _tamanho(perfil: PerfilUtilizador, assinatura: tuple | None) -> int:
+        if assinatura:
+            disco = sum(a[2] for a in assinatura if a)
+            if disco:
+                return disco * _FATOR_MEMORIA
+        # sem ficheiros: estimativa grosseira pelo histórico
+        return 1024 + 256 * len(perfil.historico)
+
+    def _obter_valido(self, chave: str, nome: str) -> PerfilUtilizador | None:
+        # chamado com o lock
+        item = self._lru.get(chave)
+        if item is None:
+            return None
+        perfil, assinatura, _ = item
+        if assinatura is not None and self._assinatura(nome) != assinatura:
+            self._remover(chave)
+            self.invalidacoes += 1
+            return None
+        self._lru.move_to_end(chave)
+        return perfil
+
+    def _remover(self, chave: str) -> None:
+        _, _, tamanho = self._lru.pop(chave)
+        self._bytes -= tamanho
+
+    def _inserir(self, chave: str, perfil: PerfilUtilizador, assinatura: tuple | None) -> None:
+        if chave in self._lru:
+            self._remover(chave)
+        tamanho = self._tamanho(perfil, assinatura)
+        if tamanho > self.max_bytes:
+            return
+        self._lru[chave] = (perfil, assinatura, tamanho)
+        self._bytes += tamanho
+        while len(self._lru) > self.max_perfis or self._bytes > self.max_bytes:
+            antiga, _ = next(iter(self._lru.items()))
+            self._remover(antiga)
+            self.evictions += 1
+
+    # --- IPerfilStore ---
+    def existe(self, nome: str) -> bool:
+        chave = slug(normalizar_nome(nome))
+        with self._lock:
+            if self._obter_valido(chave, nome) is not None:
+                return True
+        return self._interno.existe(nome)
+
+    def carregar(self, nome: str) -> PerfilUtilizador:
+        chave = slug(normalizar_nome(nome))
+        with self._lock:
+            perfil = self._obter_valido(chave, nome)
+            if perfil is not None:
+                self.hits += 1
+                # cópia: quem chama pode alterar o perfil sem estragar a cache
+                return perfil.copia()
+            self.misses += 1
+
+        # assinatura ANTES de ler: se mudar durante a leitura, a próxima verificação apanha
+        assinatura = self._assinatura(nome)
+        perfil = self._interno.carregar(nome)
+        with self._lock:
+            self._inserir(chave, perfil.copia(), assinatura)
+        return perfil
+
+    def guardar(self, perfil: PerfilUtilizador) -> None:
+        self._interno.guardar(perfil)
+        ultima = getattr(self._interno, "ultima_escrita", None)
+        assinatura = ultima(perfil.nome) if callable(ultima) else None
+        chave = slug(normalizar_nome(perfil.nome))
+        with self._lock:
+            if assinatura is None and callable(getattr(self._interno, "assinatura", None)):
+                # não sabemos que versão ficou em disco -> relê na próxima
+                if chave in self._lru:
+                    self._remover(chave)
+                return
+            self._inserir(chave, perfil.copia(), assinatura)
+
+    def invalidar(self, nome: str | None = None) -> None:
+        with self._lock:
+            if nome is None:
+                self._lru.clear()
+                self._bytes = 0
+                return
+            chave = slug(normalizar_nome(nome))
+            if chave in self._lru:
+                self._remover(chave)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidacoes": self.invalidacoes,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "perfis": len(self._lru),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from .metricas import cronometrado
+from .perfil import PerfilUtilizador
+from .perfil_store import PerfilStoreJSON, escrever_atomico
+
+
+def _ler_log(log: Path) -> list[dict]:
+    if not log.exists():
+        return []
+    registos = []
+    with log.open("r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registos.append(json.loads(linha))
+            except json.JSONDecodeError:
+                # linha cortada por um crash a meio da escrita; as seguintes continuam válidas
+                # (o "n" de cada registo chega para não duplicar nada)
+                continue
+    return registos
+
+
+def ler_ficheiros(
+    base: Optional[Path], agg: Optional[Path], log: Optional[Path], nome_norm: str
+) -> tuple[PerfilUtilizador, int]:
+    """
+    Monta o perfil a partir de snapshot + agregados + log (None ou inexistente = vazio).
+    Não bloqueia nem escreve nada; devolve (perfil, linhas lidas do log).
+    """
+    data: dict = {}
+    if base is not None and base.exists():
+        with base.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    if agg is not None and agg.exists():
+        with agg.open("r", encoding="utf-8") as f:
+            data.update(json.load(f))
+    registos = _ler_log(log) if log is not None else []
+
+    historico = data.get("historico") or []
+    for reg in registos:
+        # "n" = posição no histórico; ignora o que já estiver no snapshot
+        n = reg.pop("n", len(historico))
+        if n >= len(historico):
+            historico.append(reg)
+    data["historico"] = historico
+
+    if "nome" not in data or not data["nome"]:
+        data["nome"] = nome_norm
+    return PerfilUtilizador(**data), len(registos)
+
+
+class PerfilStoreLog(PerfilStoreJSON):
+    """
+    Guarda o perfil como snapshot + log append-only de sessões.
+    Ex (utilizador micael):
+      data/perfis/micael.json      -> snapshot completo (na última compactação)
+      data/perfis/micael.agg.json  -> agregados atuais (sem histórico, pequeno)
+      data/perfis/micael.log       -> 1 linha JSON por sessão desde a compactação
+
+    guardar() só escreve as sessões novas + agregados, por isso não depende do tamanho do histórico.
+    """
+
+    def __init__(self, base_dir: str | Path, limite_log: int = 1000):
+        super().__init__(base_dir)
+        self.limite_log = limite_log
+        # nome -> quantas entradas do histórico já estão em disco
+        self._persistidos: dict[str, int] = {}
+        self._linhas_log: dict[str, int] = {}
+
+    def _paths(self, nome: str) -> tuple[Path, Path, Path]:
+        base = self._path(nome)
+        stem = base.with_suffix("")
+        return base, stem.with_name(stem.name + ".agg.json"), stem.with_name(stem.name + ".log")
+
+    def _ficheiros(self, nome: str) -> list[Path]:
+        return list(self._paths(nome))
+
+    def existe(self, nome: str) -> bool:
+        return any(p.exists() for p in self._paths(nome))
+
+    @staticmethod
+    def _fim_cortado(log: Path) -> bool:
+        # log que não acaba em "\n": a última escrita ficou a meio
+        try:
+            with log.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            # não existe ou está vazio
+            return False
+
+    @cronometrado("perfil_store_log.carregar")
+    def carregar(self, nome: str) -> PerfilUtilizador:
+        nome_norm = self._normalizar_nome(nome)
+        base, agg, log = self._paths(nome)
+
+        if not self.existe(nome):
+            perfil = PerfilUtilizador(nome=nome_norm)
+            self.guardar(perfil)
+            return perfil
+
+        with self._bloqueio(nome, exclusivo=False):
+            perfil, n_registos = ler_ficheiros(base, agg, log, nome_norm)
+
+        chave = self._normalizar_nome(perfil.nome)
+        self._persistidos[chave] = len(perfil.historico)
+        self._linhas_log[chave] = n_registos
+        return perfil
+
+    def _contar_persistidos(self, nome: str) -> int:
+        base, _, log = self._paths(nome)
+        total = 0
+        if base.exists():
+            with base.open("r", encoding="utf-8") as f:
+                total = len(json.load(f).get("historico") or [])
+        registos = _ler_log(log)
+        self._linhas_log[self._normalizar_nome(nome)] = len(registos)
+        return max([total] + [r.get("n", 0) + 1 for r in registos])
+
+    @cronometrado("perfil_store_log.guardar")
+    def guardar(self, perfil: PerfilUtilizador) -> None:
+        with self._bloqueio(perfil.nome, exclusivo=True):
+            self._guardar(perfil)
+            self._registar_escrita(perfil.nome)
+
+    def _guardar(self, perfil: PerfilUtilizador) -> None:
+        chave = self._normalizar_nome(perfil.nome)
+        base, agg, log = self._paths(perfil.nome)
+
+        persistidos = self._persistidos.get(chave)
+        if persistidos is None:
+            persistidos = self._contar_persistidos(perfil.nome)
+
+        if len(perfil.historico) < persistidos:
+            # histórico encolheu (ex: limpo à mão) -> não dá para fazer append
+            self._compactar(perfil)
+            return
+
+        novos = perfil.historico[persistidos:]
+        if novos:
+            cortado = self._fim_cortado(log)
+            with log.open("a", encoding="utf-8") as f:
+                if cortado:
+                    # fecha a linha partida para o 1º registo novo não ficar colado a ela
+                    f.write("\n")
+                for i, entrada in enumerate(novos, start=persistidos):
+                    f.write(json.dumps({"n": i, **entrada}, ensure_ascii=False, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        agregados = perfil.para_dict()
+        agregados.pop("historico")
+        escrever_atomico(agg, json.dumps(agregados, ensure_ascii=False, separators=(",", ":")))
+
+        self._persistidos[chave] = len(perfil.historico)
+        self._linhas_log[chave] = self._linhas_log.get(chave, 0) + len(novos)
+
+        if self._linhas_log[chave] >= self.limite_log:
+            self._compactar(perfil)
+
+    def compactar(self, perfil: PerfilUtilizador) -> None:
+        """
+        Junta snapshot + log num snapshot novo e esvazia o log.
+        Se falhar a meio, o "n" de cada registo evita duplicar sessões no próximo carregar.
+        """
+        with self._bloqueio(perfil.nome, exclusivo=True):
+            self._compactar(perfil)
+            self._registar_escrita(perfil.nome)
+
+    def _compactar(self, perfil: PerfilUtilizador) -> None:
+        # chamado já com o lock exclusivo (o flock não é reentrante entre descritores)
+        chave = self._normalizar_nome(perfil.nome)
+        base, agg, log = self._paths(perfil.nome)
+
+        escrever_atomico(base, json.dumps(perfil.para_dict(), ensure_ascii=False, indent=2))
+        for p in (agg, log):
+            if p.exists():
+                p.unlink()
+
+        self._persistidos[chave] = len(perfil.historico)
+        self._linhas_log[chave] = 0
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import fields
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .perfil import PerfilUtilizador
+from .perfil_store import IPerfilStore, normalizar_nome, slug
+from .persistence import IPersistencia
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS perfis (
+    nome TEXT PRIMARY KEY,
+    total_sessoes INTEGER NOT NULL DEFAULT 0,
+    ultimo_estado TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS estados (
+    nome TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    contagem INTEGER NOT NULL DEFAULT 0,
+    soma INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (nome, estado)
+);
+CREATE TABLE IF NOT EXISTS intensidades (
+    nome TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    valor REAL NOT NULL,
+    PRIMARY KEY (nome, estado)
+);
+CREATE TABLE IF NOT EXISTS historico (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    utilizador TEXT NOT NULL,
+    data INTEGER,
+    estado TEXT,
+    intensidade INTEGER,
+    entrada TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_historico_utilizador_data ON historico (utilizador, data);
+CREATE TABLE IF NOT EXISTS registos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    utilizador TEXT NOT NULL,
+    data INTEGER,
+    entrada TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_registos_utilizador_data ON registos (utilizador, data);
+CREATE INDEX IF NOT EXISTS idx_registos_utilizador_estado ON registos (utilizador, json_extract(entrada, '$.estado'), id);
+"""
+
+# SQL constante -> o sqlite3 reaproveita os statements preparados (cache por ligação)
+_SQL_PERFIL = "INSERT OR REPLACE INTO perfis (nome, total_sessoes, ultimo_estado, extra) VALUES (?, ?, ?, ?)"
+_SQL_ESTADO = "INSERT OR REPLACE INTO estados (nome, estado, contagem, soma) VALUES (?, ?, ?, ?)"
+_SQL_INTENSIDADE = "INSERT OR REPLACE INTO intensidades (nome, estado, valor) VALUES (?, ?, ?)"
+_SQL_HISTORICO = "INSERT INTO historico (utilizador, data, estado, intensidade, entrada) VALUES (?, ?, ?, ?, ?)"
+_SQL_REGISTO = "INSERT INTO registos (utilizador, data, entrada) VALUES (?, ?, ?)"
+# a expressão tem de ser igual à do idx_registos_utilizador_estado para o índice ser usado
+_SQL_INTERVALO = "SELECT entrada FROM registos WHERE utilizador = ? AND data >= ? AND data < ? ORDER BY data, id"
+_SQL_POR_ESTADO = (
+    "SELECT entrada FROM registos WHERE utilizador = ? AND json_extract(entrada, '$.estado') = ? "
+    "ORDER BY id DESC LIMIT ?"
+)
+_DATA_MIN, _DATA_MAX = -(2**63), 2**63 - 1
+
+# campos que vão para colunas/tabelas próprias; o resto fica em "extra" (JSON)
+_NORMALIZADOS = {"nome", "total_sessoes", "ultimo_estado", "contagem_estados", "soma_intensidade", "intensidades", "historico"}
+
+
+def _data_int(data) -> int | None:
+    try:
+        return int(data)
+    except (TypeError, ValueError):
+        return None
+
+
+class BaseSQLite:
+    """
+    Ligação partilhada: WAL, esquema e transações agrupadas.
+    commit_cada=N só faz commit a cada N escritas (ou no fim de transacao()/flush()).
+    """
+
+    def __init__(self, db_path: str | Path, commit_cada: int = 1):
+        self._path = Path(db_path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_ESQUEMA)
+        self._lock = threading.RLock()
+        self.commit_cada = max(1, commit_cada)
+        self._pendentes = 0
+        self._profundidade = 0
+
+    @contextmanager
+    def transacao(self) -> Iterator[None]:
+        """
+        Agrupa várias escritas num só commit.
+        """
+        with self._lock:
+            self._profundidade += 1
+            try:
+                yield
+            finally:
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    self.flush()
+
+    def _escrita(self) -> None:
+        # chamado com o lock, depois de uma escrita: decide se já é altura de commit
+        self._pendentes += 1
+        if self._profundidade == 0 and self._pendentes >= self.commit_cada:
+            self.flush()
+
+    def _begin(self) -> None:
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("COMMIT")
+            self._pendentes = 0
+
+    def fechar(self) -> None:
+        self.flush()
+        self._conn.close()
+
+
+class PerfilStoreSQLite(BaseSQLite, IPerfilStore):
+    """
+    Guarda todos os perfis numa base SQLite (ex: data/perfis.db).
+    Agregados e histórico ficam em tabelas; só as sessões novas são inseridas em cada guardar.
+    """
+
+    def __init__(self, db_path: str | Path, commit_cada: int = 1):
+        super().__init__(db_path, commit_cada)
+        # nome -> (historico_arquivado, fim) já gravados, para guardar só o que mudou
+        self._persistidos: dict[str, tuple[int, int]] = {}
+
+    def _chave(self, nome: str) -> str:
+        # mesma chave que o nome do ficheiro no PerfilStoreJSON
+        return slug(normalizar_nome(nome))
+
+    def existe(self, nome: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM perfis WHERE nome = ?", (self._chave(nome),)).fetchone()
+        return row is not None
+
+    def carregar(self, nome: str) -> PerfilUtilizador:
+        chave = self._chave(nome)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total_sessoes, ultimo_estado, extra FROM perfis WHERE nome = ?", (chave,)
+            ).fetchone()
+            if row is None:
+                perfil = PerfilUtilizador(nome=normalizar_nome(nome))
+                self.guardar(perfil)
+                return perfil
+
+            total, ultimo, extra = row
+            contagem, soma = {}, {}
+            for estado, c, s in self._conn.execute(
+                "SELECT estado, contagem, soma FROM estados WHERE nome = ?", (chave,)
+            ):
+                contagem[estado] = c
+                soma[estado] = s
+            intensidades = {
+                estado: {"valor": valor}
+                for estado, valor in self._conn.execute(
+                    "SELECT estado, valor FROM intensidades WHERE nome = ?", (chave,)
+                )
+            }
+            # colunas data/estado/intensidade servem para consultas; a entrada completa vai em JSON
+            historico = [
+                json.loads(e)
+                for (e,) in self._conn.execute(
+                    "SELECT entrada FROM historico WHERE utilizador = ? ORDER BY id", (chave,)
+                )
+            ]
+
+        conhecidos = {f.name for f in fields(PerfilUtilizador)}
+        dados_extra = {k: v for k, v in json.loads(extra).items() if k in conhecidos}
+        arquivado = int(dados_extra.get("historico_arquivado", 0))
+        self._persistidos[chave] = (arquivado, arquivado + len(historico))
+        return PerfilUtilizador(
+            nome=dados_extra.pop("nome", None) or chave,
+            total_sessoes=total,
+            contagem_estados=contagem,
+            soma_intensidade=soma,
+            historico=historico,
+            intensidades=intensidades,
+            ultimo_estado=ultimo,
+            **dados_extra,
+        )
+
+    def _posicao_persistida(self, chave: str) -> tuple[int, int]:
+        # (historico_arquivado, fim) do que está na base: as linhas são as entradas [arquivado, fim)
+        row = self._conn.execute("SELECT extra FROM perfis WHERE nome = ?", (chave,)).fetchone()
+        arquivado = int(json.loads(row[0]).get("historico_arquivado", 0)) if row else 0
+        n = self._conn.execute("SELECT COUNT(*) FROM historico WHERE utilizador = ?", (chave,)).fetchone()[0]
+        return arquivado, arquivado + n
+
+    def guardar(self, perfil: PerfilUtilizador) -> None:
+        chave = self._chave(perfil.nome)
+        dados = perfil.para_dict()
+        extra = {k: v for k, v in dados.items() if k not in _NORMALIZADOS}
+        extra["nome"] = perfil.nome
+
+        with self._lock:
+            self._begin()
+            # antes de reescrever "perfis": o extra antigo diz quantas entradas já tinham sido arquivadas
+            persistido = self._persistidos.get(chave) or self._posicao_persistida(chave)
+            self._conn.execute(
+                _SQL_PERFIL,
+                (chave, perfil.total_sessoes, perfil.ultimo_estado, json.dumps(extra, ensure_ascii=False)),
+            )
+            # estados que saíram do perfil (ex: intensidades.clear()) não podem voltar no carregar
+            self._conn.execute("DELETE FROM estados WHERE nome = ?", (chave,))
+            self._conn.execute("DELETE FROM intensidades WHERE nome = ?", (chave,))
+            self._conn.executemany(
+                _SQL_ESTADO,
+                [
+                    (chave, est, c, perfil.soma_intensidade.get(est, 0))
+                    for est, c in perfil.contagem_estados.items()
+                ],
+            )
+            self._conn.executemany(
+                _SQL_INTENSIDADE,
+                [(chave, est, float(info.get("valor", 3.0))) for est, info in perfil.intensidades.items()],
+            )
+
+            arquivado, fim = perfil.historico_arquivado, perfil.historico_arquivado + len(perfil.historico)
+            arquivado_antes, fim_antes = persistido
+            if arquivado < arquivado_antes or fim < fim_antes:
+                # histórico mexido à mão (não só arquivado no início): reescreve tudo
+                self._conn.execute("DELETE FROM historico WHERE utilizador = ?", (chave,))
+                fim_antes = arquivado
+            elif arquivado > arquivado_antes:
+                # entradas que o ArquivoHistorico tirou do perfil: só apaga essas linhas
+                self._conn.execute(
+                    "DELETE FROM historico WHERE id IN "
+                    "(SELECT id FROM historico WHERE utilizador = ? ORDER BY id LIMIT ?)",
+                    (chave, min(arquivado, fim_antes) - arquivado_antes),
+                )
+                fim_antes = max(fim_antes, arquivado)
+
+            self._conn.executemany(
+                _SQL_HISTORICO,
+                [
+                    (
+                        chave,
+                        _data_int(e.get("data")),
+                        e.get("estado"),
+                        e.get("intensidade"),
+                        json.dumps(e, ensure_ascii=False),
+                    )
+                    for e in perfil.historico[fim_antes - arquivado:]
+                ],
+            )
+            self._persistidos[chave] = (arquivado, fim)
+            self._escrita()
+
+
+class PersistenciaSQLite(IPersistencia):
+    """
+    IPersistencia para o Historico da app, na mesma base que o PerfilStoreSQLite.
+    """
+
+    def __init__(self, base: BaseSQLite, utilizador: str = ""):
+        self._base = base
+        self._utilizador = utilizador
+
+    def registar(self, entrada: dict) -> None:
+        b = self._base
+        with b._lock:
+            b._begin()
+            b._conn.execute(
+                _SQL_REGISTO,
+                (self._utilizador, _data_int(entrada.get("data")), json.dumps(entrada, ensure_ascii=False)),
+            )
+            b._escrita()
+
+    def registar_lote(self, entradas: list[dict]) -> None:
+        b = self._base
+        with b._lock:
+            b._begin()
+            b._conn.executemany(
+                _SQL_REGISTO,
+                [(self._utilizador, _data_int(e.get("data")), json.dumps(e, ensure_ascii=False)) for e in entradas],
+            )
+            b._escrita()
+
+    def obter_ultimas(self, n: int) -> list[dict]:
+        if n <= 0:
+            return []
+        with self._base._lock:
+            rows = self._base._conn.execute(
+                "SELECT entrada FROM registos WHERE utilizador = ? ORDER BY data DESC, id DESC LIMIT ?",
+                (self._utilizador, n),
+            ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        with self._base._lock:
+            rows = self._base._conn.execute(
+                _SQL_INTERVALO,
+                (self._utilizador, _DATA_MIN if t0 is None else t0, _DATA_MAX if t1 is None else t1),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        if limite is not None and limite <= 0:
+            return []
+        with self._base._lock:
+            rows = self._base._conn.execute(
+                _SQL_POR_ESTADO, (self._utilizador, estado, -1 if limite is None else limite)
+            ).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+
+def importar_de_json(base_dir: str | Path, destino: PerfilStoreSQLite) -> int:
+    """
+    Importa (uma vez) todos os perfis de uma pasta do PerfilStoreJSON/PerfilStoreLog.
+    Só lê a pasta de origem (sem locks nem perfis novos). Devolve o número de perfis importados.
+    """
+    from .perfil_store_log import ler_ficheiros
+
+    # slug do nome -> {"base"/"agg"/"log": ficheiro}; perfis só com .agg.json/.log também contam
+    grupos: dict[str, dict[str, Path]] = {}
+    for path in sorted(Path(base_dir).iterdir()):
+        for sufixo, tipo in ((".agg.json", "agg"), (".json", "base"), (".log", "log")):
+            if path.name.endswith(sufixo):
+                stem = path.name[: -len(sufixo)]
+                break
+        else:
+            continue
+        if not path.is_file() or stem.startswith("."):
+            continue
+        chave = slug(normalizar_nome(stem))
+        grupo = grupos.setdefault(chave, {})
+        # ficheiro com o nome já normalizado ganha a um escrito à mão ("Bárbara.json")
+        if tipo not in grupo or stem == chave:
+            grupo[tipo] = path
+
+    total = 0
+    with destino.transacao():
+        for chave, grupo in grupos.items():
+            perfil, _ = ler_ficheiros(grupo.get("base"), grupo.get("agg"), grupo.get("log"), chave)
+            destino.guardar(perfil)
+            total += 1
+    return total
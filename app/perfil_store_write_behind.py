@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import atexit
+import signal
+import threading
+import time
+
+from .perfil import PerfilUtilizador
+from .perfil_store import IPerfilStore, normalizar_nome, slug
+
+
+def _chave(nome: str) -> str:
+    return slug(normalizar_nome(nome))
+
+
+class PerfilStoreWriteBehind(IPerfilStore):
+    """
+    Envolve outro IPerfilStore: guardar() só marca o perfil como sujo e volta logo.
+    Uma thread em background grava a cada `intervalo` segundos ou quando há `limite_sujos` perfis sujos.
+    Vários guardar() do mesmo utilizador entre flushes resultam numa só escrita.
+    """
+
+    def __init__(
+        self,
+        interno: IPerfilStore,
+        intervalo: float = 1.0,
+        limite_sujos: int = 50,
+        instalar_sinais: bool = True,
+    ):
+        self._interno = interno
+        self.intervalo = intervalo
+        self.limite_sujos = limite_sujos
+
+        self._sujos: dict[str, PerfilUtilizador] = {}
+        # tirados de _sujos por um flush mas ainda a ser gravados: carregar continua a vê-los
+        self._a_gravar: dict[str, PerfilUtilizador] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # o interno é chamado pela thread e por quem chama carregar/existe; não é thread-safe
+        # (ex: PerfilStoreLog._persistidos), por isso uma chamada de cada vez
+        self._interno_lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+
+        # métricas
+        self.pedidos = 0
+        self.escritas = 0
+        self.flushes = 0
+        self.ultimo_erro: Exception | None = None
+        self._latencias: list[float] = []
+
+        self._thread = threading.Thread(target=self._ciclo, name="perfil-flusher", daemon=True)
+        self._thread.start()
+
+        atexit.register(self.fechar)
+        if instalar_sinais:
+            self._instalar_sigterm()
+
+    def _instalar_sigterm(self) -> None:
+        # signal.signal só funciona na thread principal
+        if threading.current_thread() is not threading.main_thread():
+            return
+        anterior = signal.getsignal(signal.SIGTERM)
+
+        def _handler(signum, frame):
+            if anterior is signal.SIG_IGN:
+                # o processo escolheu ignorar o SIGTERM e continua a correr: só despeja já
+                self._acordar.set()
+                return
+            # só pede a paragem: fechar() apanha self._lock, que a thread principal pode ter
+            # nas mãos quando o sinal chega. O flush final é feito pela thread ao sair do
+            # ciclo e pelo fechar() do atexit, já fora do handler.
+            self._parar = True
+            self._acordar.set()
+            if callable(anterior):
+                anterior(signum, frame)
+            else:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, _handler)
+
+    # --- IPerfilStore ---
+    def existe(self, nome: str) -> bool:
+        chave = _chave(nome)
+        with self._lock:
+            if chave in self._sujos or chave in self._a_gravar:
+                return True
+        with self._interno_lock:
+            return self._interno.existe(nome)
+
+    def carregar(self, nome: str) -> PerfilUtilizador:
+        chave = _chave(nome)
+        with self._lock:
+            pendente = self._sujos.get(chave) or self._a_gravar.get(chave)
+        if pendente is not None:
+            # o disco ainda não tem a última versão
+            return pendente.copia()
+        with self._interno_lock:
+            return self._interno.carregar(nome)
+
+    def guardar(self, perfil: PerfilUtilizador) -> None:
+        # cópia: o chamador continua a mexer no perfil enquanto a thread grava
+        copia = perfil.copia()
+        with self._lock:
+            self.pedidos += 1
+            self._sujos[_chave(perfil.nome)] = copia
+            cheio = len(self._sujos) >= self.limite_sujos
+        if cheio:
+            self._acordar.set()
+
+    # --- flush ---
+    def _ciclo(self) -> None:
+        while not self._parar:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                lote, self._sujos = self._sujos, {}
+                self._a_gravar.update(lote)
+            if not lote:
+                return
+
+            inicio = time.perf_counter()
+            for chave, perfil in lote.items():
+                try:
+                    with self._interno_lock:
+                        self._interno.guardar(perfil)
+                    self.escritas += 1
+                except Exception as e:  # não perder o perfil: volta a ficar sujo
+                    self.ultimo_erro = e
+                    with self._lock:
+                        self._sujos.setdefault(chave, perfil)
+                finally:
+                    with self._lock:
+                        del self._a_gravar[chave]
+
+            self.flushes += 1
+            self._latencias.append(time.perf_counter() - inicio)
+            if len(self._latencias) > 1000:
+                del self._latencias[:500]
+
+    def fechar(self) -> None:
+        """
+        Pára a thread e grava tudo o que estiver pendente (idempotente).
+        """
+        self._parar = True
+        self._acordar.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        # stores com commits agrupados (ex: PerfilStoreSQLite) também têm de despejar
+        flush_interno = getattr(self._interno, "flush", None)
+        if callable(flush_interno):
+            with self._interno_lock:
+                flush_interno()
+        # o atexit guardava uma referência forte: sem isto nenhuma instância era libertada
+        atexit.unregister(self.fechar)
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencias)
+        return {
+            "pedidos": self.pedidos,
+            "escritas": self.escritas,
+            "flushes": self.flushes,
+            "pendentes": len(self._sujos),
+            # fração de guardar() que não chegou a disco por ter sido juntada a outra
+            "coalescencia": 1.0 - self.escritas / self.pedidos if self.pedidos else 0.0,
+            "latencia_media_s": sum(lat) / len(lat) if lat else 0.0,
+            "latencia_p95_s": lat[int(0.95 * (len(lat) - 1))] if lat else 0.0,
+            "latencia_max_s": lat[-1] if lat else 0.0,
+        }
@@ -1,5 +1,14 @@
 from __future__ import annotations
+import sys
+import threading
 from abc import ABC, abstractmethod
+from typing import Optional
+
+from .concorrencia import ExecutorLimitado
+from .historico_indice import IndiceHistorico, filtrar_intervalo, filtrar_por_estado
+
+# obter_ultimas(TODAS): o histórico inteiro, para as consultas sem índice
+TODAS = sys.maxsize
 
 
 class IPersistencia(ABC):
@@ -11,13 +20,107 @@ class IPersistencia(ABC):
     def obter_ultimas(self, n: int) -> list[dict]:
         ...
 
+    def registar_lote(self, entradas: list[dict]) -> None:
+        # implementações podem gravar tudo de uma vez
+        for e in entradas:
+            self.registar(e)
+
+    # implementações podem usar um índice: ver IndiceHistorico (memória) e PersistenciaSQLite
+    def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        """
+        Entradas com t0 <= data < t1 (time_ns), por ordem de data. None = sem limite.
+        """
+        return filtrar_intervalo(self.obter_ultimas(TODAS), t0, t1)
+
+    def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        """
+        Entradas de um estado pela ordem de registo; com limite, só as últimas `limite`.
+        """
+        return filtrar_por_estado(self.obter_ultimas(TODAS), estado, limite)
+
 
 class PersistenciaMemoria(IPersistencia):
-    def __init__(self) -> None:
-        self._dados: list[dict] = []
+    def __init__(self, maximo: int | None = None, dados: list[dict] | None = None) -> None:
+        # dados: lista já existente (ex: perfil.historico de um perfil carregado), usada no lugar;
+        # se for cortada por fora (ArquivoHistorico.limitar), chamar reindexar()
+        self._dados: list[dict] = [] if dados is None else dados
+        # maximo: guarda só as últimas N (processos longos, ex: serve.py)
+        self.maximo = maximo
+        # atualizado a cada registo (intervalos e estados sem varrer a lista)
+        self._indice = IndiceHistorico(self._dados)
+        self._lock = threading.Lock()
+
+    def _aparar(self) -> None:
+        # corta em blocos (só quando passa 2x) para não pagar um del a cada registo
+        if self.maximo is not None and len(self._dados) > 2 * self.maximo:
+            # o índice faz o del e desloca as posições que ficam
+            self._indice.cortar_inicio(len(self._dados) - self.maximo)
 
     def registar(self, entrada: dict) -> None:
-        self._dados.append(entrada)
+        with self._lock:
+            self._dados.append(entrada)
+            self._indice.acrescentar()
+            self._aparar()
+
+    def registar_lote(self, entradas: list[dict]) -> None:
+        with self._lock:
+            self._dados.extend(entradas)
+            self._indice.acrescentar()
+            self._aparar()
+
+    def reindexar(self) -> None:
+        self._indice.reconstruir()
 
     def obter_ultimas(self, n: int) -> list[dict]:
         return self._dados[-n:]
+
+    def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        return self._indice.intervalo(t0, t1)
+
+    def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        return self._indice.por_estado(estado, limite)
+
+
+class IPersistenciaAsync(ABC):
+    @abstractmethod
+    async def registar(self, entrada: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def obter_ultimas(self, n: int) -> list[dict]:
+        ...
+
+    async def registar_lote(self, entradas: list[dict]) -> None:
+        for e in entradas:
+            await self.registar(e)
+
+    async def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        return filtrar_intervalo(await self.obter_ultimas(TODAS), t0, t1)
+
+    async def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        return filtrar_por_estado(await self.obter_ultimas(TODAS), estado, limite)
+
+
+class PersistenciaAsync(IPersistenciaAsync):
+    """
+    Versão async de qualquer IPersistencia: as chamadas correm no executor (não bloqueiam o loop).
+    """
+
+    def __init__(self, interno: IPersistencia, executor: ExecutorLimitado) -> None:
+        self._interno = interno
+        self._executor = executor
+
+    async def registar(self, entrada: dict) -> None:
+        await self._executor.correr(self._interno.registar, entrada)
+
+    async def registar_lote(self, entradas: list[dict]) -> None:
+        await self._executor.correr(self._interno.registar_lote, entradas)
+
+    async def obter_ultimas(self, n: int) -> list[dict]:
+        return await self._executor.correr(self._interno.obter_ultimas, n)
+
+    async def obter_intervalo(self, t0: Optional[int] = None, t1: Optional[int] = None) -> list[dict]:
+        return await self._executor.correr(self._interno.obter_intervalo, t0, t1)
+
+    async def obter_por_estado(self, estado: str, limite: Optional[int] = None) -> list[dict]:
+        return await self._executor.correr(self._interno.obter_por_estado, estado, limite)
@@ -1,6 +1,33 @@
 from __future__ import annotations
 
-from .dominio import Mensagem, EntradaSessao
+import threading
+from collections import OrderedDict
+from time import perf_counter
+from typing import Callable, Hashable, Optional, Sequence
+
+from .dominio import Mensagem, EntradaSessao, normalizar_texto
+from .metricas import METRICAS
+
+# etapa = função texto -> texto; None = etapa desligada (nem entra na cadeia)
+# as etapas vêm como (nome, f) ou (nome, f, pura); pura = o resultado só depende do texto
+Etapa = Callable[[str], str]
+
+
+class _CapturaId(Mensagem):
+    # pipelines por mixins: a cadeia de super() trata do texto, isto guarda o id pelo caminho
+    def __init__(self, msg: Mensagem):
+        self._msg = msg
+        self.ids: list[Optional[str]] = []
+
+    def gerar_texto(self, entrada: EntradaSessao) -> str:
+        id_mensagem, texto = self._msg.gerar_com_id(entrada)
+        self.ids.append(id_mensagem)
+        return texto
+
+    def gerar_textos(self, entradas: Sequence[EntradaSessao]) -> list[str]:
+        pares = self._msg.gerar_textos_com_id(entradas)
+        self.ids.extend(i for i, _ in pares)
+        return [t for _, t in pares]
 
 
 class PipelineBase:
@@ -10,11 +37,32 @@ class PipelineBase:
     def processar(self, msg: Mensagem, entrada: EntradaSessao) -> str:
         return msg.gerar_texto(entrada)
 
+    def processar_lote(self, msg: Mensagem, entradas: Sequence[EntradaSessao]) -> list[str]:
+        return msg.gerar_textos(entradas)
+
+    def processar_com_id(self, msg: Mensagem, entrada: EntradaSessao) -> tuple[Optional[str], str]:
+        """
+        (id da mensagem escolhida, texto final); o id vem de Mensagem.gerar_com_id.
+        """
+        captura = _CapturaId(msg)
+        texto = self.processar(captura, entrada)
+        return captura.ids[-1], texto
+
+    def processar_lote_com_id(
+        self, msg: Mensagem, entradas: Sequence[EntradaSessao]
+    ) -> list[tuple[Optional[str], str]]:
+        captura = _CapturaId(msg)
+        textos = self.processar_lote(captura, entradas)
+        return list(zip(captura.ids, textos))
+
 
 class NormalizeMixin:
     def processar(self, msg: Mensagem, entrada: EntradaSessao) -> str:
         texto = super().processar(msg, entrada)
-        return " ".join(texto.strip().split())
+        return normalizar_texto(texto)
+
+    def processar_lote(self, msg: Mensagem, entradas: Sequence[EntradaSessao]) -> list[str]:
+        return [normalizar_texto(t) for t in super().processar_lote(msg, entradas)]
 
 
 class LoggingMixin:
@@ -28,6 +76,13 @@ class LoggingMixin:
             self.logger.registar(f"[LOG] texto_final='{texto}'")
         return texto
 
+    def processar_lote(self, msg: Mensagem, entradas: Sequence[EntradaSessao]) -> list[str]:
+        textos = super().processar_lote(msg, entradas)
+        if self.logger and hasattr(self.logger, "registar") and callable(self.logger.registar):
+            for texto in textos:
+                self.logger.registar(f"[LOG] texto_final='{texto}'")
+        return textos
+
 
 class CacheUltimoMixin:
     def __init__(self, **kwargs):
@@ -39,10 +94,260 @@ class CacheUltimoMixin:
         self.ultimo_texto = texto
         return texto
 
+    def processar_lote(self, msg: Mensagem, entradas: Sequence[EntradaSessao]) -> list[str]:
+        textos = super().processar_lote(msg, entradas)
+        if textos:
+            self.ultimo_texto = textos[-1]
+        return textos
+
+
+class MemoLRU:
+    """
+    Cache LRU pequena (id da mensagem -> texto já processado pelas etapas puras).
+    Com lock: o pipeline também corre nas threads do ExecutorLimitado, e um move_to_end
+    de uma chave que outra thread acabou de despejar dava KeyError.
+    """
+
+    __slots__ = ("_d", "_lock", "maximo", "hits", "misses")
+
+    def __init__(self, maximo: int):
+        self._d: OrderedDict[Hashable, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.maximo = maximo
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, chave: Hashable) -> Optional[str]:
+        with self._lock:
+            texto = self._d.get(chave)
+            if texto is None:
+                self.misses += 1
+                return None
+            self._d.move_to_end(chave)
+            self.hits += 1
+            return texto
+
+    def guardar(self, chave: Hashable, texto: str) -> None:
+        with self._lock:
+            self._d[chave] = texto
+            if len(self._d) > self.maximo:
+                self._d.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._d.clear()
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+
+class PipelineCompilado(PipelineBase):
+    """
+    Junta uma lista ordenada de etapas numa só função, composta uma vez (sem super() por etapa).
+    perfilar=True embrulha cada etapa para medir o seu tempo (ver stats()).
+    Com as métricas ligadas (METRICAS.ativar()), cada etapa vai também para o histograma
+    "pipeline.<nome>"; o pipeline recompila sozinho quando as métricas ligam/desligam.
+
+    memo=N guarda (LRU de N entradas) o resultado das etapas puras iniciais por id de mensagem
+    (Mensagem.gerar_com_id); mensagens sem id (None) passam sempre por todas as etapas.
+    """
+
+    def __init__(
+        self,
+        etapas: Sequence[tuple] = (),
+        perfilar: bool = False,
+        memo: int = 0,
+        **kwargs,
+    ):
+        self._etapas_fixas = list(etapas)
+        self.perfilar = perfilar
+        self.memo = MemoLRU(memo) if memo > 0 else None
+        super().__init__(**kwargs)
+        self.compilar()
+        METRICAS.ao_mudar(self.compilar)
+
+    def etapas(self) -> list[tuple]:
+        return self._etapas_fixas
+
+    def _medida(self, i: int, nome: str, f: Etapa, metricas: bool) -> Etapa:
+        # etapa embrulhada para perfilar=True e/ou métricas ligadas
+        tempos, chamadas, perfilar = self._tempos, self._chamadas, self.perfilar
+        observar = METRICAS.observar if metricas else None
+        histograma = f"pipeline.{nome}"
+
+        def medida(t: str) -> str:
+            t0 = perf_counter()
+            t = f(t)
+            dt = perf_counter() - t0
+            if perfilar:
+                tempos[i] += dt
+                chamadas[i] += 1
+            if observar is not None:
+                observar(histograma, dt)
+            return t
 
-class PipelineCompleto(LoggingMixin, CacheUltimoMixin, NormalizeMixin, PipelineBase):
-    pass
+        return medida
 
+    @staticmethod
+    def _encadear(fs: list[Etapa]) -> Etapa:
+        # composição fixa das etapas, sem ciclo por chamada: até 4 numa só lambda,
+        # mais do que isso em grupos de 4 (uma chamada extra por grupo)
+        if not fs:
+            return lambda t: t
+        if len(fs) == 1:
+            return fs[0]
+        if len(fs) == 2:
+            a, b = fs
+            return lambda t: b(a(t))
+        if len(fs) == 3:
+            a, b, c = fs
+            return lambda t: c(b(a(t)))
+        if len(fs) == 4:
+            a, b, c, d = fs
+            return lambda t: d(c(b(a(t))))
+        inicio, fim = PipelineCompilado._encadear(fs[:4]), PipelineCompilado._encadear(fs[4:])
+        return lambda t: fim(inicio(t))
+
+    def compilar(self) -> None:
+        ativas = [(e[0], e[1], len(e) > 2 and bool(e[2])) for e in self.etapas() if e[1] is not None]
+        self.nomes_etapas = [nome for nome, _, _ in ativas]
+        self._chamadas = [0] * len(ativas)
+        self._tempos = [0.0] * len(ativas)
+        if self.memo is not None:
+            # as etapas podem ter mudado: resultados antigos deixam de valer
+            self.memo.limpar()
+
+        # prefixo de etapas puras: só essas podem ser reaproveitadas por id de mensagem
+        n_puras = 0
+        while self.memo is not None and n_puras < len(ativas) and ativas[n_puras][2]:
+            n_puras += 1
+
+        metricas = METRICAS.ativo
+        fs = [
+            self._medida(i, nome, f, metricas) if self.perfilar or metricas else f
+            for i, (nome, f, _) in enumerate(ativas)
+        ]
+        cadeia = self._encadear(fs)
+
+        if n_puras:
+            puras, resto = self._encadear(fs[:n_puras]), self._encadear(fs[n_puras:])
+            memo_obter, memo_guardar = self.memo.obter, self.memo.guardar
+
+            def aplicar(chave: Optional[Hashable], t: str) -> str:
+                if chave is None:
+                    return cadeia(t)
+                r = memo_obter(chave)
+                if r is None:
+                    r = puras(t)
+                    memo_guardar(chave, r)
+                return resto(r)
+
+            def processar(msg: Mensagem, entrada: EntradaSessao) -> str:
+                return aplicar(*msg.gerar_com_id(entrada))
+
+            def processar_com_id(msg: Mensagem, entrada: EntradaSessao) -> tuple[Optional[str], str]:
+                chave, t = msg.gerar_com_id(entrada)
+                return chave, aplicar(chave, t)
+        else:
+            aplicar = None
+
+            def processar(msg: Mensagem, entrada: EntradaSessao) -> str:
+                return cadeia(msg.gerar_texto(entrada))
+
+            def processar_com_id(msg: Mensagem, entrada: EntradaSessao) -> tuple[Optional[str], str]:
+                chave, t = msg.gerar_com_id(entrada)
+                return chave, cadeia(t)
+
+        self._cadeia = cadeia
+        self._aplicar = aplicar
+        # atributo de instância: HelpApp chama pipeline.processar(msg, entrada) diretamente
+        self.processar = processar
+        self.processar_com_id = processar_com_id
+
+    def processar_lote(self, msg: Mensagem, entradas: Sequence[EntradaSessao]) -> list[str]:
+        if self._aplicar is not None:
+            aplicar = self._aplicar
+            return [aplicar(chave, t) for chave, t in msg.gerar_textos_com_id(entradas)]
+        cadeia = self._cadeia
+        return [cadeia(t) for t in msg.gerar_textos(entradas)]
+
+    def processar_lote_com_id(
+        self, msg: Mensagem, entradas: Sequence[EntradaSessao]
+    ) -> list[tuple[Optional[str], str]]:
+        pares = msg.gerar_textos_com_id(entradas)
+        if self._aplicar is not None:
+            aplicar = self._aplicar
+            return [(chave, aplicar(chave, t)) for chave, t in pares]
+        cadeia = self._cadeia
+        return [(chave, cadeia(t)) for chave, t in pares]
+
+    def stats(self) -> dict:
+        res = {
+            nome: {"chamadas": self._chamadas[i], "total_s": self._tempos[i]}
+            for i, nome in enumerate(self.nomes_etapas)
+        }
+        if self.memo is not None:
+            total = self.memo.hits + self.memo.misses
+            res["memo"] = {
+                "hits": self.memo.hits,
+                "misses": self.memo.misses,
+                "hit_ratio": self.memo.hits / total if total else 0.0,
+                "tamanho": len(self.memo),
+            }
+        return res
+
+
+class PipelineSemCache(PipelineCompilado):
+    """
+    Preset: normalizar -> log (o log só existe se houver logger com registar()).
+    normalizar=False desliga a etapa (catálogo já pré-normalizado, ver CatalogoMensagens).
+    """
+
+    def __init__(self, logger=None, perfilar: bool = False, memo: int = 0, normalizar: bool = True, **kwargs):
+        self._logger = logger
+        self._normalizar = normalizar_texto if normalizar else None
+        super().__init__(perfilar=perfilar, memo=memo, **kwargs)
+
+    @property
+    def logger(self):
+        return self._logger
+
+    @logger.setter
+    def logger(self, logger) -> None:
+        self._logger = logger
+        self.compilar()
+
+    def _etapa_log(self) -> Optional[Etapa]:
+        registar = getattr(self._logger, "registar", None) if self._logger else None
+        if not callable(registar):
+            return None
+
+        def _log(texto: str) -> str:
+            registar(f"[LOG] texto_final='{texto}'")
+            return texto
+
+        return _log
+
+    def etapas(self) -> list[tuple]:
+        return [("normalizar", self._normalizar, True), ("log", self._etapa_log())]
+
+
+class PipelineCompleto(PipelineSemCache):
+    """
+    Preset: normalizar -> cache do último texto -> log (mesma ordem que os mixins).
+    """
+
+    def __init__(self, logger=None, perfilar: bool = False, memo: int = 0, normalizar: bool = True, **kwargs):
+        self.ultimo_texto = None
+        super().__init__(logger=logger, perfilar=perfilar, memo=memo, normalizar=normalizar, **kwargs)
+
+    def _guardar_ultimo(self, texto: str) -> str:
+        self.ultimo_texto = texto
+        return texto
 
-class PipelineSemCache(LoggingMixin, NormalizeMixin, PipelineBase):
-    pass
+    def etapas(self) -> list[tuple]:
+        return [
+            ("normalizar", self._normalizar, True),
+            ("cache", self._guardar_ultimo),
+            ("log", self._etapa_log()),
+        ]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional, só acelera o lote
+    np = None
+
+from .dominio import EntradaSessao
+
+_MASK64 = (1 << 64) - 1
+
+
+class ISeletor(ABC):
+    """
+    Estratégia que escolhe o índice de uma mensagem dentro de um grupo com n mensagens.
+    Tem de ser determinística: a mesma entrada dá sempre o mesmo índice.
+    """
+
+    @abstractmethod
+    def escolher(self, estado: str, entrada: EntradaSessao, n: int) -> int:
+        ...
+
+    def escolher_lote(self, entradas: Sequence[EntradaSessao], tamanhos: Sequence[int]) -> list[int]:
+        return [self.escolher(e.estado, e, n) for e, n in zip(entradas, tamanhos)]
+
+
+class SeletorSHA256(ISeletor):
+    """
+    Seleção original (sha256 da chave em texto). Mantida por compatibilidade.
+    """
+
+    def escolher(self, estado: str, entrada: EntradaSessao, n: int) -> int:
+        data = getattr(entrada, "data", "")
+        chave = f"{estado}|{entrada.intensidade}|{getattr(entrada, 'utilizador', '')}|{data}"
+        h = hashlib.sha256(chave.encode("utf-8")).hexdigest()
+        return int(h[:8], 16) % n
+
+
+def _splitmix64(x: int) -> int:
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+class SeletorMistura(ISeletor):
+    """
+    Mistura não criptográfica (crc32 + splitmix64) sobre (estado, intensidade, utilizador, data).
+    Estável entre processos e uniforme nos 32 bits altos, tal como o sha256 truncado.
+    """
+
+    def __init__(self) -> None:
+        # semente por (estado, intensidade, utilizador): poucos valores, muito repetidos
+        self._sementes: dict[tuple, int] = {}
+
+    def _semente(self, estado: str, intensidade: int, utilizador: str) -> int:
+        chave = (estado, intensidade, utilizador)
+        s = self._sementes.get(chave)
+        if s is None:
+            raw = f"{estado}|{intensidade}|{utilizador}".encode("utf-8")
+            s = _splitmix64(zlib.crc32(raw) | (len(raw) << 32))
+            if len(self._sementes) < 65536:
+                self._sementes[chave] = s
+        return s
+
+    @staticmethod
+    def _data_int(data) -> int:
+        if isinstance(data, int):
+            return data & _MASK64
+        return zlib.crc32(str(data).encode("utf-8"))
+
+    def escolher(self, estado: str, entrada: EntradaSessao, n: int) -> int:
+        s = self._semente(estado, entrada.intensidade, getattr(entrada, "utilizador", ""))
+        x = _splitmix64(s ^ self._data_int(getattr(entrada, "data", "")))
+        return (x >> 32) % n
+
+    def escolher_lote(self, entradas: Sequence[EntradaSessao], tamanhos: Sequence[int]) -> list[int]:
+        if np is None or len(entradas) < 64:
+            return super().escolher_lote(entradas, tamanhos)
+
+        sementes = np.fromiter(
+            (self._semente(e.estado, e.intensidade, getattr(e, "utilizador", "")) for e in entradas),
+            dtype=np.uint64,
+            count=len(entradas),
+        )
+        datas = np.fromiter(
+            (self._data_int(getattr(e, "data", "")) for e in entradas),
+            dtype=np.uint64,
+            count=len(entradas),
+        )
+        x = _splitmix64_np(sementes ^ datas)
+        return ((x >> np.uint64(32)) % np.asarray(tamanhos, dtype=np.uint64)).tolist()
+
+
+def _splitmix64_np(x):
+    # uint64 faz wrap-around como o & _MASK64 da versão escalar
+    with np.errstate(over="ignore"):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def criar_seletor(nome: str = "mistura") -> ISeletor:
+    seletores = {"mistura": SeletorMistura, "sha256": SeletorSHA256}
+    if nome not in seletores:
+        raise ValueError(f"Seletor desconhecido: {nome}")
+    return seletores[nome]()
+
@@ -0,0 +1,443 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .app import AsyncHelpApp
+from .catalogo import CatalogoMensagens
+from .catalogo_recarregavel import CatalogoRecarregavel
+from .concorrencia import ExecutorLimitado
+from .estado_compacto import registar_estados
+from .historico import HistoricoAsync
+from .historico_arquivo import ArquivoHistorico
+from .historico_ids import ResolvedorMensagens
+from .mensagens import MensagemCatalogoSemRepeticao
+from .metricas import METRICAS, texto_prometheus
+from .persistence import PersistenciaAsync, PersistenciaMemoria
+from .perfil_store_async import PerfilStoreAsync
+from .perfil_store_cache import PerfilStoreCache
+from .perfil_store_log import PerfilStoreLog
+from .perfil_store_write_behind import PerfilStoreWriteBehind
+from .pipeline import PipelineCompleto
+
+_RAZOES = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+
+_JSON = "application/json; charset=utf-8"
+TIPO_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RespostaHTTP(NamedTuple):
+    # para tratadores que escolhem o status/tipo; dados em bytes vão tal e qual
+    status: int
+    dados: Any
+    tipo: str = _JSON
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class ServidorHTTPBase:
+    """
+    Protocolo HTTP/1.1 mínimo (só stdlib, asyncio): keep-alive, Content-Length, respostas JSON.
+    A ligação fica aberta até `Connection: close` ou `timeout_idle`.
+    Subclasses dizem as rotas em _rotas(): {caminho: (método, tratador(query, corpo))}.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        timeout_idle: float = 15.0,
+        max_corpo: int = 64 * 1024,
+    ):
+        self.host = host
+        self.port = port
+        self.timeout_idle = timeout_idle
+        self.max_corpo = max_corpo
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._inicio = time.monotonic()
+
+        self.pedidos = 0
+        self.erros = 0
+        self.ligacoes = 0
+        self.ligacoes_abertas = 0
+        # pedidos servidos numa ligação já usada antes (keep-alive a funcionar)
+        self.reutilizacoes = 0
+        self.por_rota: dict[str, int] = {}
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def _rotas(self) -> dict[str, tuple[str, Callable[[dict, bytes], Awaitable[Any]]]]:
+        return {"/saude": ("GET", self._saude)}
+
+    # --- ciclo de vida ---
+    async def iniciar(self) -> None:
+        self._servidor = await asyncio.start_server(self._ligacao, self.host, self.port, reuse_address=True)
+        # port=0 -> o SO escolhe; útil em testes
+        self.port = self._servidor.sockets[0].getsockname()[1]
+
+    async def servir(self, parar: Optional[asyncio.Event] = None) -> None:
+        if self._servidor is None:
+            await self.iniciar()
+        try:
+            if parar is None:
+                await self._servidor.serve_forever()
+            else:
+                await parar.wait()
+        finally:
+            await self.fechar()
+
+    async def fechar(self) -> None:
+        if self._servidor is not None:
+            self._servidor.close()
+            # ligações keep-alive paradas não deixariam o wait_closed acabar
+            for writer in list(self._writers):
+                writer.close()
+            await self._servidor.wait_closed()
+
+    # --- HTTP ---
+    async def _ligacao(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.ligacoes += 1
+        self.ligacoes_abertas += 1
+        self._writers.add(writer)
+        servidos = 0
+        try:
+            while True:
+                try:
+                    cabecalho = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout_idle)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.CancelledError:
+                    # loop a terminar com a ligação parada à espera do próximo pedido
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._responder(writer, 413, {"erro": "cabeçalhos demasiado grandes"}, manter=False)
+                    return
+
+                try:
+                    metodo, alvo, versao, headers = self._parse_cabecalho(cabecalho)
+                    manter = self._keep_alive(versao, headers)
+                    corpo = await self._ler_corpo(reader, headers)
+                except ErroHTTP as e:
+                    self.erros += 1
+                    await self._responder(writer, e.status, {"erro": str(e)}, manter=False)
+                    return
+
+                if servidos:
+                    self.reutilizacoes += 1
+                servidos += 1
+                status, dados, tipo = await self._tratar(metodo, alvo, corpo)
+                await self._responder(writer, status, dados, manter, tipo)
+                if not manter:
+                    return
+        finally:
+            self.ligacoes_abertas -= 1
+            self._writers.discard(writer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    @staticmethod
+    def _parse_cabecalho(raw: bytes) -> tuple[str, str, str, dict[str, str]]:
+        try:
+            linhas = raw.decode("latin-1").split("\r\n")
+            metodo, alvo, versao = linhas[0].split(" ", 2)
+        except ValueError:
+            raise ErroHTTP(400, "pedido inválido") from None
+        headers = {}
+        for linha in linhas[1:]:
+            if not linha:
+                continue
+            nome, _, valor = linha.partition(":")
+            headers[nome.strip().lower()] = valor.strip()
+        return metodo.upper(), alvo, versao.upper(), headers
+
+    @staticmethod
+    def _keep_alive(versao: str, headers: dict[str, str]) -> bool:
+        conn = headers.get("connection", "").lower()
+        if versao == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+    async def _ler_corpo(self, reader: asyncio.StreamReader, headers: dict[str, str]) -> bytes:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise ErroHTTP(400, "chunked não suportado, usar Content-Length")
+        try:
+            n = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise ErroHTTP(400, "Content-Length inválido") from None
+        if n < 0:
+            raise ErroHTTP(400, "Content-Length inválido")
+        if n > self.max_corpo:
+            raise ErroHTTP(413, "corpo demasiado grande")
+        if not n:
+            return b""
+        try:
+            return await asyncio.wait_for(reader.readexactly(n), self.timeout_idle)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+            raise ErroHTTP(408, "corpo incompleto") from None
+
+    async def _responder(
+        self, writer: asyncio.StreamWriter, status: int, dados: Any, manter: bool, tipo: str = _JSON
+    ) -> None:
+        if isinstance(dados, str):
+            dados = dados.encode("utf-8")
+        corpo = dados if isinstance(dados, bytes) else json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        cab = (
+            f"HTTP/1.1 {status} {_RAZOES.get(status, '')}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            f"Connection: {'keep-alive' if manter else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(cab.encode("latin-1") + corpo)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    # --- rotas ---
+    async def _tratar(self, metodo: str, alvo: str, corpo: bytes) -> RespostaHTTP:
+        url = urlsplit(alvo)
+        rota = url.path.rstrip("/") or "/"
+        # caminhos desconhecidos contam todos juntos (não criar uma chave por URL inventado)
+        chave = rota if rota in self._rotas() else "desconhecida"
+        self.pedidos += 1
+        self.por_rota[chave] = self.por_rota.get(chave, 0) + 1
+
+        t0 = time.perf_counter()
+        res = await self._despachar(metodo, rota, url.query, corpo)
+        if METRICAS.ativo:
+            METRICAS.observar("http" + chave.replace("/", "."), time.perf_counter() - t0)
+            METRICAS.contar(f"http.status.{res.status}")
+        return res
+
+    async def _despachar(self, metodo: str, rota: str, query: str, corpo: bytes) -> RespostaHTTP:
+        tratadores = self._rotas()
+        try:
+            if rota not in tratadores:
+                raise ErroHTTP(404, f"rota desconhecida: {rota}")
+            esperado, f = tratadores[rota]
+            if metodo != esperado:
+                raise ErroHTTP(405, f"usar {esperado} em {rota}")
+            res = await f({k: v[-1] for k, v in parse_qs(query).items()}, corpo)
+            if isinstance(res, RespostaHTTP):
+                return res
+            return RespostaHTTP(200, res)
+        except ErroHTTP as e:
+            self.erros += 1
+            return RespostaHTTP(e.status, {"erro": str(e)})
+        except Exception as e:  # o servidor continua; o erro vai na resposta
+            self.erros += 1
+            return RespostaHTTP(500, {"erro": f"{type(e).__name__}: {e}"})
+
+    @staticmethod
+    def _json(corpo: bytes) -> dict:
+        try:
+            dados = json.loads(corpo.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ErroHTTP(400, "JSON inválido") from None
+        if not isinstance(dados, dict):
+            raise ErroHTTP(400, "esperado um objeto JSON")
+        return dados
+
+    @staticmethod
+    def _nome(valor: Any) -> str:
+        nome = str(valor or "").strip()
+        if not nome:
+            raise ErroHTTP(400, "falta o nome")
+        return nome
+
+    def _stats_base(self) -> dict:
+        return {
+            "uptime_s": time.monotonic() - self._inicio,
+            "pedidos": self.pedidos,
+            "erros": self.erros,
+            "ligacoes": self.ligacoes,
+            "ligacoes_abertas": self.ligacoes_abertas,
+            "reutilizacoes_keep_alive": self.reutilizacoes,
+            "por_rota": dict(self.por_rota),
+        }
+
+    async def _saude(self, query: dict, corpo: bytes) -> dict:
+        return {"ok": True}
+
+    async def _metrics(self, query: dict, corpo: bytes) -> RespostaHTTP:
+        # formato de texto do Prometheus (vazio enquanto as métricas estiverem desligadas)
+        return RespostaHTTP(200, texto_prometheus(METRICAS.instantaneo()), TIPO_PROMETHEUS)
+
+
+
+class ServidorHTTP(ServidorHTTPBase):
+    """
+    Serviço HTTP/JSON à volta do AsyncHelpApp.
+
+    Rotas:
+      POST /sessao      {"nome": "...", "estado": "feliz"} -> mensagem + intensidade
+      GET  /historico   ?nome=...&n=5 -> últimas sessões do perfil
+      GET  /stats       contadores do servidor (+ stats() do store/pipeline se existirem)
+      GET  /saude       para o load balancer
+      GET  /metrics     métricas (app.metricas) em formato Prometheus
+
+    O catálogo, o pipeline e o store são partilhados por todos os pedidos.
+    """
+
+    def __init__(
+        self,
+        app: AsyncHelpApp,
+        estados: list[str],
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        catalogo: Optional[CatalogoMensagens] = None,
+        resolvedor: Optional[ResolvedorMensagens] = None,
+        **kwargs,
+    ):
+        super().__init__(host, port, **kwargs)
+        self.app = app
+        self.estados = set(estados)
+        # só para /stats (geração/recargas quando é um CatalogoRecarregavel)
+        self.catalogo = catalogo
+        # o histórico do perfil guarda ids: o texto é preenchido na resposta do /historico
+        self.resolvedor = resolvedor
+
+    def _rotas(self) -> dict:
+        return {
+            "/sessao": ("POST", self._sessao),
+            "/historico": ("GET", self._historico),
+            "/stats": ("GET", self._stats),
+            "/saude": ("GET", self._saude),
+            "/metrics": ("GET", self._metrics),
+        }
+
+    async def _sessao(self, query: dict, corpo: bytes) -> dict:
+        dados = self._json(corpo)
+        nome = self._nome(dados.get("nome"))
+        estado = str(dados.get("estado", "")).strip().lower()
+        if estado not in self.estados:
+            raise ErroHTTP(400, f"estado desconhecido: {estado!r}")
+
+        perfil, entrada, texto = await self.app.sessao(nome, estado)
+        return {
+            "nome": perfil.nome,
+            "estado": estado,
+            "intensidade": entrada.intensidade,
+            "mensagem": texto,
+            "total_sessoes": perfil.total_sessoes,
+        }
+
+    async def _historico(self, query: dict, corpo: bytes) -> dict:
+        nome = self._nome(query.get("nome"))
+        try:
+            n = max(0, min(100, int(query.get("n", "5"))))
+        except ValueError:
+            raise ErroHTTP(400, "n inválido") from None
+        async with self.app.locks.lock(nome):
+            # carregar criava (e gravava) um perfil novo: um GET não pode escrever
+            if not await self.app.store.existe(nome):
+                raise ErroHTTP(404, f"utilizador desconhecido: {nome!r}")
+            perfil = await self.app.store.carregar(nome)
+        historico = perfil.historico[-n:] if n else []
+        if self.resolvedor is not None:
+            historico = self.resolvedor.resolver(historico)
+        return {"nome": perfil.nome, "historico": historico}
+
+    async def _stats(self, query: dict, corpo: bytes) -> dict:
+        out = self._stats_base()
+        out["workers_io"] = self.app.executor.max_workers if self.app.executor else 0
+        for nome, obj in (("store", self.app.store), ("pipeline", self.app.pipeline), ("catalogo", self.catalogo)):
+            stats = getattr(obj, "stats", None)
+            if callable(stats):
+                out[nome] = stats()
+        return out
+
+
+def workers_por_defeito() -> int:
+    # threads de I/O (perfis em disco): uma por CPU
+    return os.cpu_count() or 1
+
+
+def montar_servidor(
+    mensagens_path: str | Path,
+    perfis_dir: str | Path,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    workers: int | None = None,
+    metricas: bool = False,
+    recarregar: float = 0.0,
+    catalogo: Optional[CatalogoMensagens] = None,
+) -> tuple[ServidorHTTP, Callable[[], None]]:
+    """
+    Monta o serviço completo (catálogo compilado, cache -> write-behind -> log, arquivo).
+    recarregar > 0: o catálogo é recarregado a quente (verifica o JSON a cada `recarregar` s).
+    catalogo: já carregado por quem chama (ex: herdado do pai no fork); ignora recarregar.
+    Devolve o servidor e a função que grava os perfis pendentes e pára as threads.
+    """
+    if metricas:
+        METRICAS.ativar()
+    perfis_dir = Path(perfis_dir)
+    # partilhado por todos os pedidos
+    versoes = Path(mensagens_path).with_suffix(".versoes")
+    if catalogo is None and recarregar > 0:
+        catalogo = CatalogoRecarregavel(mensagens_path, intervalo=recarregar, compilado=True, pasta_versoes=versoes)
+    elif catalogo is None:
+        catalogo = CatalogoMensagens(mensagens_path, compilado=True)
+    registar_estados(catalogo.estados())
+    # ids no histórico dos perfis continuam a ter texto se o JSON mudar
+    catalogo.guardar_versao(versoes)
+    resolvedor = ResolvedorMensagens(catalogo, versoes)
+
+    executor = ExecutorLimitado(max_workers=workers or workers_por_defeito())
+    # sinais tratados pelo loop asyncio de quem chama, não pelo write-behind
+    write_behind = PerfilStoreWriteBehind(PerfilStoreLog(perfis_dir), instalar_sinais=False)
+    store = PerfilStoreAsync(PerfilStoreCache(write_behind), executor)
+
+    app = AsyncHelpApp(
+        PipelineCompleto(logger=None),
+        HistoricoAsync(PersistenciaAsync(PersistenciaMemoria(maximo=1000), executor)),
+        store=store,
+        criar_mensagem=lambda perfil: MensagemCatalogoSemRepeticao(catalogo, perfil),
+        arquivo=ArquivoHistorico(perfis_dir),
+        executor=executor,
+    )
+
+    def libertar() -> None:
+        write_behind.fechar()
+        executor.fechar()
+        resolvedor.fechar()
+        catalogo.fechar()
+
+    return ServidorHTTP(app, catalogo.estados(), host, port, catalogo=catalogo, resolvedor=resolvedor), libertar
+
+
+async def correr_ate_sinal(servidor: ServidorHTTPBase) -> None:
+    """
+    Serve até SIGINT/SIGTERM (em Windows só Ctrl+C, via KeyboardInterrupt).
+    """
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, parar.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    await servidor.servir(parar)
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import gc
+import hashlib
+import json
+import multiprocessing
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import urlencode
+
+from .catalogo import CatalogoMensagens
+from .catalogo_binario import FontePartilhada, garantir_compilado, publicar_catalogo
+from .perfil_store import normalizar_nome, slug
+from .servidor import (
+    TIPO_PROMETHEUS,
+    ErroHTTP,
+    RespostaHTTP,
+    ServidorHTTPBase,
+    correr_ate_sinal,
+    montar_servidor,
+)
+
+
+def chave_utilizador(nome: str) -> str:
+    # a mesma chave que os stores usam para o nome do ficheiro (PerfilStoreJSON._slug)
+    return slug(normalizar_nome(nome))
+
+
+def _hash64(texto: str) -> int:
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class AnelConsistente:
+    """
+    Hash consistente: cada nó tem `vnodes` pontos no anel e uma chave pertence ao
+    primeiro ponto a seguir ao seu hash. Mudar o nº de nós só mexe em ~1/N das chaves.
+    """
+
+    def __init__(self, nos: Iterable[int], vnodes: int = 128):
+        pontos = sorted((_hash64(f"{no}#{v}"), no) for no in nos for v in range(vnodes))
+        if not pontos:
+            raise ValueError("AnelConsistente precisa de pelo menos um nó")
+        self._hashes = [h for h, _ in pontos]
+        self._nos = [no for _, no in pontos]
+
+    def dono(self, chave: str) -> int:
+        i = bisect.bisect(self._hashes, _hash64(chave))
+        return self._nos[i % len(self._nos)]
+
+
+class ClienteWorker:
+    """
+    Cliente HTTP/1.1 mínimo para um worker, com ligações keep-alive reaproveitadas.
+    """
+
+    def __init__(self, host: str, port: int, max_livres: int = 64):
+        self.host = host
+        self.port = port
+        self.max_livres = max_livres
+        self._livres: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _ligar(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        while self._livres:
+            reader, writer = self._livres.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return reader, writer, False
+
+    @staticmethod
+    async def _ler_resposta(reader: asyncio.StreamReader) -> tuple[int, bytes, bool]:
+        raw = await reader.readuntil(b"\r\n\r\n")
+        linhas = raw.decode("latin-1").split("\r\n")
+        status = int(linhas[0].split(" ", 2)[1])
+        headers = {}
+        for linha in linhas[1:]:
+            nome, _, valor = linha.partition(":")
+            headers[nome.strip().lower()] = valor.strip()
+        corpo = await reader.readexactly(int(headers.get("content-length", "0")))
+        return status, corpo, headers.get("connection", "").lower() != "close"
+
+    async def pedido(self, metodo: str, alvo: str, corpo: bytes = b"") -> tuple[int, bytes]:
+        pedido = (
+            f"{metodo} {alvo} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            "\r\n"
+        ).encode("latin-1") + corpo
+
+        for tentativa in range(2):
+            reader, writer, reusada = await self._ligar()
+            try:
+                writer.write(pedido)
+                await writer.drain()
+                status, resposta, manter = await self._ler_resposta(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                # o worker fechou a ligação parada sem ler o pedido: tenta uma vez numa nova
+                vazio = not isinstance(e, asyncio.IncompleteReadError) or not e.partial
+                if reusada and vazio and tentativa == 0:
+                    continue
+                raise
+            if manter and len(self._livres) < self.max_livres:
+                self._livres.append((reader, writer))
+            else:
+                writer.close()
+            return status, resposta
+        raise ConnectionError("sem ligação ao worker")
+
+    def fechar(self) -> None:
+        for _, writer in self._livres:
+            writer.close()
+        self._livres.clear()
+
+
+# como os workers obtêm o catálogo (ver PoolWorkers)
+MODOS_CATALOGO = ("mmap", "fork", "shm")
+
+
+def _worker(
+    indice: int,
+    mensagens_path: str,
+    perfis_dir: str,
+    workers_io: int,
+    metricas: bool,
+    recarregar: float,
+    catalogo: Optional[CatalogoMensagens],
+    shm_nome: Optional[str],
+    conn,
+) -> None:
+    if shm_nome is not None:
+        catalogo = CatalogoMensagens(mensagens_path, fonte=FontePartilhada(shm_nome))
+
+    async def principal() -> None:
+        servidor, libertar = montar_servidor(
+            mensagens_path, perfis_dir, "127.0.0.1", 0, workers_io, metricas, recarregar, catalogo
+        )
+        try:
+            await servidor.iniciar()
+            conn.send(servidor.port)
+            conn.close()
+            await correr_ate_sinal(servidor)
+        finally:
+            libertar()
+
+    asyncio.run(principal())
+
+
+class PoolWorkers:
+    """
+    N processos, cada um com o seu ServidorHTTP (porta local escolhida pelo SO).
+    Cada worker só recebe os utilizadores do seu shard, por isso guarda os perfis
+    em memória (cache + write-behind) sem disputar ficheiros com os outros processos.
+
+    modo_catalogo:
+    - "mmap": cada worker abre o .bin compilado (textos partilhados pela page cache);
+    - "fork": o pai carrega o JSON uma vez, faz gc.freeze() e os workers herdam-no no fork
+      (listas de str já prontas; só as páginas com strings usadas são copiadas);
+    - "shm": o pai copia o .bin para multiprocessing.shared_memory e os workers só o leem.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        mensagens_path: str | Path,
+        perfis_dir: str | Path,
+        workers_io: int = 2,
+        metricas: bool = False,
+        recarregar: float = 0.0,
+        modo_catalogo: str = "mmap",
+    ):
+        if modo_catalogo not in MODOS_CATALOGO:
+            raise ValueError(f"modo_catalogo inválido: {modo_catalogo!r} (use {', '.join(MODOS_CATALOGO)})")
+        if recarregar and modo_catalogo != "mmap":
+            raise ValueError("recarregar só funciona com modo_catalogo='mmap'")
+        self.n = n
+        self.modo_catalogo = modo_catalogo
+        self._catalogo: Optional[CatalogoMensagens] = None
+        self._shm = None
+        self.metricas = metricas
+        # cada worker vigia o JSON e troca o seu catálogo sozinho
+        self.recarregar = recarregar
+        self.mensagens_path = str(mensagens_path)
+        self.perfis_dir = str(perfis_dir)
+        self.workers_io = workers_io
+        self.processos: list[multiprocessing.Process] = []
+        self.portas: list[int] = []
+
+    def iniciar(self, timeout: float = 30.0) -> list[int]:
+        # compila o catálogo aqui: N workers a compilar ao mesmo tempo faziam o trabalho N vezes
+        bin_path = garantir_compilado(self.mensagens_path)
+        Path(self.perfis_dir).mkdir(parents=True, exist_ok=True)
+
+        ctx = multiprocessing
+        if self.modo_catalogo == "fork":
+            # o catálogo passa por herança de memória, não por pickle: tem de ser fork
+            ctx = multiprocessing.get_context("fork")
+            self._catalogo = CatalogoMensagens(self.mensagens_path)
+            # objetos já existentes saem das coleções do gc: os filhos não lhes escrevem
+            # nos cabeçalhos e as páginas continuam partilhadas (copy-on-write)
+            gc.freeze()
+        elif self.modo_catalogo == "shm":
+            self._shm = publicar_catalogo(bin_path)
+
+        ligacoes = []
+        try:
+            for i in range(self.n):
+                pai, filho = ctx.Pipe(duplex=False)
+                p = ctx.Process(
+                    target=_worker,
+                    args=(
+                        i,
+                        self.mensagens_path,
+                        self.perfis_dir,
+                        self.workers_io,
+                        self.metricas,
+                        self.recarregar,
+                        self._catalogo,
+                        self._shm.name if self._shm is not None else None,
+                        filho,
+                    ),
+                    name=f"help-worker-{i}",
+                    daemon=True,
+                )
+                p.start()
+                filho.close()
+                self.processos.append(p)
+                ligacoes.append(pai)
+        finally:
+            if self.modo_catalogo == "fork":
+                gc.unfreeze()
+
+        for i, pai in enumerate(ligacoes):
+            if not pai.poll(timeout):
+                self.parar()
+                raise RuntimeError(f"worker {i} não arrancou em {timeout}s")
+            self.portas.append(pai.recv())
+            pai.close()
+        return self.portas
+
+    def parar(self, timeout: float = 10.0) -> None:
+        # SIGTERM: cada worker grava os perfis pendentes antes de sair
+        for p in self.processos:
+            if p.is_alive():
+                p.terminate()
+        for p in self.processos:
+            p.join(timeout)
+            if p.is_alive():
+                p.kill()
+        self.processos.clear()
+        self.portas.clear()
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        self._catalogo = None
+
+
+class DespachanteHTTP(ServidorHTTPBase):
+    """
+    Frente HTTP: encaminha /sessao e /historico para o worker dono do utilizador
+    (hash consistente de chave_utilizador(nome)); /stats junta os stats de todos.
+    """
+
+    def __init__(self, portas_workers: list[int], host: str = "127.0.0.1", port: int = 8080, vnodes: int = 128, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self._clientes = [ClienteWorker("127.0.0.1", p) for p in portas_workers]
+        self.anel = AnelConsistente(range(len(portas_workers)), vnodes)
+        self.por_worker = [0] * len(portas_workers)
+
+    def _rotas(self) -> dict:
+        return {
+            "/sessao": ("POST", self._sessao),
+            "/historico": ("GET", self._historico),
+            "/stats": ("GET", self._stats),
+            "/saude": ("GET", self._saude),
+            "/metrics": ("GET", self._metrics),
+        }
+
+    def worker_de(self, nome: str) -> int:
+        return self.anel.dono(chave_utilizador(nome))
+
+    async def _encaminhar(self, nome: str, metodo: str, alvo: str, corpo: bytes) -> RespostaHTTP:
+        i = self.worker_de(nome)
+        self.por_worker[i] += 1
+        try:
+            status, resposta = await self._clientes[i].pedido(metodo, alvo, corpo)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            raise ErroHTTP(502, f"worker {i} indisponível") from None
+        return RespostaHTTP(status, resposta)
+
+    async def _sessao(self, query: dict, corpo: bytes) -> RespostaHTTP:
+        nome = self._nome(self._json(corpo).get("nome"))
+        return await self._encaminhar(nome, "POST", "/sessao", corpo)
+
+    async def _historico(self, query: dict, corpo: bytes) -> RespostaHTTP:
+        nome = self._nome(query.get("nome"))
+        return await self._encaminhar(nome, "GET", f"/historico?{urlencode(query)}", b"")
+
+    async def _stats(self, query: dict, corpo: bytes) -> dict:
+        out = self._stats_base()
+        out["por_worker"] = list(self.por_worker)
+
+        async def um(c: ClienteWorker) -> Optional[dict]:
+            try:
+                _, resposta = await c.pedido("GET", "/stats")
+                return json.loads(resposta)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                return None
+
+        out["workers"] = await asyncio.gather(*(um(c) for c in self._clientes))
+        return out
+
+    async def _metrics(self, query: dict, corpo: bytes) -> RespostaHTTP:
+        # métricas de cada worker com o label worker="i", agrupadas por família
+        familias: dict[str, list[str]] = {}
+        tipos: dict[str, str] = {}
+        textos = await asyncio.gather(*(self._texto_metrics(c) for c in self._clientes))
+        for i, texto in enumerate(textos):
+            for linha in texto.splitlines():
+                if linha.startswith("# TYPE "):
+                    familia = linha.split()[2]
+                    tipos.setdefault(familia, linha)
+                    familias.setdefault(familia, [])
+                elif linha and not linha.startswith("#"):
+                    nome, _, resto = linha.partition(" ")
+                    base, chaveta, labels = nome.partition("{")
+                    amostra = f'{base}{{worker="{i}"' + (f",{labels}" if chaveta else "}") + f" {resto}"
+                    familia = next((f for f in familias if base == f or base.startswith(f + "_")), base)
+                    familias.setdefault(familia, []).append(amostra)
+        linhas = []
+        for familia, amostras in familias.items():
+            if familia in tipos:
+                linhas.append(tipos[familia])
+            linhas += amostras
+        return RespostaHTTP(200, "\n".join(linhas) + "\n", TIPO_PROMETHEUS)
+
+    @staticmethod
+    async def _texto_metrics(c: ClienteWorker) -> str:
+        try:
+            _, resposta = await c.pedido("GET", "/metrics")
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            return ""
+        return resposta.decode("utf-8")
+
+    async def fechar(self) -> None:
+        await super().fechar()
+        for c in self._clientes:
+            c.fechar()
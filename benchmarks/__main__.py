@@ -0,0 +1,252 @@
+"""
+Benchmarks dos caminhos quentes (catálogo, intensidade, pipeline, store, HelpApp).
+
+    python -m benchmarks                          # corre tudo, escreve benchmarks/resultados.json
+    python -m benchmarks --rapido -k store        # menos repetições, só casos com "store" no nome
+    python -m benchmarks --baseline base.json     # compara; sai com código 1 se houver regressões
+    python -m benchmarks --guardar-baseline base.json
+
+Os dados (catálogo e perfis) são sintéticos, gerados com seed fixa numa pasta temporária.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+from app.algoritmo_intensidade import calcular_intensidade
+from app.app import HelpApp
+from app.catalogo import CatalogoMensagens
+from app.catalogo_binario import garantir_compilado
+from app.dominio import EntradaSessao
+from app.historico import Historico
+from app.mensagens import MensagemCatalogo
+from app.persistence import PersistenciaMemoria
+from app.perfil_store import PerfilStoreJSON
+from app.pipeline import PipelineCompleto
+
+from .dados import ESTADOS, gerar_catalogo, gerar_perfil
+
+TAMANHOS_HISTORICO = (10, 1_000, 100_000)
+
+# caso = (nome, preparar) ; preparar() devolve a função a medir (sem argumentos)
+Caso = tuple[str, Callable[[], Callable[[], object]]]
+
+
+def _entradas(n: int = 1024) -> list[EntradaSessao]:
+    return [EntradaSessao(ESTADOS[i % 6], 1 + i % 5, f"u{i % 37}", 1_700_000_000_000_000_000 + i * 7919) for i in range(n)]
+
+
+def casos(pasta: Path) -> Iterator[Caso]:
+    json_path = gerar_catalogo(pasta / "mensagens.json")
+    garantir_compilado(json_path)
+    entradas = _entradas()
+
+    def ciclo(f: Callable[[EntradaSessao], object]) -> Callable[[], object]:
+        # percorre as entradas em ciclo: cada chamada mede uma entrada diferente
+        estado = {"i": 0}
+
+        def um():
+            i = estado["i"]
+            estado["i"] = (i + 1) % len(entradas)
+            return f(entradas[i])
+
+        return um
+
+    yield "catalogo.init[json]", lambda: (lambda: CatalogoMensagens(json_path).fechar())
+    yield "catalogo.init[compilado]", lambda: (lambda: CatalogoMensagens(json_path, compilado=True).fechar())
+
+    def obter(compilado: bool):
+        cat = CatalogoMensagens(json_path, compilado=compilado)
+        return ciclo(lambda e: cat.obter(e.estado, e))
+
+    yield "catalogo.obter[json]", lambda: obter(False)
+    yield "catalogo.obter[compilado]", lambda: obter(True)
+
+    def intensidade():
+        perfil = gerar_perfil("bench", 0)
+        estados = [ESTADOS[(i * 7) % 6] if i % 3 else ESTADOS[0] for i in range(1024)]
+        it = iter(())
+
+        def um():
+            nonlocal it
+            try:
+                e = next(it)
+            except StopIteration:
+                it = iter(estados)
+                e = next(it)
+            return calcular_intensidade(perfil, e)
+
+        return um
+
+    yield "intensidade.calcular", intensidade
+
+    def intensidade_ramo(muda: bool):
+        # cada ramo do caminho compacto à parte: muda = decair_exceto a cada chamada
+        perfil = gerar_perfil("bench", 0)
+        i = 0
+
+        def um():
+            nonlocal i
+            i += 1
+            return calcular_intensidade(perfil, ESTADOS[i % 6] if muda else ESTADOS[0])
+
+        return um
+
+    yield "intensidade.calcular[muda]", lambda: intensidade_ramo(True)
+    yield "intensidade.calcular[repete]", lambda: intensidade_ramo(False)
+
+    def pipeline():
+        p = PipelineCompleto(logger=None)
+        msg = MensagemCatalogo(CatalogoMensagens(json_path, compilado=True))
+        return ciclo(lambda e: p.processar(msg, e))
+
+    yield "pipeline.processar", pipeline
+
+    for n in TAMANHOS_HISTORICO:
+        def carregar(n=n):
+            store = PerfilStoreJSON(pasta / f"perfis_{n}")
+            store.guardar(gerar_perfil(f"bench{n}", n))
+            return lambda: store.carregar(f"bench{n}")
+
+        def guardar(n=n):
+            store = PerfilStoreJSON(pasta / f"perfis_{n}")
+            perfil = gerar_perfil(f"bench{n}", n)
+            return lambda: store.guardar(perfil)
+
+        yield f"store_json.carregar[{n}]", carregar
+        yield f"store_json.guardar[{n}]", guardar
+
+    for n in TAMANHOS_HISTORICO:
+        def intervalo(n=n):
+            # ~20 sessões a meio do histórico de um perfil carregado
+            hist = gerar_perfil(f"bench{n}", n).historico
+            h = Historico(PersistenciaMemoria(dados=hist))
+            t0, t1 = hist[n // 2]["data"], hist[min(n - 1, n // 2 + 20)]["data"]
+            return lambda: h.obter_intervalo(t0, t1)
+
+        def por_estado(n=n):
+            h = Historico(PersistenciaMemoria(dados=gerar_perfil(f"bench{n}", n).historico))
+            return lambda: h.obter_por_estado(ESTADOS[0], 20)
+
+        yield f"historico.intervalo[{n}]", intervalo
+        yield f"historico.por_estado[{n}]", por_estado
+
+    def sessao():
+        app = HelpApp(PipelineCompleto(logger=None), Historico(PersistenciaMemoria(maximo=10_000)))
+        msg = MensagemCatalogo(CatalogoMensagens(json_path, compilado=True))
+        return ciclo(lambda e: app.correr_sessao(msg, e))
+
+    yield "app.correr_sessao", sessao
+
+
+def medir(f: Callable[[], object], repeticoes: int, alvo_s: float) -> dict:
+    """
+    Calibra o nº de chamadas por amostra para durar ~alvo_s e tira `repeticoes` amostras.
+    Tempos em ns por chamada; a mediana é o valor comparado com a baseline.
+    """
+    f()  # aquece (caches, imports, ficheiros)
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            f()
+        dt = time.perf_counter() - t0
+        if dt >= alvo_s / 4 or n >= 1 << 20:
+            break
+        n *= 4 if dt < alvo_s / 40 else 2
+    n = max(1, int(n * alvo_s / max(dt, 1e-9)))
+
+    amostras = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            f()
+        amostras.append((time.perf_counter() - t0) / n * 1e9)
+    return {
+        "chamadas": n,
+        "repeticoes": repeticoes,
+        "mediana_ns": statistics.median(amostras),
+        "min_ns": min(amostras),
+        "max_ns": max(amostras),
+    }
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def correr(filtro: str = "", repeticoes: int = 5, alvo_s: float = 0.2, mostrar: bool = True) -> dict:
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="help_bench_") as tmp:
+        for nome, preparar in casos(Path(tmp)):
+            if filtro and filtro not in nome:
+                continue
+            r = medir(preparar(), repeticoes, alvo_s)
+            resultados[nome] = r
+            if mostrar:
+                print(f"{nome:32s} {r['mediana_ns'] / 1000:12.2f} µs  (x{r['chamadas']}, {repeticoes} rep.)")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "commit": _commit(),
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float = 0.25) -> list[dict]:
+    """
+    Uma linha por caso presente nos dois; regressao=True se ficou mais lento que baseline*(1+tolerancia).
+    """
+    linhas = []
+    base = baseline.get("resultados", {})
+    for nome, r in atual.get("resultados", {}).items():
+        if nome not in base:
+            continue
+        razao = r["mediana_ns"] / base[nome]["mediana_ns"]
+        linhas.append({"caso": nome, "razao": razao, "regressao": razao > 1.0 + tolerancia})
+    return linhas
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filtro", default="", help="só casos cujo nome contém este texto")
+    parser.add_argument("--rapido", action="store_true", help="3 repetições de ~0.05s (smoke test)")
+    parser.add_argument("--saida", type=Path, default=Path(__file__).resolve().parent / "resultados.json")
+    parser.add_argument("--baseline", type=Path, help="JSON de uma corrida anterior para comparar")
+    parser.add_argument("--guardar-baseline", type=Path, help="escreve também os resultados aqui")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="abrandamento aceite (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+
+    res = correr(args.filtro, *((3, 0.05) if args.rapido else (5, 0.2)))
+    texto = json.dumps(res, indent=2, ensure_ascii=False)
+    args.saida.write_text(texto, encoding="utf-8")
+    if args.guardar_baseline:
+        args.guardar_baseline.write_text(texto, encoding="utf-8")
+
+    if not args.baseline:
+        return 0
+    linhas = comparar(res, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerancia)
+    print(f"\ncomparação com {args.baseline} (tolerância {args.tolerancia:+.0%}):")
+    for l in linhas:
+        marca = "REGRESSÃO" if l["regressao"] else ""
+        print(f"{l['caso']:32s} x{l['razao']:.2f} {marca}")
+    return 1 if any(l["regressao"] for l in linhas) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+
+from app.perfil import PerfilUtilizador
+
+ESTADOS = ["ansioso", "triste", "zangado", "cansado", "feliz", "motivado"]
+_PALAVRAS = "hoje estou mesmo assim ainda quase sempre nunca tudo nada calma força passo dia noite".split()
+
+
+def gerar_catalogo(path: Path, por_grupo: int = 100, seed: int = 1) -> Path:
+    """
+    mensagens.json sintético com o formato real: estado -> intensidade (1..5) -> lista.
+    """
+    rnd = random.Random(seed)
+    dados = {
+        estado: {
+            str(i): [
+                f"  {estado} {i}: " + " ".join(rnd.choice(_PALAVRAS) for _ in range(rnd.randint(6, 18))) + "  "
+                for _ in range(por_grupo)
+            ]
+            for i in range(1, 6)
+        }
+        for estado in ESTADOS
+    }
+    path.write_text(json.dumps(dados, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def gerar_perfil(nome: str, n_historico: int, seed: int = 1) -> PerfilUtilizador:
+    """
+    Perfil com n_historico sessões já feitas (contagens e intensidades coerentes com o histórico).
+    """
+    rnd = random.Random(seed)
+    perfil = PerfilUtilizador(nome=nome)
+    data = 1_700_000_000_000_000_000
+    for _ in range(n_historico):
+        estado = rnd.choice(ESTADOS)
+        intensidade = rnd.randint(1, 5)
+        data += rnd.randint(10**9, 10**12)
+        perfil.registar_sessao(estado, intensidade)
+        perfil.historico.append(
+            {"data": data, "estado": estado, "intensidade": intensidade, "mensagem": f"{estado} {intensidade} mensagem"}
+        )
+    for estado in ESTADOS:
+        perfil.intensidades[estado] = {"valor": round(rnd.uniform(0.5, 5.0), 2)}
+    perfil.ultimo_estado = perfil.historico[-1]["estado"] if perfil.historico else None
+    return perfil
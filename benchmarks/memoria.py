@@ -0,0 +1,146 @@
+"""
+Memória privada (USS) de cada worker por causa do catálogo, para cada modo de partilha.
+
+    python -m benchmarks.memoria                  # 4 workers, catálogo de 60 000 mensagens
+    python -m benchmarks.memoria --workers 8 --por-grupo 500
+
+Cada worker mede Private_Clean + Private_Dirty (/proc/self/smaps_rollup, só Linux) antes
+de ter o catálogo e depois de o usar (obter em muitas entradas + gc.collect()).
+O pai faz gc.freeze() antes do fork em todos os modos exceto "fork", para o resto do
+interpretador herdado não contar; "controlo" faz o mesmo trabalho sem catálogo e é
+descontado na última coluna.
+Modos:
+    controlo     sem catálogo (mesmas entradas e gc.collect())
+    json         cada worker lê o JSON (listas de str próprias)
+    mmap         cada worker abre o .bin compilado (PoolWorkers, default)
+    fork         o pai lê o JSON e faz fork (sem gc.freeze)
+    fork+freeze  igual, com gc.freeze() antes do fork (PoolWorkers modo "fork")
+    shm          o pai publica o .bin em shared_memory (PoolWorkers modo "shm")
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import multiprocessing
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from app.catalogo import CatalogoMensagens
+from app.catalogo_binario import FontePartilhada, garantir_compilado, publicar_catalogo
+from app.dominio import EntradaSessao
+
+from .dados import ESTADOS, gerar_catalogo
+
+MODOS = ("controlo", "json", "mmap", "fork", "fork+freeze", "shm")
+_SMAPS = Path("/proc/self/smaps_rollup")
+
+
+def memoria_privada_kb() -> int:
+    # páginas só deste processo (as copiadas do pai por copy-on-write também contam)
+    total = 0
+    with _SMAPS.open() as f:
+        for linha in f:
+            if linha.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(linha.split()[1])
+    return total
+
+
+def _usar(catalogo: CatalogoMensagens | None, chamadas: int) -> None:
+    for d in range(chamadas):
+        e = EntradaSessao(ESTADOS[d % 6], 1 + (d // 6) % 5, f"u{d % 97}", d * 7919)
+        if catalogo is not None:
+            catalogo.obter(e.estado, e)
+    # um worker de longa duração acaba por fazer coleções completas
+    gc.collect()
+
+
+def _worker(modo: str, json_path: str, catalogo, shm_nome, chamadas: int, conn) -> None:
+    antes = memoria_privada_kb()
+    if modo == "json":
+        catalogo = CatalogoMensagens(json_path)
+    elif modo == "mmap":
+        catalogo = CatalogoMensagens(json_path, compilado=True)
+    elif modo == "shm":
+        catalogo = CatalogoMensagens(json_path, fonte=FontePartilhada(shm_nome))
+    _usar(catalogo, chamadas)
+    conn.send(memoria_privada_kb() - antes)
+    conn.close()
+    if catalogo is not None:
+        catalogo.fechar()
+
+
+def medir(modo: str, json_path: Path, workers: int, chamadas: int) -> list[int]:
+    """
+    kB de memória privada ganhos por cada worker depois de usar o catálogo.
+    """
+    ctx = multiprocessing.get_context("fork")
+    catalogo = shm = None
+    if modo.startswith("fork"):
+        catalogo = CatalogoMensagens(json_path)
+    elif modo == "shm":
+        shm = publicar_catalogo(garantir_compilado(json_path))
+
+    congelar = modo != "fork"
+    if congelar:
+        gc.freeze()
+    ligacoes, processos = [], []
+    try:
+        for _ in range(workers):
+            pai, filho = ctx.Pipe(duplex=False)
+            p = ctx.Process(
+                target=_worker,
+                args=(modo, str(json_path), catalogo, shm.name if shm else None, chamadas, filho),
+            )
+            p.start()
+            filho.close()
+            ligacoes.append(pai)
+            processos.append(p)
+    finally:
+        if congelar:
+            gc.unfreeze()
+
+    deltas = [pai.recv() for pai in ligacoes]
+    for p in processos:
+        p.join()
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+    return deltas
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memoria", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--por-grupo", type=int, default=2000, help="mensagens por estado/intensidade")
+    parser.add_argument("--chamadas", type=int, default=50_000, help="obter por worker")
+    parser.add_argument("-k", "--filtro", default="", help="só modos cujo nome contém este texto")
+    args = parser.parse_args(argv)
+
+    if not _SMAPS.exists() or "fork" not in multiprocessing.get_all_start_methods():
+        print("precisa de Linux (/proc/self/smaps_rollup e fork)")
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix="help_mem_") as tmp:
+        json_path = gerar_catalogo(Path(tmp) / "mensagens.json", por_grupo=args.por_grupo)
+        garantir_compilado(json_path)
+        n = args.por_grupo * 5 * len(ESTADOS)
+        print(f"catálogo: {n} mensagens, JSON {json_path.stat().st_size / 1024:.0f} kB; {args.workers} workers")
+        deltas_controlo = medir("controlo", json_path, args.workers, args.chamadas)
+        controlo = statistics.median(deltas_controlo)
+        print(f"{'modo':12s} {'kB/worker':>10s} {'min':>8s} {'max':>8s} {'catálogo':>9s}")
+        for modo in MODOS:
+            if args.filtro and args.filtro not in modo:
+                continue
+            if modo == "controlo":
+                deltas = deltas_controlo
+            else:
+                deltas = medir(modo, json_path, args.workers, args.chamadas)
+            mediana = statistics.median(deltas)
+            print(f"{modo:12s} {mediana:10.0f} {min(deltas):8d} {max(deltas):8d} {mediana - controlo:9.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,49 @@
 from __future__ import annotations
 
-from pathlib import Path
-import sys
+import time
 
-from ui.rich_ui import (
-    mostrar_cabecalho,
-    pedir_estado_com_emojis,
-    mostrar_mensagem_final,
-    mostrar_info,
-    mostrar_aviso,
-    mostrar_historico,
-    confirmar,
-)
-
-from app.app import HelpApp
-from app.catalogo import CatalogoMensagens
-from app.mensagens import MensagemCatalogo
-from app.dominio import EntradaSessao
-from app.pipeline import PipelineCompleto
-from app.persistence import PersistenciaMemoria
-from app.historico import Historico
-
-from app.perfil_store import PerfilStoreJSON
-from app.aprendizagem import AprendizagemBasica
-from app.algoritmo_intensidade import calcular_intensidade
+_T0 = time.perf_counter()
+
+import importlib
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+# barato: o rich só é importado no primeiro render
+if __package__:
+    # importado como help_app.main (testes): ui e app são subpacotes de help_app
+    from .ui.rich_ui import (
+        mostrar_cabecalho,
+        pedir_estado_com_emojis,
+        mostrar_mensagem_final,
+        mostrar_info,
+        mostrar_aviso,
+        mostrar_historico,
+        confirmar,
+        precarregar,
+    )
+else:
+    from ui.rich_ui import (
+        mostrar_cabecalho,
+        pedir_estado_com_emojis,
+        mostrar_mensagem_final,
+        mostrar_info,
+        mostrar_aviso,
+        mostrar_historico,
+        confirmar,
+        precarregar,
+    )
+
+# app.* (catálogo, numpy, stores) é importado em fundo por _preparar, enquanto se pede o nome
+
+
+def _app(modulo: str) -> Any:
+    """
+    app.<modulo>; como help_app.main vem de help_app.app, sem segunda cópia dos módulos
+    (nem dos singletons METRICAS/INDICE). O help_app.spec já junta o app.* todo.
+    """
+    return importlib.import_module(f"{__package__}.app.{modulo}" if __package__ else f"app.{modulo}")
 
 
 def resource_path(relative_path: str) -> Path:
@@ -32,31 +52,169 @@ def resource_path(relative_path: str) -> Path:
     return Path(__file__).resolve().parent / relative_path
 
 
+class _Tempos:
+    """
+    Marcas do arranque (em segundos desde o início de main.py) para --import-time.
+    """
+
+    def __init__(self) -> None:
+        self.principal: list[tuple[str, float]] = []
+        self.fundo: list[tuple[str, float]] = []
+
+    @staticmethod
+    def marcar(fases: list[tuple[str, float]], nome: str) -> None:
+        fases.append((nome, time.perf_counter() - _T0))
+
+    def mostrar(self) -> None:
+        for titulo, fases in (("arranque", self.principal), ("em fundo (thread)", self.fundo)):
+            print(f"{titulo}:")
+            antes = 0.0
+            for nome, t in fases:
+                print(f"  {nome:24s} {(t - antes) * 1000:8.1f} ms   (t={t * 1000:.1f} ms)")
+                antes = t
+        print(f"módulos carregados: {len(sys.modules)}  (detalhe por módulo: python -X importtime main.py --import-time)")
+
+
+class _EmFundo:
+    """
+    Corre f() numa thread daemon; resultado() espera por ela e devolve (ou relança a exceção).
+    """
+
+    def __init__(self, f: Callable[[], Any]) -> None:
+        self._resultado: Any = None
+        self._erro: BaseException | None = None
+        self._thread = threading.Thread(target=self._correr, args=(f,), name="arranque", daemon=True)
+        self._thread.start()
+
+    def _correr(self, f: Callable[[], Any]) -> None:
+        try:
+            self._resultado = f()
+        except BaseException as e:
+            self._erro = e
+
+    def resultado(self) -> Any:
+        self._thread.join()
+        if self._erro is not None:
+            raise self._erro
+        return self._resultado
+
+
+class _Infra(NamedTuple):
+    catalogo: Any
+    app: Any
+    store: Any
+    aprendizagem: Any
+    arquivo: Any
+    resolvedor: Any
+
+
+def _preparar(mensagens_path: Path, perfis_dir: Path, tempos: _Tempos) -> _Infra:
+    HelpApp = _app("app").HelpApp
+    AprendizagemBasica = _app("aprendizagem").AprendizagemBasica
+    CatalogoMensagens = _app("catalogo").CatalogoMensagens
+    registar_estados = _app("estado_compacto").registar_estados
+    Historico = _app("historico").Historico
+    ArquivoHistorico = _app("historico_arquivo").ArquivoHistorico
+    ResolvedorMensagens = _app("historico_ids").ResolvedorMensagens
+    PersistenciaMemoria = _app("persistence").PersistenciaMemoria
+    PerfilStoreLog = _app("perfil_store_log").PerfilStoreLog
+    PipelineCompleto = _app("pipeline").PipelineCompleto
+
+    tempos.marcar(tempos.fundo, "imports app")
+
+    catalogo = CatalogoMensagens(mensagens_path, compilado=True)
+    # posições fixas dos estados nos arrays dos perfis
+    registar_estados(catalogo.estados())
+    # o histórico guarda ids: cada versão do JSON fica em data/mensagens.versoes/ para os resolver
+    versoes = mensagens_path.with_suffix(".versoes")
+    try:
+        catalogo.guardar_versao(versoes)
+    except OSError:
+        pass
+    resolvedor = ResolvedorMensagens(catalogo, versoes)
+    tempos.marcar(tempos.fundo, "catálogo")
+
+    pipeline = PipelineCompleto(logger=None)
+    historico = Historico(PersistenciaMemoria())
+    app = HelpApp(pipeline, historico)
+
+    # o write-behind à volta é montado em _terminar_arranque, já na thread principal
+    store = PerfilStoreLog(perfis_dir)
+    aprendizagem = AprendizagemBasica()
+    # perfil guarda só as últimas sessões; as antigas vão para data/perfis/<nome>.arquivo/
+    arquivo = ArquivoHistorico(perfis_dir)
+    tempos.marcar(tempos.fundo, "infra")
+
+    # o menu e as tabelas já não pagam o import do resto do rich
+    precarregar()
+    tempos.marcar(tempos.fundo, "rich (menus)")
+    return _Infra(catalogo, app, store, aprendizagem, arquivo, resolvedor)
+
+
+def _terminar_arranque(fundo: _EmFundo) -> _Infra:
+    """
+    Espera pelo _preparar e monta o PerfilStoreWriteBehind na thread principal:
+    signal.signal só funciona aqui, e sem o handler do SIGTERM os perfis pendentes perdiam-se.
+    """
+    PerfilStoreWriteBehind = _app("perfil_store_write_behind").PerfilStoreWriteBehind
+
+    infra = fundo.resultado()
+    # escrita em background: o disco sai do caminho entre a escolha e a mensagem
+    return infra._replace(store=PerfilStoreWriteBehind(infra.store))
 
 
-def main():
+def _migrar_historico(mensagens_path: Path, perfis_dir: Path) -> None:
+    # --migrar-historico: troca o texto das mensagens pelo id nos perfis já guardados
+    CatalogoMensagens = _app("catalogo").CatalogoMensagens
+    migrar_pasta = _app("historico_ids").migrar_pasta
+
+    catalogo = CatalogoMensagens(mensagens_path, compilado=True)
+    catalogo.guardar_versao(mensagens_path.with_suffix(".versoes"))
+    migrados = migrar_pasta(perfis_dir, catalogo) if perfis_dir.exists() else {}
+    for nome, n in migrados.items():
+        mostrar_info(f"{nome}: {n} entradas")
+    mostrar_info(f"{sum(1 for n in migrados.values() if n)} de {len(migrados)} perfis migrados")
+    catalogo.fechar()
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    # --import-time: mostra os tempos do arranque até ao primeiro prompt e sai
+    diagnostico = "--import-time" in argv
+    tempos = _Tempos()
+    tempos.marcar(tempos.principal, "imports main.py")
+
     # paths
     base = Path(__file__).resolve().parent
     mensagens_path = base / "data" / "mensagens.json"
     perfis_dir = base / "data" / "perfis"
 
-    # infra
-    catalogo = CatalogoMensagens(mensagens_path)
-    msg = MensagemCatalogo(catalogo)
-
-    pipeline = PipelineCompleto(logger=None)
-    historico = Historico(PersistenciaMemoria())
-    app = HelpApp(pipeline, historico)
+    if "--migrar-historico" in argv:
+        _migrar_historico(mensagens_path, perfis_dir)
+        return
 
-    store = PerfilStoreJSON(perfis_dir)
-    aprendizagem = AprendizagemBasica()
+    # infra (catálogo, stores, ...) carrega numa thread enquanto o utilizador escreve o nome
+    fundo = _EmFundo(lambda: _preparar(mensagens_path, perfis_dir, tempos))
 
     # UI
     mostrar_cabecalho()
+    tempos.marcar(tempos.principal, "cabeçalho (rich)")
+
+    if diagnostico:
+        tempos.marcar(tempos.principal, "primeiro prompt")
+        _terminar_arranque(fundo).store.fechar()
+        tempos.mostrar()
+        return
 
     # utilizador / input deve ficar com as primeiras letras de cada palavra em maiusculas
     raw_nome = input("Nome de Utilizador: ").strip().capitalize()
 
+    catalogo, app, store, aprendizagem, arquivo, resolvedor = _terminar_arranque(fundo)
+    calcular_intensidade = _app("algoritmo_intensidade").calcular_intensidade
+    registo_perfil = _app("app").registo_perfil
+    EntradaSessao = _app("dominio").EntradaSessao
+    MensagemCatalogoSemRepeticao = _app("mensagens").MensagemCatalogoSemRepeticao
+
     # feedback UX (antes de carregar)
     if store.existe(raw_nome):
         mostrar_info(f"Bem-vindo de volta, {raw_nome}!")
@@ -65,6 +223,8 @@ def main():
 
     # carrega (ou cria) o perfil real a partir de data/perfis
     perfil = store.carregar(raw_nome)
+    # não repete frases ao mesmo utilizador até esgotar o grupo
+    msg = MensagemCatalogoSemRepeticao(catalogo, perfil)
 
     # estados disponíveis vindos do mensagens.json
     estados_disponiveis = catalogo.estados()
@@ -89,7 +249,7 @@ def main():
     while True:
         escolha = pedir_estado_com_emojis(opcoes, default=None, extras={"h": "histórico", "q": "sair"})
         if escolha == "h":
-            mostrar_historico(perfil.historico[-5:], titulo="Histórico (últimas 5)")
+            mostrar_historico(perfil.historico[-5:], titulo="Histórico (últimas 5)", resolver=resolvedor.texto)
             input("Enter para voltar...")
             continue
         if escolha == "q":
@@ -113,18 +273,12 @@ def main():
             utilizador=perfil.nome
         )
 
-        texto = app.correr_sessao(msg, entrada)
+        id_mensagem, texto = app.correr_sessao_com_id(msg, entrada)
 
-        # aprendizagem + persistência do perfil
+        # aprendizagem + persistência do perfil (só o id da mensagem, não o texto)
         aprendizagem.atualizar(perfil, entrada)
-        perfil.historico.append(
-            {
-                "data": getattr(entrada, "data", ""),
-                "estado": estado,
-                "intensidade": intensidade,
-                "mensagem": texto,
-            }
-        )
+        perfil.historico.append(registo_perfil(entrada, id_mensagem, texto))
+        arquivo.limitar(perfil)
         store.guardar(perfil)
 
         # UI: mensagem
@@ -146,7 +300,7 @@ def main():
             f"Stats: total={perfil.total_sessoes}, "
             f"média_global={sum(perfil.soma_intensidade.values())/max(1, perfil.total_sessoes):.2f}"
         )
-        mostrar_historico(perfil.historico[-5:], titulo="Histórico (últimas 5)")
+        mostrar_historico(perfil.historico[-5:], titulo="Histórico (últimas 5)", resolver=resolvedor.texto)
     else:
         mostrar_info("Foi um gosto ajudar-te!")
 
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+from app.metricas import ExportadorPeriodico, SinkJSON, SinkLog
+from app.servidor import correr_ate_sinal, montar_servidor, workers_por_defeito
+from app.shards import MODOS_CATALOGO, DespachanteHTTP, PoolWorkers
+
+
+async def _correr(servidor, descricao: str) -> None:
+    await servidor.iniciar()
+    print(f"help_app a servir em http://{servidor.host}:{servidor.port} ({descricao})")
+    await correr_ate_sinal(servidor)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="help_app como serviço HTTP/JSON local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="threads de I/O por processo (default: nº de CPUs)")
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=1,
+        help="processos worker com shards de utilizadores (0 = nº de CPUs; 1 = tudo neste processo)",
+    )
+    parser.add_argument("--metricas", action="store_true", help="liga as métricas (GET /metrics em formato Prometheus)")
+    parser.add_argument("--metricas-json", type=Path, help="escreve também as métricas neste ficheiro JSON (1 processo)")
+    parser.add_argument("--metricas-log", action="store_true", help="escreve também as métricas no stdout (1 processo)")
+    parser.add_argument("--metricas-intervalo", type=float, default=10.0)
+    parser.add_argument(
+        "--catalogo",
+        choices=MODOS_CATALOGO,
+        default="mmap",
+        help="com --processos > 1: como os workers partilham o catálogo (default: mmap)",
+    )
+    parser.add_argument(
+        "--recarregar",
+        type=float,
+        default=0.0,
+        metavar="SEGUNDOS",
+        help="recarrega data/mensagens.json a quente quando muda (verifica a cada SEGUNDOS; 0 = nunca)",
+    )
+    args = parser.parse_args()
+
+    base = Path(__file__).resolve().parent
+    mensagens_path = base / "data" / "mensagens.json"
+    perfis_dir = base / "data" / "perfis"
+    processos = args.processos or os.cpu_count() or 1
+
+    if processos == 1:
+        workers = args.workers or workers_por_defeito()
+        servidor, libertar = montar_servidor(
+            mensagens_path, perfis_dir, args.host, args.port, workers, args.metricas, args.recarregar
+        )
+        sinks = ([SinkJSON(args.metricas_json)] if args.metricas_json else []) + ([SinkLog()] if args.metricas_log else [])
+        exportador = ExportadorPeriodico(sinks, args.metricas_intervalo) if args.metricas and sinks else None
+        try:
+            asyncio.run(_correr(servidor, f"workers I/O: {workers}"))
+        finally:
+            # perfis pendentes vão para disco antes de sair
+            libertar()
+            if exportador is not None:
+                exportador.fechar()
+        return
+
+    # cada worker tem poucos utilizadores: 2 threads de I/O chegam
+    pool = PoolWorkers(
+        processos,
+        mensagens_path,
+        perfis_dir,
+        workers_io=args.workers or 2,
+        metricas=args.metricas,
+        recarregar=args.recarregar,
+        modo_catalogo=args.catalogo,
+    )
+    portas = pool.iniciar()
+    try:
+        despachante = DespachanteHTTP(portas, args.host, args.port)
+        asyncio.run(_correr(despachante, f"{processos} processos, portas {portas}"))
+    finally:
+        pool.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from help_app.app.app import AsyncHelpApp, HelpApp
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.concorrencia import ExecutorLimitado, LocksUtilizador
+from help_app.app.dominio import EntradaSessao
+from help_app.app.historico import Historico, HistoricoAsync
+from help_app.app.mensagens import MensagemCatalogo, MensagemCatalogoSemRepeticao
+from help_app.app.persistence import PersistenciaAsync, PersistenciaMemoria
+from help_app.app.perfil_store import PerfilStoreJSON
+from help_app.app.perfil_store_async import PerfilStoreAsync
+from help_app.app.pipeline import PipelineCompleto
+
+
+DADOS = {"feliz": {str(i): [f" feliz {i} n{j} " for j in range(5)] for i in range(1, 6)}}
+
+
+class TestAsyncHelpApp(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "mensagens.json"
+        path.write_text(json.dumps(DADOS), encoding="utf-8")
+        self.catalogo = CatalogoMensagens(path)
+        self.executor = ExecutorLimitado(max_workers=4)
+
+    def tearDown(self):
+        self.executor.fechar()
+        self.tmp.cleanup()
+
+    def _app(self, store=None):
+        return AsyncHelpApp(
+            PipelineCompleto(),
+            HistoricoAsync(PersistenciaAsync(PersistenciaMemoria(), self.executor)),
+            store=store,
+            criar_mensagem=lambda perfil: MensagemCatalogoSemRepeticao(self.catalogo, perfil),
+        )
+
+    def test_igual_ao_sincrono(self):
+        msg = MensagemCatalogo(self.catalogo)
+        entradas = [EntradaSessao("feliz", 1 + i % 5, f"u{i % 7}", i) for i in range(60)]
+        sync = HelpApp(PipelineCompleto(), Historico(PersistenciaMemoria()))
+        esperado = [sync.correr_sessao(msg, e) for e in entradas]
+
+        async def correr():
+            app = self._app()
+            textos = [await app.correr_sessao(msg, e) for e in entradas]
+            return textos, await app.ver_historico(60)
+
+        textos, historico = asyncio.run(correr())
+        self.assertEqual(textos, esperado)
+        self.assertEqual(historico, sync.ver_historico(60))
+
+    def test_lote_igual_ao_sincrono_e_por_blocos(self):
+        msg = MensagemCatalogo(self.catalogo)
+        entradas = [EntradaSessao("feliz", 1 + i % 5, f"u{i % 7}", i) for i in range(30)]
+        esperado = list(HelpApp(PipelineCompleto(), Historico(PersistenciaMemoria())).correr_sessoes(msg, entradas))
+        lidas = []
+
+        def gerador():
+            for e in entradas:
+                lidas.append(e)
+                yield e
+
+        async def correr():
+            app = self._app()
+            textos, lidas_no_1o = [], None
+            async for t in app.correr_sessoes(msg, gerador(), tamanho_bloco=4):
+                if lidas_no_1o is None:
+                    lidas_no_1o = len(lidas)
+                textos.append(t)
+            return textos, lidas_no_1o
+
+        textos, lidas_no_1o = asyncio.run(correr())
+        self.assertEqual(textos, esperado)
+        self.assertEqual(lidas_no_1o, 4)
+
+    def test_sessoes_do_mesmo_utilizador_sao_serializadas(self):
+        store = PerfilStoreAsync(PerfilStoreJSON(Path(self.tmp.name) / "perfis"), self.executor)
+
+        async def correr():
+            app = self._app(store)
+            # muitas sessões ao mesmo tempo, 3 utilizadores: sem lock perdiam-se atualizações
+            await asyncio.gather(*(app.sessao(f"User{i % 3}", "feliz") for i in range(45)))
+            return [await store.carregar(f"user{i}") for i in range(3)]
+
+        for perfil in asyncio.run(correr()):
+            self.assertEqual(perfil.total_sessoes, 15)
+            self.assertEqual(len(perfil.historico), 15)
+
+    def test_existe_sem_suporte_no_store_interno(self):
+        class SoCarregar(PerfilStoreJSON):
+            existe = None
+
+        store = PerfilStoreAsync(SoCarregar(Path(self.tmp.name) / "perfis"), self.executor)
+        with self.assertRaises(TypeError):
+            asyncio.run(store.existe("micael"))
+
+    def test_executor_limita_pendentes(self):
+        executor = ExecutorLimitado(max_workers=2, max_pendentes=3)
+        ativos, maximo = [0], [0]
+        lock = threading.Lock()
+
+        def trabalho():
+            with lock:
+                ativos[0] += 1
+                maximo[0] = max(maximo[0], ativos[0])
+            time.sleep(0.01)
+            with lock:
+                ativos[0] -= 1
+
+        async def correr():
+            await asyncio.gather(*(executor.correr(trabalho) for _ in range(12)))
+
+        asyncio.run(correr())
+        executor.fechar()
+        self.assertLessEqual(maximo[0], 2)
+
+    def test_locks_libertados(self):
+        locks = LocksUtilizador()
+
+        async def correr():
+            a = locks.lock("Micael")
+            self.assertIs(a, locks.lock("micael"))
+            async with a:
+                pass
+
+        asyncio.run(correr())
+        self.assertEqual(len(locks), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import shutil
+import signal
+import tempfile
+import unittest
+from pathlib import Path
+
+from help_app import main as cli
+
+
+class TestArranque(unittest.TestCase):
+    def test_handler_sigterm_instalado_depois_do_arranque(self):
+        anterior = signal.getsignal(signal.SIGTERM)
+        with tempfile.TemporaryDirectory() as tmp:
+            # cópia: o arranque compila o .bin e arquiva a versão ao lado do JSON
+            mensagens = Path(tmp) / "mensagens.json"
+            shutil.copy(Path(cli.__file__).resolve().parent / "data" / "mensagens.json", mensagens)
+            fundo = cli._EmFundo(lambda: cli._preparar(mensagens, Path(tmp) / "perfis", cli._Tempos()))
+            infra = cli._terminar_arranque(fundo)
+            try:
+                self.assertIsNot(signal.getsignal(signal.SIGTERM), anterior)
+            finally:
+                signal.signal(signal.SIGTERM, anterior)
+                infra.store.fechar()
+                infra.resolvedor.fechar()
+                infra.catalogo.fechar()
+
+
+if __name__ == "__main__":
+    unittest.main()
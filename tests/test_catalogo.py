@@ -0,0 +1,264 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.catalogo_binario import FonteBinaria, FontePartilhada, garantir_compilado, publicar_catalogo
+from help_app.app.catalogo_recarregavel import CatalogoRecarregavel
+from help_app.app.dominio import EntradaSessao
+from help_app.app.seletores import SeletorMistura, SeletorSHA256
+
+
+DADOS = {
+    "ansioso": {str(i): [f"ansioso {i} n{j}" for j in range(7)] for i in range(1, 6)},
+    "feliz": ["feliz ç á", "  feliz dois  ", "feliz três"],
+}
+
+
+class TestCatalogoBinario(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.json = Path(self.tmp.name) / "mensagens.json"
+        self.json.write_text(json.dumps(DADOS, ensure_ascii=False), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_binario_igual_ao_json(self):
+        cat_json = CatalogoMensagens(self.json)
+        cat_bin = CatalogoMensagens(self.json, compilado=True)
+        self.assertTrue(self.json.with_suffix(".bin").exists())
+        self.assertEqual(cat_json.estados(), cat_bin.estados())
+
+        for estado in ("ansioso", "feliz", "inexistente"):
+            for intensidade in range(1, 6):
+                for data in range(20):
+                    e = EntradaSessao(estado, intensidade, "micael", data)
+                    self.assertEqual(cat_json.obter(estado, e), cat_bin.obter(estado, e))
+        cat_bin.fechar()
+
+    def test_ids_iguais_json_e_binario(self):
+        cat_json = CatalogoMensagens(self.json)
+        cat_bin = CatalogoMensagens(self.json, compilado=True)
+        self.assertEqual(cat_json.versao, cat_bin.versao)
+        self.assertNotEqual(CatalogoMensagens(self.json, pre_normalizar=True).versao, cat_json.versao)
+
+        entradas = [EntradaSessao(est, 1 + d % 5, "micael", d) for est in ("ansioso", "feliz", "nada") for d in range(10)]
+        com_id = [cat_bin.obter_com_id(e.estado, e) for e in entradas]
+        self.assertEqual(com_id, [cat_json.obter_com_id(e.estado, e) for e in entradas])
+        self.assertEqual(com_id, cat_bin.obter_lote_com_id(entradas))
+        self.assertEqual([t for _, t in com_id], [cat_json.obter(e.estado, e) for e in entradas])
+        self.assertTrue(com_id[-1][0].endswith(":nada:5:-1"))
+        cat_bin.fechar()
+
+    def test_validar_minimo(self):
+        cat = CatalogoMensagens(self.json, compilado=True)
+        cat.validar_minimo(["ansioso"], minimo=35)
+        with self.assertRaises(ValueError):
+            cat.validar_minimo(["feliz"], minimo=4)
+        cat.fechar()
+
+    def test_memoria_partilhada_igual_ao_binario(self):
+        cat_bin = CatalogoMensagens(self.json, compilado=True)
+        shm = publicar_catalogo(garantir_compilado(self.json))
+        try:
+            cat_shm = CatalogoMensagens(self.json, fonte=FontePartilhada(shm.name))
+            self.assertEqual(cat_shm.versao, cat_bin.versao)
+            entradas = [EntradaSessao(est, 1 + d % 5, "micael", d) for est in ("ansioso", "feliz", "nada") for d in range(20)]
+            self.assertEqual(cat_shm.obter_lote_com_id(entradas), cat_bin.obter_lote_com_id(entradas))
+            cat_shm.fechar()
+        finally:
+            shm.close()
+            shm.unlink()
+        cat_bin.fechar()
+
+    def test_recompila_quando_json_muda(self):
+        bin_path = garantir_compilado(self.json)
+        novo = {"feliz": ["só esta"]}
+        self.json.write_text(json.dumps(novo, ensure_ascii=False), encoding="utf-8")
+        st = os.stat(bin_path)
+        os.utime(self.json, ns=(st.st_mtime_ns + 10**9, st.st_mtime_ns + 10**9))
+
+        cat = CatalogoMensagens(self.json, compilado=True)
+        self.assertEqual(cat.estados(), ["feliz"])
+        self.assertEqual(cat.obter("feliz", EntradaSessao("feliz", 3, "x", 1)), "só esta")
+        cat.fechar()
+
+    def test_bin_path_explicito_respeita_normalizacao(self):
+        bin_path = Path(self.tmp.name) / "outro.bin"
+        garantir_compilado(self.json, bin_path)
+        with self.assertRaises(ValueError):
+            FonteBinaria(bin_path, normalizar=True)
+
+        # mesmo ficheiro pedido pré-normalizado: recompila em vez de servir os textos crus
+        cat = CatalogoMensagens(self.json, compilado=True, bin_path=bin_path, pre_normalizar=True)
+        ref = CatalogoMensagens(self.json, pre_normalizar=True)
+        self.assertEqual(
+            [cat.obter("feliz", EntradaSessao("feliz", 3, "x", d)) for d in range(6)],
+            [ref.obter("feliz", EntradaSessao("feliz", 3, "x", d)) for d in range(6)],
+        )
+        cat.fechar()
+        with self.assertRaises(ValueError):
+            FonteBinaria(bin_path)
+
+
+class TestCatalogoRecarregavel(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.json = Path(self.tmp.name) / "mensagens.json"
+        self.escritas = 0
+        self._escrever("v1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _escrever(self, versao, estados=("ansioso", "feliz")):
+        dados = {e: {str(i): [f"{versao} {e} {i} n{j}" for j in range(4)] for i in range(1, 6)} for e in estados}
+        self.json.write_text(json.dumps(dados), encoding="utf-8")
+        # mtime diferente a cada escrita, mesmo com resolução grosseira do sistema de ficheiros
+        self.escritas += 1
+        os.utime(self.json, ns=(10**18 + self.escritas * 10**9,) * 2)
+
+    def test_troca_geracao_e_valida(self):
+        cat = CatalogoRecarregavel(self.json, intervalo=None, minimo=20, compilado=True)
+        e = EntradaSessao("feliz", 3, "micael", 1)
+        antiga = cat._fonte
+        self.assertTrue(cat.obter("feliz", e).startswith("v1 "))
+        self.assertFalse(cat.recarregar())  # nada mudou
+
+        self._escrever("v2")
+        self.assertTrue(cat.recarregar())
+        self.assertTrue(cat.obter("feliz", e).startswith("v2 "))
+        self.assertEqual(cat.obter_com_id("feliz", e)[0].split(":")[0], cat.versao)
+        # quem ainda tem a geração anterior continua a conseguir ler
+        self.assertTrue(antiga.texto(0).startswith("v1 "))
+
+        # JSON inválido e estado em falta: fica a geração atual
+        self.json.write_text("{", encoding="utf-8")
+        self.assertFalse(cat.recarregar())
+        self._escrever("v333", estados=("ansioso",))
+        self.assertFalse(cat.recarregar())
+        self.assertTrue(cat.obter("feliz", e).startswith("v2 "))
+
+        stats = cat.stats()
+        self.assertEqual((stats["geracao"], stats["recargas"], stats["falhas"]), (2, 1, 2))
+        self.assertIn("feliz", stats["ultimo_erro"])
+        cat.fechar()
+
+    def test_vigia_o_ficheiro(self):
+        cat = CatalogoRecarregavel(self.json, intervalo=0.01, minimo=20)
+        self._escrever("v2")
+        for _ in range(500):
+            if cat.geracao == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cat.geracao, 2)
+        self.assertTrue(cat.obter("ansioso", EntradaSessao("ansioso", 1, "x", 1)).startswith("v2 "))
+        cat.fechar()
+
+    def test_pedidos_durante_recargas(self):
+        cat = CatalogoRecarregavel(self.json, intervalo=None, minimo=20, compilado=True)
+        erros, parar = [], threading.Event()
+
+        def ler():
+            d = 0
+            while not parar.is_set():
+                d += 1
+                mid, texto = cat.obter_com_id("ansioso", EntradaSessao("ansioso", 1 + d % 5, "x", d))
+                # o texto é sempre da mesma geração que o id
+                versao = texto.split(" ")[0]
+                if (mid.split(":")[0], versao) not in versoes:
+                    erros.append((mid, texto))
+
+        versoes = {(cat.versao, "v1")}
+        t = threading.Thread(target=ler)
+        t.start()
+        for i in range(2, 30):
+            self._escrever(f"v{i}")
+            versoes.add((CatalogoMensagens(self.json).versao, f"v{i}"))
+            cat.recarregar()
+        parar.set()
+        t.join()
+        self.assertEqual(erros, [])
+        self.assertEqual(cat.geracao, 29)
+        cat.fechar()
+
+
+class TestSemRepeticao(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "mensagens.json"
+        path.write_text(json.dumps(DADOS, ensure_ascii=False), encoding="utf-8")
+        self.cat = CatalogoMensagens(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_nao_repete_ate_esgotar(self):
+        vistas: dict[str, str] = {}
+        textos = [self.cat.obter_sem_repeticao("ansioso", EntradaSessao("ansioso", 2, "u", i), vistas) for i in range(14)]
+        self.assertEqual(len(set(textos[:7])), 7)
+        self.assertEqual(len(set(textos[7:])), 7)
+        self.assertEqual(set(vistas), {"ansioso|2"})
+
+    def test_lista_simples(self):
+        vistas: dict[str, str] = {}
+        textos = {self.cat.obter_sem_repeticao("feliz", EntradaSessao("feliz", 5, "u", i), vistas) for i in range(3)}
+        self.assertEqual(len(textos), 3)
+        self.assertEqual(list(vistas), ["feliz|"])
+        self.assertEqual(vistas["feliz|"].partition(":")[0], "7")
+
+    def test_nao_repete_na_passagem_de_ronda(self):
+        # grupo de 3: a 1ª da ronda nova nunca é a última da anterior
+        for u in range(200):
+            vistas: dict[str, str] = {}
+            textos = [self.cat.obter_sem_repeticao("feliz", EntradaSessao("feliz", 5, f"u{u}", i), vistas) for i in range(12)]
+            for a, b in zip(textos, textos[1:]):
+                self.assertNotEqual(a, b)
+
+        # vistas de um perfil antigo (só o bitset, grupo esgotado) continua a funcionar
+        vistas = {"feliz|": "7"}
+        self.cat.obter_sem_repeticao("feliz", EntradaSessao("feliz", 5, "u", 0), vistas)
+        self.assertEqual(int(vistas["feliz|"].partition(":")[0], 16).bit_count(), 1)
+
+
+class TestSeletores(unittest.TestCase):
+    def test_mistura_estavel_e_no_intervalo(self):
+        s1, s2 = SeletorMistura(), SeletorMistura()
+        for data in range(500):
+            e = EntradaSessao("ansioso", 3, "micael", data)
+            idx = s1.escolher("ansioso", e, 17)
+            self.assertTrue(0 <= idx < 17)
+            self.assertEqual(idx, s2.escolher("ansioso", e, 17))
+
+    def test_mistura_distribuicao_uniforme(self):
+        s = SeletorMistura()
+        n, total = 10, 20000
+        contagens = [0] * n
+        for data in range(total):
+            contagens[s.escolher("feliz", EntradaSessao("feliz", 2, "x", data * 1000), n)] += 1
+        for c in contagens:
+            self.assertLess(abs(c - total / n), total / n * 0.1)
+
+    def test_lote_igual_ao_escalar(self):
+        for seletor in (SeletorMistura(), SeletorSHA256()):
+            entradas = [EntradaSessao("ansioso", 1 + i % 5, f"u{i % 7}", i * 7919) for i in range(300)]
+            tamanhos = [1 + i % 13 for i in range(300)]
+            esperado = [seletor.escolher(e.estado, e, n) for e, n in zip(entradas, tamanhos)]
+            self.assertEqual(seletor.escolher_lote(entradas, tamanhos), esperado)
+
+    def test_catalogo_obter_lote(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "mensagens.json"
+            path.write_text(json.dumps(DADOS, ensure_ascii=False), encoding="utf-8")
+            cat = CatalogoMensagens(path)
+            entradas = [EntradaSessao(est, 1 + i % 5, "u", i) for i in range(100) for est in ("ansioso", "nada")]
+            self.assertEqual(cat.obter_lote(entradas), [cat.obter(e.estado, e) for e in entradas])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from help_app.app.historico import Historico
+from help_app.app.historico_arquivo import ArquivoHistorico
+from help_app.app.persistence import IPersistencia, PersistenciaMemoria
+from help_app.app.perfil import PerfilUtilizador
+from help_app.app.perfil_store import PerfilStoreJSON
+from help_app.app.perfil_store_sqlite import PerfilStoreSQLite, PersistenciaSQLite
+
+
+class TestArquivoHistorico(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.arquivo = ArquivoHistorico(self.dir, maximo=10, bloco=5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _sessoes(self, perfil, n):
+        for _ in range(n):
+            i = perfil.historico_arquivado + len(perfil.historico)
+            perfil.historico.append({"data": i, "estado": "feliz"})
+            self.arquivo.limitar(perfil)
+
+    def test_perfil_fica_limitado_e_iterar_devolve_tudo(self):
+        p = PerfilUtilizador(nome="micael")
+        self._sessoes(p, 53)
+        self.assertLessEqual(len(p.historico), 14)
+        self.assertEqual(p.historico_arquivado + len(p.historico), 53)
+        self.assertEqual([e["data"] for e in self.arquivo.iterar(p)], list(range(53)))
+        self.assertTrue(list((self.dir / "micael.arquivo").glob("*.jsonl.gz")))
+
+    def test_despejo_sem_gravar_perfil_nao_duplica(self):
+        store = PerfilStoreJSON(self.dir)
+        p = PerfilUtilizador(nome="micael")
+        self._sessoes(p, 14)
+        store.guardar(p)
+
+        # despeja mas "crasha" antes de gravar o perfil
+        self._sessoes(p, 1)
+        p_disco = store.carregar("micael")
+        self.assertEqual([e["data"] for e in self.arquivo.iterar(p_disco)], list(range(14)))
+
+        self._sessoes(p_disco, 1)
+        self.assertEqual([e["data"] for e in self.arquivo.iterar(p_disco)], list(range(15)))
+
+
+ESTADOS = ["ansioso", "triste", "feliz"]
+
+
+class PersistenciaLista(IPersistencia):
+    # só o mínimo da interface: as consultas usam o varrimento da classe base
+    def __init__(self):
+        self.dados = []
+
+    def registar(self, entrada):
+        self.dados.append(entrada)
+
+    def obter_ultimas(self, n):
+        return self.dados[-n:] if n > 0 else []
+
+
+class TestConsultasHistorico(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = random.Random(3)
+        # datas quase sempre a subir, com algumas fora de ordem e sem data
+        self.entradas = []
+        for i in range(500):
+            data = i * 10 - (25 if rng.random() < 0.05 else 0)
+            e = {"data": data if i % 50 else "", "estado": rng.choice(ESTADOS), "intensidade": i}
+            self.entradas.append(e)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _esperado_intervalo(self, entradas, t0, t1):
+        dentro = [e for e in entradas if e["data"] != "" and t0 <= e["data"] < t1]
+        return sorted(dentro, key=lambda e: e["data"])
+
+    def _verificar(self, h, entradas):
+        for t0, t1 in ((0, 10**9), (1000, 1500), (995, 1005), (4990, 6000), (300, 300)):
+            self.assertEqual(h.obter_intervalo(t0, t1), self._esperado_intervalo(entradas, t0, t1))
+        self.assertEqual(len(h.obter_intervalo()), sum(1 for e in entradas if e["data"] != ""))
+        for estado in ESTADOS:
+            todas = [e for e in entradas if e["estado"] == estado]
+            self.assertEqual(h.obter_por_estado(estado), todas)
+            self.assertEqual(h.obter_por_estado(estado, 7), todas[-7:])
+        self.assertEqual(h.obter_por_estado("calmo"), [])
+        self.assertEqual(h.obter_por_estado("feliz", 0), [])
+
+    def test_memoria_incremental_e_depois_de_aparar(self):
+        p = PersistenciaMemoria(maximo=100)
+        h = Historico(p)
+        for i, e in enumerate(self.entradas):
+            h.registar(e)
+            if i % 97 == 0:
+                # consultas a meio, antes e depois de aparar
+                self._verificar(h, p.obter_ultimas(len(self.entradas)))
+        self._verificar(h, p.obter_ultimas(len(self.entradas)))
+
+    def test_perfil_carregado(self):
+        p = PerfilUtilizador(nome="micael", historico=list(self.entradas))
+        mem = PersistenciaMemoria(dados=p.historico)
+        h = Historico(mem)
+        self._verificar(h, self.entradas)
+        # o ArquivoHistorico corta o início da lista por fora: reindexar
+        ArquivoHistorico(Path(self.tmp.name), maximo=100, bloco=10).limitar(p)
+        mem.reindexar()
+        h.registar({"data": 10**6, "estado": "feliz"})
+        self._verificar(h, p.historico)
+
+    def test_persistencia_sem_indice(self):
+        h = Historico(PersistenciaLista())
+        h.registar_lote(self.entradas)
+        self._verificar(h, self.entradas)
+
+    def test_sqlite(self):
+        store = PerfilStoreSQLite(Path(self.tmp.name) / "help.db")
+        h = Historico(PersistenciaSQLite(store, "micael"))
+        Historico(PersistenciaSQLite(store, "outro")).registar({"data": 1000, "estado": "feliz"})
+        h.registar_lote(self.entradas)
+        self._verificar(h, self.entradas)
+        store.fechar()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import random
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from help_app.app import intensidade_lote
+from help_app.app.historico_arquivo import ArquivoHistorico
+from help_app.app.algoritmo_intensidade import calcular_intensidade
+from help_app.app.intensidade_lote import codificar, recalcular_lote, recalcular_perfis
+from help_app.app.perfil import PerfilUtilizador
+
+
+ESTADOS = ["ansioso", "triste", "zangado", "cansado", "feliz", "motivado"]
+
+
+def _escalar(perfil, seq):
+    return [calcular_intensidade(perfil, e) for e in seq]
+
+
+def _sequencias(rng, u, t_max, estados, repetir=0.6):
+    out = []
+    for _ in range(u):
+        seq = []
+        for _ in range(rng.randint(0, t_max)):
+            if seq and rng.random() < repetir:
+                seq.append(seq[-1])
+            else:
+                seq.append(rng.choice(estados))
+        out.append(seq)
+    return out
+
+
+class TestEquivalenciaIntensidade(unittest.TestCase):
+    """
+    O motor em lote tem de dar os mesmos floats (==, não aproximado) que calcular_intensidade.
+    """
+
+    def _comparar(self, historicos, perfis_iniciais=None):
+        copias = None
+        if perfis_iniciais is not None:
+            copias = [
+                SimpleNamespace(
+                    intensidades={k: dict(v) for k, v in p.intensidades.items()},
+                    ultimo_estado=p.ultimo_estado,
+                    streak_estado=p.streak_estado,
+                )
+                for p in perfis_iniciais
+            ]
+        extra = [e for p in (perfis_iniciais or ()) for e in p.intensidades]
+        ordem, seqs = codificar(historicos, ESTADOS + sorted(set(extra) - set(ESTADOS)))
+        res = recalcular_lote(seqs, ordem, perfis_iniciais)
+
+        for u, hist in enumerate(historicos):
+            p = copias[u] if copias else SimpleNamespace()
+            esperado = _escalar(p, hist)
+            self.assertEqual([int(b) for b in res.buckets[u][: len(hist)]], esperado)
+            self.assertEqual(res.intensidades(u), getattr(p, "intensidades", {}))
+            ultimo = int(res.ultimo[u])
+            self.assertEqual(ordem[ultimo] if ultimo >= 0 else None, getattr(p, "ultimo_estado", None))
+            self.assertEqual(int(res.streak[u]), getattr(p, "streak_estado", 0))
+
+    def test_aleatorio_perfis_novos(self):
+        rng = random.Random(1234)
+        self._comparar(_sequencias(rng, 200, 80, ESTADOS))
+
+    def test_sequencias_longas_do_mesmo_estado(self):
+        rng = random.Random(7)
+        self._comparar(_sequencias(rng, 50, 300, ESTADOS[:2], repetir=0.9))
+
+    def test_parte_de_perfis_existentes(self):
+        rng = random.Random(99)
+        perfis = []
+        for _ in range(60):
+            p = SimpleNamespace(
+                intensidades={e: {"valor": rng.choice([0.0, 0.1, 0.25, 2.9, 3.15, 5.0])} for e in rng.sample(ESTADOS + ["calmo"], 3)},
+                ultimo_estado=None,
+                streak_estado=rng.randint(0, 4),
+            )
+            p.ultimo_estado = rng.choice(list(p.intensidades) + [None])
+            perfis.append(p)
+        self._comparar(_sequencias(rng, 60, 40, ESTADOS), perfis)
+
+    def test_sem_sessoes(self):
+        self._comparar([[], []])
+
+    def test_fallback_sem_numpy(self):
+        with mock.patch.object(intensidade_lote, "np", None):
+            self.test_aleatorio_perfis_novos()
+            self.test_parte_de_perfis_existentes()
+
+    def test_recalcular_perfis(self):
+        p = PerfilUtilizador(nome="micael")
+        hist = ["ansioso", "ansioso", "feliz", "calmo", "feliz", "feliz", "feliz"]
+        p.historico = [{"estado": e} for e in hist]
+        ref = SimpleNamespace()
+        _escalar(ref, hist)
+
+        recalcular_perfis([p], ESTADOS)
+        self.assertEqual(p.intensidades, ref.intensidades)
+        self.assertEqual((p.ultimo_estado, p.streak_estado), (ref.ultimo_estado, ref.streak_estado))
+
+    def test_recalcular_perfis_com_arquivo(self):
+        rng = random.Random(21)
+        hist = [rng.choice(ESTADOS[:3]) for _ in range(60)]
+        ref = SimpleNamespace()
+        _escalar(ref, hist)
+        with tempfile.TemporaryDirectory() as tmp:
+            arquivo = ArquivoHistorico(tmp, maximo=10, bloco=5)
+            p = PerfilUtilizador(nome="micael")
+            for e in hist:
+                p.historico.append({"estado": e})
+                arquivo.limitar(p)
+            self.assertGreater(p.historico_arquivado, 0)
+
+            recalcular_perfis([p], ESTADOS, arquivo)
+        self.assertEqual(p.intensidades, ref.intensidades)
+        self.assertEqual((p.ultimo_estado, p.streak_estado), (ref.ultimo_estado, ref.streak_estado))
+
+
+class TestIntensidadesCompactas(unittest.TestCase):
+    def test_perfil_compacto_igual_ao_dict(self):
+        rng = random.Random(5)
+        for hist in _sequencias(rng, 100, 60, ESTADOS + ["calmo"]):
+            compacto = PerfilUtilizador(nome="x")
+            ref = SimpleNamespace()
+            self.assertEqual(_escalar(compacto, hist), _escalar(ref, hist))
+            self.assertEqual(compacto.intensidades.para_dict(), getattr(ref, "intensidades", {}))
+            self.assertEqual(compacto.streak_estado, getattr(ref, "streak_estado", 0))
+
+    def test_decaimento_preguicoso_igual_ao_eager(self):
+        # valores iniciais arbitrários, muitos estados antigos e leituras/cópias a meio
+        rng = random.Random(11)
+        antigos = [f"antigo{i}" for i in range(20)]
+        for hist in _sequencias(rng, 40, 80, ESTADOS + antigos[:2], repetir=0.3):
+            iniciais = {e: {"valor": rng.choice([0.0, 0.1, 0.3, 2.9, 3.15, 4.999])} for e in ESTADOS + antigos}
+            compacto = PerfilUtilizador(nome="x", intensidades=iniciais)
+            ref = SimpleNamespace(intensidades={k: dict(v) for k, v in iniciais.items()})
+            for i, e in enumerate(hist):
+                self.assertEqual(calcular_intensidade(compacto, e), calcular_intensidade(ref, e))
+                if i % 7 == 0:
+                    compacto = PerfilUtilizador(nome="x", intensidades=compacto.intensidades.copia())
+                    compacto.ultimo_estado, compacto.streak_estado = ref.ultimo_estado, ref.streak_estado
+                if i % 5 == 0:
+                    self.assertEqual(compacto.intensidades.para_dict(), ref.intensidades)
+            self.assertEqual(compacto.intensidades.para_dict(), ref.intensidades)
+
+    def test_para_dict_mantem_formato_json(self):
+        p = PerfilUtilizador(nome="x", contagem_estados={"calmo": 2}, intensidades={"feliz": {"valor": 0.0}})
+        p.registar_sessao("feliz", 4)
+        d = p.para_dict()
+        self.assertEqual(d["contagem_estados"], {"feliz": 1, "calmo": 2})
+        self.assertEqual(d["soma_intensidade"], {"feliz": 4})
+        self.assertEqual(d["intensidades"], {"feliz": {"valor": 0.0}})
+        self.assertNotIn("streak_estado", d)
+        self.assertEqual(PerfilUtilizador(**d), p)
+
+
+if __name__ == "__main__":
+    unittest.main()
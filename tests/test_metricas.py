@@ -0,0 +1,107 @@
+import gc
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.dominio import EntradaSessao
+from help_app.app.historico import Historico
+from help_app.app.mensagens import MensagemCatalogo
+from help_app.app.metricas import METRICAS, Histograma, SinkJSON, cronometrado, texto_prometheus
+from help_app.app.persistence import PersistenciaMemoria
+from help_app.app.pipeline import PipelineCompleto
+
+
+DADOS = {"feliz": [" feliz  um ", "feliz dois"]}
+
+
+class TestHistograma(unittest.TestCase):
+    def test_percentis(self):
+        h = Histograma()
+        for i in range(1, 1001):
+            h.observar(i * 1e-6)
+        # buckets com erro < 19%
+        self.assertAlmostEqual(h.percentil(0.5), 500e-6, delta=500e-6 * 0.2)
+        self.assertAlmostEqual(h.percentil(0.99), 990e-6, delta=990e-6 * 0.2)
+        self.assertLessEqual(h.percentil(0.99), h.maximo)
+        self.assertEqual(h.resumo()["n"], 1000)
+
+
+class TestMetricas(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "mensagens.json"
+        path.write_text(json.dumps(DADOS), encoding="utf-8")
+        self.catalogo = CatalogoMensagens(path)
+
+    def tearDown(self):
+        METRICAS.desativar()
+        METRICAS.limpar()
+        self.tmp.cleanup()
+
+    def test_desligado_usa_metodo_original(self):
+        class A:
+            @cronometrado("a.f")
+            def f(self):
+                return 1
+
+        original = A.__dict__["f"]
+        self.assertFalse(hasattr(original, "__wrapped__"))
+        METRICAS.ativar()
+        self.assertTrue(hasattr(A.__dict__["f"], "__wrapped__"))
+        A().f()
+        METRICAS.desativar()
+        self.assertIs(A.__dict__["f"], original)
+        A().f()
+        self.assertEqual(METRICAS.instantaneo()["tempos"]["a.f"]["n"], 1)
+
+    def test_pipelines_apagados_saem_dos_ouvintes(self):
+        gc.collect()
+        antes = len(METRICAS._ouvintes)
+        for _ in range(50):
+            PipelineCompleto()
+        gc.collect()
+        # sem ligar/desligar as métricas pelo meio
+        self.assertEqual(len(METRICAS._ouvintes), antes)
+        vivo = PipelineCompleto()
+        self.assertEqual(len(METRICAS._ouvintes), antes + 1)
+        del vivo
+
+    def test_etapas_e_caminhos_quentes(self):
+        pipeline = PipelineCompleto()
+        historico = Historico(PersistenciaMemoria())
+        msg = MensagemCatalogo(self.catalogo)
+        METRICAS.ativar()
+        for i in range(10):
+            e = EntradaSessao("feliz", 3, "u", i)
+            historico.registar({"mensagem": pipeline.processar(msg, e)})
+
+        tempos = METRICAS.instantaneo()["tempos"]
+        for nome in ("catalogo.obter", "pipeline.normalizar", "pipeline.cache", "historico.registar"):
+            self.assertEqual(tempos[nome]["n"], 10, nome)
+
+        # desligar recompila o pipeline sem medir
+        METRICAS.desativar()
+        pipeline.processar(msg, EntradaSessao("feliz", 3, "u", 0))
+        self.assertEqual(METRICAS.instantaneo()["tempos"]["pipeline.normalizar"]["n"], 10)
+
+    def test_sinks(self):
+        METRICAS.ativar()
+        METRICAS.contar("http.status.200", 3)
+        METRICAS.observar("catalogo.obter", 2e-6)
+        inst = METRICAS.instantaneo()
+
+        texto = texto_prometheus(inst)
+        self.assertIn("# TYPE help_app_http_status_200_total counter", texto)
+        self.assertIn("help_app_http_status_200_total 3", texto)
+        self.assertIn('help_app_catalogo_obter_seconds{quantile="0.99"}', texto)
+        self.assertIn("help_app_catalogo_obter_seconds_count 1", texto)
+
+        path = Path(self.tmp.name) / "metricas.json"
+        SinkJSON(path).exportar(inst)
+        self.assertEqual(json.loads(path.read_text(encoding="utf-8"))["contadores"], {"http.status.200": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,21 @@
+import gc
+import json
+import signal
 import unittest
 import tempfile
+import threading
+import time
+import weakref
 from pathlib import Path
 
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.historico_arquivo import ArquivoHistorico
+from help_app.app.historico_ids import TEXTO_INDISPONIVEL, ResolvedorMensagens, migrar_pasta
 from help_app.app.perfil_store import PerfilStoreJSON
+from help_app.app.perfil_store_log import PerfilStoreLog
+from help_app.app.perfil_store_cache import PerfilStoreCache
+from help_app.app.perfil_store_write_behind import PerfilStoreWriteBehind
+from help_app.app.perfil_store_sqlite import PerfilStoreSQLite, PersistenciaSQLite, importar_de_json
 from help_app.app.perfil import PerfilUtilizador
 
 
@@ -20,6 +33,38 @@ class TestPerfilStoreJSON(unittest.TestCase):
         self.assertEqual(p.nome, "Micael")
         self.assertEqual(p.total_sessoes, 0)
 
+    def test_escrita_atomica_sem_temporarios(self):
+        p = PerfilUtilizador(nome="micael")
+        self.store.guardar(p)
+        self.store.guardar(p)
+        self.assertEqual(sorted(x.name for x in self.dir.iterdir()), ["micael.json", "micael.lock"])
+
+    def test_leituras_concorrentes_nunca_veem_ficheiro_cortado(self):
+        p = PerfilUtilizador(nome="micael", historico=[{"data": i, "mensagem": "x" * 200} for i in range(500)])
+        self.store.guardar(p)
+        erros = []
+
+        def escrever():
+            outro = PerfilStoreJSON(self.dir)
+            for i in range(20):
+                p.total_sessoes = i
+                outro.guardar(p)
+
+        def ler():
+            outro = PerfilStoreJSON(self.dir)
+            for _ in range(50):
+                try:
+                    self.assertEqual(len(outro.carregar("micael").historico), 500)
+                except Exception as e:
+                    erros.append(e)
+
+        threads = [threading.Thread(target=escrever), threading.Thread(target=ler), threading.Thread(target=ler)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(erros, [])
+
     def test_guardar_e_recarregar(self):
         p = PerfilUtilizador(nome="Micael")
         p.registar_sessao("ansioso", 4)
@@ -34,5 +79,374 @@ class TestPerfilStoreJSON(unittest.TestCase):
         self.assertAlmostEqual(p2.media_intensidade("ansioso"), 3.0, places=5)
 
 
+class TestPerfilStoreLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = PerfilStoreLog(self.dir, limite_log=5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _sessao(self, p, i):
+        p.registar_sessao("ansioso", 3)
+        p.historico.append({"data": i, "estado": "ansioso", "intensidade": 3, "mensagem": f"m{i}"})
+        self.store.guardar(p)
+
+    def test_append_e_recarregar(self):
+        p = self.store.carregar("Micael")
+        for i in range(3):
+            self._sessao(p, i)
+
+        self.assertEqual(len((self.dir / "micael.log").read_text().splitlines()), 3)
+        p2 = PerfilStoreLog(self.dir).carregar("Micael")
+        self.assertEqual(p2.total_sessoes, 3)
+        self.assertEqual([e["data"] for e in p2.historico], [0, 1, 2])
+
+    def test_compacta_ao_passar_limite(self):
+        p = self.store.carregar("micael")
+        for i in range(7):
+            self._sessao(p, i)
+
+        self.assertEqual(len((self.dir / "micael.log").read_text().splitlines()), 2)
+        p2 = PerfilStoreLog(self.dir).carregar("micael")
+        self.assertEqual([e["data"] for e in p2.historico], list(range(7)))
+        self.assertEqual(p2.contagem_estados, {"ansioso": 7})
+
+    def test_le_perfil_json_antigo(self):
+        antigo = PerfilUtilizador(nome="micael", historico=[{"data": 1, "estado": "feliz"}])
+        PerfilStoreJSON(self.dir).guardar(antigo)
+        p = self.store.carregar("micael")
+        self._sessao(p, 2)
+        p2 = PerfilStoreLog(self.dir).carregar("micael")
+        self.assertEqual([e["data"] for e in p2.historico], [1, 2])
+
+    def test_ignora_duplicados_e_linha_cortada(self):
+        p = self.store.carregar("micael")
+        for i in range(2):
+            self._sessao(p, i)
+        log = self.dir / "micael.log"
+        linhas = log.read_text(encoding="utf-8")
+        self.store.compactar(p)
+        # simula crash: log antigo ficou + escrita cortada
+        log.write_text(linhas + '{"n": 2, "dat', encoding="utf-8")
+        p2 = PerfilStoreLog(self.dir).carregar("micael")
+        self.assertEqual([e["data"] for e in p2.historico], [0, 1])
+
+    def test_sessoes_depois_de_escrita_cortada(self):
+        p = self.store.carregar("micael")
+        self._sessao(p, 0)
+        with (self.dir / "micael.log").open("a", encoding="utf-8") as f:
+            f.write('{"torn')
+        for i in range(1, 4):
+            self._sessao(p, i)
+        p2 = PerfilStoreLog(self.dir).carregar("micael")
+        self.assertEqual([e["data"] for e in p2.historico], [0, 1, 2, 3])
+
+
+class TestHistoricoIds(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.json = self.dir / "mensagens.json"
+        self.json.write_text(json.dumps({"feliz": {"1": ["  Olá  mundo ", "adeus"]}}), encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_migra_e_resolve_versoes_antigas(self):
+        antigo = PerfilUtilizador(nome="micael", historico=[
+            {"data": 1, "estado": "feliz", "intensidade": 1, "mensagem": "Olá mundo"},
+            {"data": 2, "estado": "feliz", "intensidade": 1, "mensagem": "já não existe"},
+        ])
+        PerfilStoreJSON(self.dir / "perfis").guardar(antigo)
+
+        catalogo = CatalogoMensagens(self.json, compilado=True)
+        catalogo.guardar_versao(self.dir / "versoes")
+        self.assertEqual(migrar_pasta(self.dir / "perfis", catalogo), {"micael": 1})
+        historico = PerfilStoreLog(self.dir / "perfis").carregar("micael").historico
+        self.assertNotIn("mensagem", historico[0])
+        self.assertEqual(historico[1]["mensagem"], "já não existe")
+        catalogo.fechar()
+
+        # o JSON muda: o id antigo resolve-se pela cópia em versoes/
+        self.json.write_text(json.dumps({"feliz": {"1": ["outra"]}}), encoding="utf-8")
+        catalogo = CatalogoMensagens(self.json, compilado=True)
+        resolvedor = ResolvedorMensagens(catalogo, self.dir / "versoes")
+        textos = [e["mensagem"] for e in resolvedor.resolver(historico)]
+        self.assertEqual(textos, ["Olá mundo", "já não existe"])
+        self.assertEqual(ResolvedorMensagens(catalogo).texto(historico[0]), TEXTO_INDISPONIVEL)
+        resolvedor.fechar()
+        catalogo.fechar()
+
+
+class TestPerfilStoreSQLite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = PerfilStoreSQLite(self.dir / "perfis.db")
+
+    def tearDown(self):
+        self.store.fechar()
+        self.tmp.cleanup()
+
+    def test_guardar_e_recarregar(self):
+        p = self.store.carregar("Bárbara")
+        self.assertTrue(self.store.existe("barbara"))
+        p.registar_sessao("ansioso", 4)
+        p.intensidades["ansioso"] = {"valor": 3.15}
+        p.mensagens_vistas["ansioso|4"] = "3"
+        p.historico.append({"data": 10, "estado": "ansioso", "intensidade": 4, "mensagem": "ola"})
+        self.store.guardar(p)
+        p.historico.append({"data": 20, "estado": "ansioso", "intensidade": 4, "mensagem": "outra"})
+        self.store.guardar(p)
+
+        outro = PerfilStoreSQLite(self.dir / "perfis.db")
+        p2 = outro.carregar("barbara")
+        outro.fechar()
+        self.assertEqual(p2.nome, "barbara")
+        self.assertEqual(p2.contagem_estados, {"ansioso": 1})
+        self.assertEqual(p2.intensidades, {"ansioso": {"valor": 3.15}})
+        self.assertEqual(p2.mensagens_vistas, {"ansioso|4": "3"})
+        self.assertEqual([e["mensagem"] for e in p2.historico], ["ola", "outra"])
+
+    def test_estados_removidos_nao_voltam(self):
+        p = self.store.carregar("micael")
+        p.intensidades["feliz"] = {"valor": 2.0}
+        p.intensidades["calmo"] = {"valor": 1.0}
+        p.registar_sessao("calmo", 2)
+        self.store.guardar(p)
+        p.intensidades.clear()
+        p.intensidades["feliz"] = {"valor": 3.0}
+        del p.contagem_estados["calmo"]
+        self.store.guardar(p)
+
+        p2 = PerfilStoreSQLite(self.dir / "perfis.db").carregar("micael")
+        self.assertEqual(p2.intensidades, {"feliz": {"valor": 3.0}})
+        self.assertEqual(p2.contagem_estados, {})
+
+    def test_historico_arquivado_so_apaga_o_que_saiu(self):
+        arquivo = ArquivoHistorico(self.dir / "arq", maximo=10, bloco=5)
+        p = self.store.carregar("micael")
+        antes: list[int] = []
+        for i in range(40):
+            p.historico.append({"data": i, "estado": "feliz"})
+            arquivo.limitar(p)
+            self.store.guardar(p)
+            agora = [r[0] for r in self.store._conn.execute("SELECT id FROM historico ORDER BY id")]
+            self.assertEqual(len(agora), len(p.historico))
+            # só entra a linha nova; as que ficam são as últimas de antes, com os mesmos ids
+            self.assertEqual(agora[:-1], antes[len(antes) - len(agora) + 1:])
+            antes = agora
+        self.assertGreater(p.historico_arquivado, 0)
+
+        outro = PerfilStoreSQLite(self.dir / "perfis.db")
+        p2 = outro.carregar("micael")
+        p2.historico.append({"data": 40, "estado": "feliz"})
+        outro.guardar(p2)
+        outro.fechar()
+        p3 = PerfilStoreSQLite(self.dir / "perfis.db").carregar("micael")
+        self.assertEqual([e["data"] for e in p3.historico], list(range(p.historico_arquivado, 41)))
+
+    def test_transacao_agrupa_commits(self):
+        with self.store.transacao():
+            for nome in ("a", "b", "c"):
+                self.store.guardar(PerfilUtilizador(nome=nome))
+            self.assertTrue(self.store._conn.in_transaction)
+        self.assertFalse(self.store._conn.in_transaction)
+
+    def test_persistencia_historico(self):
+        p = PersistenciaSQLite(self.store, "micael")
+        for i in range(5):
+            p.registar({"data": i, "estado": "feliz"})
+        self.assertEqual([e["data"] for e in p.obter_ultimas(2)], [3, 4])
+        self.assertEqual(PersistenciaSQLite(self.store, "outro").obter_ultimas(2), [])
+
+    def test_importar_de_json(self):
+        pasta = self.dir / "perfis"
+        json_store = PerfilStoreJSON(pasta)
+        p = PerfilUtilizador(nome="micael", historico=[{"data": 1, "estado": "feliz"}])
+        p.registar_sessao("feliz", 2)
+        json_store.guardar(p)
+        json_store.guardar(PerfilUtilizador(nome="ana"))
+
+        self.assertEqual(importar_de_json(pasta, self.store), 2)
+        p2 = self.store.carregar("micael")
+        self.assertEqual(p2.historico, [{"data": 1, "estado": "feliz"}])
+        self.assertEqual(p2.total_sessoes, 1)
+
+    def test_importar_nomes_a_mao_e_so_log(self):
+        pasta = self.dir / "perfis"
+        pasta.mkdir()
+        (pasta / "Bárbara.json").write_text(
+            json.dumps({"nome": "Bárbara", "total_sessoes": 3, "historico": [{"data": 1, "estado": "triste"}]}),
+            encoding="utf-8",
+        )
+        # perfil do PerfilStoreLog que ainda só tem log (sem snapshot nem agregados)
+        (pasta / "rui.log").write_text(
+            '{"n":0,"data":5,"estado":"feliz"}\n{"n":1,"data":6,"estado":"feliz"}\n', encoding="utf-8"
+        )
+        antes = sorted(p.name for p in pasta.iterdir())
+
+        self.assertEqual(importar_de_json(pasta, self.store), 2)
+        self.assertEqual(sorted(p.name for p in pasta.iterdir()), antes)
+        barbara = self.store.carregar("barbara")
+        self.assertEqual(barbara.total_sessoes, 3)
+        self.assertEqual(barbara.historico, [{"data": 1, "estado": "triste"}])
+        self.assertEqual([e["data"] for e in self.store.carregar("rui").historico], [5, 6])
+
+
+class TestPerfilStoreWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = PerfilStoreWriteBehind(PerfilStoreJSON(self.dir), intervalo=60, instalar_sinais=False)
+
+    def tearDown(self):
+        self.store.fechar()
+        self.tmp.cleanup()
+
+    def test_junta_gravacoes_do_mesmo_utilizador(self):
+        p = PerfilUtilizador(nome="micael")
+        for _ in range(5):
+            p.registar_sessao("feliz", 3)
+            self.store.guardar(p)
+
+        self.assertFalse((self.dir / "micael.json").exists())
+        self.assertTrue(self.store.existe("Micael"))
+        self.assertEqual(self.store.carregar("micael").total_sessoes, 5)
+
+        self.store.flush()
+        stats = self.store.stats()
+        self.assertEqual((stats["pedidos"], stats["escritas"]), (5, 1))
+        self.assertAlmostEqual(stats["coalescencia"], 0.8)
+        self.assertEqual(PerfilStoreJSON(self.dir).carregar("micael").total_sessoes, 5)
+
+    def test_copia_nao_ve_alteracoes_posteriores(self):
+        p = PerfilUtilizador(nome="ana", intensidades={"feliz": {"valor": 3.0}})
+        self.store.guardar(p)
+        p.intensidades["feliz"]["valor"] = 4.0
+        p.historico.append({"data": 1})
+        self.store.fechar()
+        p2 = PerfilStoreJSON(self.dir).carregar("ana")
+        self.assertEqual(p2.intensidades, {"feliz": {"valor": 3.0}})
+        self.assertEqual(p2.historico, [])
+
+    def test_flush_por_limite(self):
+        self.store.limite_sujos = 2
+        self.store.guardar(PerfilUtilizador(nome="a"))
+        self.store.guardar(PerfilUtilizador(nome="b"))
+        for _ in range(100):
+            if (self.dir / "b.json").exists():
+                break
+            time.sleep(0.01)
+        self.assertTrue((self.dir / "a.json").exists())
+
+    def test_carregar_durante_flush_ve_perfil_pendente(self):
+        entrou, soltar = threading.Event(), threading.Event()
+
+        class Lento(PerfilStoreJSON):
+            def guardar(self, perfil):
+                entrou.set()
+                soltar.wait(5)
+                super().guardar(perfil)
+
+        store = PerfilStoreWriteBehind(Lento(self.dir / "lento"), intervalo=60, instalar_sinais=False)
+        p = PerfilUtilizador(nome="micael")
+        for _ in range(7):
+            p.registar_sessao("feliz", 3)
+        store.guardar(p)
+        t = threading.Thread(target=store.flush)
+        t.start()
+        self.assertTrue(entrou.wait(5))
+        self.assertEqual(store.carregar("micael").total_sessoes, 7)
+        self.assertTrue(store.existe("micael"))
+        soltar.set()
+        t.join(5)
+        self.assertEqual(store.carregar("micael").total_sessoes, 7)
+        store.fechar()
+
+    def test_fechar_liberta_instancia(self):
+        store = PerfilStoreWriteBehind(PerfilStoreJSON(self.dir), intervalo=60, instalar_sinais=False)
+        store.fechar()
+        ref = weakref.ref(store)
+        del store
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_sigterm_nao_apanha_o_lock(self):
+        anterior = signal.getsignal(signal.SIGTERM)
+        store = PerfilStoreWriteBehind(PerfilStoreJSON(self.dir), intervalo=60)
+        try:
+            store.guardar(PerfilUtilizador(nome="ana"))
+            handler = signal.getsignal(signal.SIGTERM)
+            # sinal a chegar enquanto a thread principal está dentro de guardar()
+            with store._lock:
+                with self.assertRaises(SystemExit):
+                    handler(signal.SIGTERM, None)
+            store._thread.join(5)
+            self.assertTrue((self.dir / "ana.json").exists())
+        finally:
+            signal.signal(signal.SIGTERM, anterior)
+            store.fechar()
+
+    def test_sigterm_ignorado_continua_a_ignorar(self):
+        anterior = signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        store = PerfilStoreWriteBehind(PerfilStoreJSON(self.dir), intervalo=60)
+        try:
+            store.guardar(PerfilUtilizador(nome="ana"))
+            # sem SystemExit: só acorda a thread para gravar, e ela continua viva
+            signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+            for _ in range(500):
+                if (self.dir / "ana.json").exists():
+                    break
+                time.sleep(0.01)
+            self.assertTrue((self.dir / "ana.json").exists())
+            self.assertTrue(store._thread.is_alive())
+        finally:
+            signal.signal(signal.SIGTERM, anterior)
+            store.fechar()
+
+
+class TestPerfilStoreCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = PerfilStoreCache(PerfilStoreJSON(self.dir), max_perfis=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hit_depois_de_guardar(self):
+        p = PerfilUtilizador(nome="micael")
+        p.registar_sessao("feliz", 3)
+        self.store.guardar(p)
+        self.assertTrue(self.store.existe("micael"))
+        p2 = self.store.carregar("Micael")
+        self.assertEqual(p2.total_sessoes, 1)
+        p2.registar_sessao("feliz", 3)
+        self.assertEqual(self.store.carregar("micael").total_sessoes, 1)
+        self.assertEqual((self.store.hits, self.store.misses), (2, 0))
+
+    def test_invalida_quando_outro_processo_escreve(self):
+        p = PerfilUtilizador(nome="micael")
+        self.store.guardar(p)
+        self.store.carregar("micael")
+
+        outro = PerfilUtilizador(nome="micael", total_sessoes=9)
+        PerfilStoreJSON(self.dir).guardar(outro)
+
+        self.assertEqual(self.store.carregar("micael").total_sessoes, 9)
+        self.assertEqual(self.store.invalidacoes, 1)
+
+    def test_eviction_lru(self):
+        for nome in ("a", "b", "c"):
+            self.store.guardar(PerfilUtilizador(nome=nome))
+        self.assertEqual(self.store.evictions, 1)
+        self.store.carregar("a")
+        self.assertEqual(self.store.misses, 1)
+        self.assertEqual(self.store.stats()["perfis"], 2)
+
+
 if __name__ == "__main__":
     unittest.main()
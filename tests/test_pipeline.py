@@ -0,0 +1,162 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from help_app.app.app import HelpApp
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.dominio import EntradaSessao, normalizar_texto
+from help_app.app.historico import Historico
+from help_app.app.mensagens import MensagemCatalogo
+from help_app.app.persistence import PersistenciaMemoria
+from help_app.app.pipeline import (
+    CacheUltimoMixin,
+    LoggingMixin,
+    NormalizeMixin,
+    PipelineBase,
+    PipelineCompilado,
+    PipelineCompleto,
+    PipelineSemCache,
+)
+
+
+class PipelineMixins(LoggingMixin, CacheUltimoMixin, NormalizeMixin, PipelineBase):
+    pass
+
+
+DADOS = {"feliz": {str(i): [f"  feliz   {i}  n{j} " for j in range(9)] for i in range(1, 6)}}
+
+
+class LoggerLista:
+    def __init__(self):
+        self.linhas = []
+
+    def registar(self, linha):
+        self.linhas.append(linha)
+
+
+class TestCorrerSessoes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "mensagens.json"
+        path.write_text(json.dumps(DADOS), encoding="utf-8")
+        self.msg = MensagemCatalogo(CatalogoMensagens(path))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _app(self):
+        return HelpApp(PipelineCompleto(logger=LoggerLista()), Historico(PersistenciaMemoria()))
+
+    def test_lote_igual_a_sessoes_individuais(self):
+        entradas = [EntradaSessao("feliz", 1 + i % 5, f"u{i % 3}", i) for i in range(50)]
+        um, lote = self._app(), self._app()
+
+        esperado = [um.correr_sessao(self.msg, e) for e in entradas]
+        obtido = list(lote.correr_sessoes(self.msg, entradas, tamanho_bloco=7))
+
+        self.assertEqual(obtido, esperado)
+        self.assertEqual(lote.ver_historico(50), um.ver_historico(50))
+        self.assertEqual(lote.pipeline.logger.linhas, um.pipeline.logger.linhas)
+        self.assertEqual(lote.pipeline.ultimo_texto, esperado[-1])
+
+    def test_lote_e_preguicoso(self):
+        app = self._app()
+        gerador = (EntradaSessao("feliz", 3, "u", i) for i in range(10**9))
+        textos = app.correr_sessoes(self.msg, gerador, tamanho_bloco=4)
+        self.assertEqual(len([next(textos) for _ in range(5)]), 5)
+        self.assertEqual(len(app.ver_historico(100)), 8)
+
+
+class TestPipelineCompilado(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = Path(self.tmp.name) / "mensagens.json"
+        path.write_text(json.dumps(DADOS), encoding="utf-8")
+        self.catalogo = CatalogoMensagens(path)
+        self.msg = MensagemCatalogo(self.catalogo)
+        self.entradas = [EntradaSessao("feliz", 1 + i % 5, "u", i) for i in range(20)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_preset_igual_aos_mixins(self):
+        antigo, novo = PipelineMixins(logger=LoggerLista()), PipelineCompleto(logger=LoggerLista())
+        for e in self.entradas:
+            self.assertEqual(novo.processar(self.msg, e), antigo.processar(self.msg, e))
+        self.assertEqual(novo.logger.linhas, antigo.logger.linhas)
+        self.assertEqual(novo.ultimo_texto, antigo.ultimo_texto)
+
+    def test_etapas_desligadas_nao_entram(self):
+        self.assertEqual(PipelineCompleto(logger=None).nomes_etapas, ["normalizar", "cache"])
+        self.assertEqual(PipelineSemCache(logger=object()).nomes_etapas, ["normalizar"])
+
+        p = PipelineSemCache()
+        p.logger = LoggerLista()
+        self.assertEqual(p.nomes_etapas, ["normalizar", "log"])
+        p.processar(self.msg, self.entradas[0])
+        self.assertEqual(len(p.logger.linhas), 1)
+
+    def test_perfilar_conta_por_etapa(self):
+        p = PipelineCompilado([("upper", str.upper), ("off", None), ("strip", str.strip)], perfilar=True)
+        textos = p.processar_lote(self.msg, self.entradas)
+        self.assertTrue(all(t == t.upper().strip() for t in textos))
+        stats = p.stats()
+        self.assertEqual(list(stats), ["upper", "strip"])
+        self.assertEqual(stats["strip"]["chamadas"], 20)
+
+    def test_ordem_das_etapas_em_cadeias_longas(self):
+        for n in (0, 1, 4, 5, 9):
+            etapas = [(str(i), lambda t, i=i: t + str(i), True) for i in range(n)]
+            for memo in (0, 4):
+                p = PipelineCompilado(etapas, memo=memo, perfilar=True)
+                texto = self.msg.gerar_texto(self.entradas[0])
+                self.assertEqual(p.processar(self.msg, self.entradas[0]), texto + "".join(map(str, range(n))))
+                self.assertEqual([s["chamadas"] for s in p.stats().values() if "chamadas" in s], [1] * n)
+
+    def test_memo_igual_sem_memo(self):
+        entradas = [EntradaSessao("feliz", 1 + i % 5, f"u{i % 4}", i % 7) for i in range(200)]
+        sem, com = PipelineCompleto(logger=LoggerLista()), PipelineCompleto(logger=LoggerLista(), memo=64)
+
+        self.assertEqual([com.processar(self.msg, e) for e in entradas], [sem.processar(self.msg, e) for e in entradas])
+        self.assertEqual(com.processar_lote(self.msg, entradas), sem.processar_lote(self.msg, entradas))
+        self.assertEqual(com.logger.linhas, sem.logger.linhas)
+        self.assertEqual(com.ultimo_texto, sem.ultimo_texto)
+
+        memo = com.stats()["memo"]
+        self.assertEqual(memo["hits"] + memo["misses"], 400)
+        self.assertLessEqual(memo["misses"], 45)
+        self.assertGreater(memo["hit_ratio"], 0.85)
+        self.assertNotIn("memo", sem.stats())
+
+    def test_memo_so_etapas_puras(self):
+        contagem = []
+        p = PipelineCompilado(
+            [("strip", str.strip, True), ("conta", lambda t: contagem.append(t) or t)], memo=8
+        )
+        e = self.entradas[0]
+        self.assertEqual(p.processar(self.msg, e), p.processar(self.msg, e))
+        self.assertEqual(len(contagem), 2)
+        self.assertEqual(p.stats()["memo"]["hits"], 1)
+
+    def test_catalogo_pre_normalizado(self):
+        path = Path(self.tmp.name) / "mensagens.json"
+        pre = MensagemCatalogo(CatalogoMensagens(path, compilado=True, pre_normalizar=True))
+        normal, direto = PipelineCompleto(), PipelineCompleto(normalizar=False)
+        self.assertEqual(direto.nomes_etapas, ["cache"])
+        for e in self.entradas:
+            self.assertEqual(direto.processar(pre, e), normal.processar(self.msg, e))
+
+    def test_com_id_igual_ao_texto(self):
+        for memo in (0, 8):
+            p, ref = PipelineCompleto(memo=memo), PipelineCompleto()
+            for e in self.entradas:
+                id_mensagem, texto = p.processar_com_id(self.msg, e)
+                self.assertEqual(texto, ref.processar(self.msg, e))
+                self.assertEqual(normalizar_texto(self.catalogo.texto_por_id(id_mensagem)), texto)
+            pares = p.processar_lote_com_id(self.msg, self.entradas)
+            self.assertEqual([t for _, t in pares], ref.processar_lote(self.msg, self.entradas))
+
+
+if __name__ == "__main__":
+    unittest.main()
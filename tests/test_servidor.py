@@ -0,0 +1,174 @@
+import asyncio
+import http.client
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from help_app.app.app import AsyncHelpApp
+from help_app.app.catalogo import CatalogoMensagens
+from help_app.app.concorrencia import ExecutorLimitado
+from help_app.app.historico import HistoricoAsync
+from help_app.app.mensagens import MensagemCatalogoSemRepeticao
+from help_app.app.persistence import PersistenciaAsync, PersistenciaMemoria
+from help_app.app.perfil_store import PerfilStoreJSON
+from help_app.app.perfil_store_async import PerfilStoreAsync
+from help_app.app.pipeline import PipelineCompleto
+from help_app.app.servidor import ServidorHTTP
+from help_app.app.shards import AnelConsistente, ClienteWorker, DespachanteHTTP, PoolWorkers, chave_utilizador
+
+
+DADOS = {"feliz": {str(i): [f"feliz {i} n{j}" for j in range(5)] for i in range(1, 6)}}
+
+
+class TestServidorHTTP(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        base = Path(self.tmp.name)
+        (base / "mensagens.json").write_text(json.dumps(DADOS), encoding="utf-8")
+        catalogo = CatalogoMensagens(base / "mensagens.json")
+        self.executor = ExecutorLimitado(max_workers=2)
+        app = AsyncHelpApp(
+            PipelineCompleto(),
+            HistoricoAsync(PersistenciaAsync(PersistenciaMemoria(maximo=10), self.executor)),
+            store=PerfilStoreAsync(PerfilStoreJSON(base / "perfis"), self.executor),
+            criar_mensagem=lambda perfil: MensagemCatalogoSemRepeticao(catalogo, perfil),
+            executor=self.executor,
+        )
+        self.servidor = ServidorHTTP(app, catalogo.estados(), port=0)
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.servidor.iniciar())
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.servidor.fechar(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.executor.fechar()
+        self.tmp.cleanup()
+
+    def _pedido(self, conn, metodo, rota, corpo=None):
+        conn.request(metodo, rota, body=json.dumps(corpo) if corpo is not None else None,
+                     headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+
+    def test_sessoes_na_mesma_ligacao(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.servidor.port, timeout=5)
+        for i in range(5):
+            status, dados = self._pedido(conn, "POST", "/sessao", {"nome": "Micael", "estado": "feliz"})
+            self.assertEqual(status, 200)
+            self.assertEqual(dados["total_sessoes"], i + 1)
+            self.assertTrue(dados["mensagem"].startswith("feliz"))
+
+        status, dados = self._pedido(conn, "GET", "/historico?nome=micael&n=3")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(dados["historico"]), 3)
+
+        status, stats = self._pedido(conn, "GET", "/stats")
+        self.assertEqual(stats["ligacoes"], 1)
+        self.assertEqual(stats["reutilizacoes_keep_alive"], 6)
+        self.assertEqual(stats["por_rota"]["/sessao"], 5)
+        conn.close()
+
+    def test_erros(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.servidor.port, timeout=5)
+        self.assertEqual(self._pedido(conn, "POST", "/sessao", {"nome": "x", "estado": "nada"})[0], 400)
+        self.assertEqual(self._pedido(conn, "GET", "/sessao")[0], 405)
+        self.assertEqual(self._pedido(conn, "GET", "/naoexiste")[0], 404)
+        # histórico de quem nunca fez uma sessão: 404 e nenhum perfil criado
+        self.assertEqual(self._pedido(conn, "GET", "/historico?nome=Fantasma")[0], 404)
+        self.assertFalse(list((Path(self.tmp.name) / "perfis").glob("fantasma*")))
+        # a ligação continua utilizável depois de erros nas rotas
+        self.assertEqual(self._pedido(conn, "GET", "/saude"), (200, {"ok": True}))
+        conn.close()
+
+
+class TestShards(unittest.TestCase):
+    def test_anel_estavel_e_equilibrado(self):
+        anel = AnelConsistente(range(4))
+        chaves = [f"utilizador{i}" for i in range(4000)]
+        donos = [anel.dono(c) for c in chaves]
+        outro = AnelConsistente(range(4))
+        self.assertEqual(donos, [outro.dono(c) for c in chaves])
+        for no in range(4):
+            self.assertGreater(donos.count(no), 600)
+
+        # com um nó a mais, só mudam as chaves que passam para o nó novo
+        maior = AnelConsistente(range(5))
+        novos = [maior.dono(c) for c in chaves]
+        mudaram = [n for a, n in zip(donos, novos) if n != a]
+        self.assertTrue(all(n == 4 for n in mudaram))
+        self.assertLess(len(mudaram), 4000 * 0.3)
+
+    def test_chave_igual_ao_store(self):
+        self.assertEqual(chave_utilizador("  Micaél "), "micael")
+
+    def test_despachante_encaminha_para_o_dono(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            (base / "mensagens.json").write_text(json.dumps(DADOS), encoding="utf-8")
+            pool = PoolWorkers(2, base / "mensagens.json", base / "perfis", workers_io=1)
+            portas = pool.iniciar()
+            try:
+                async def correr():
+                    desp = DespachanteHTTP(portas, port=0)
+                    await desp.iniciar()
+                    nomes = [f"User{i}" for i in range(8)]
+                    for _ in range(3):
+                        for n in nomes:
+                            res = await desp._sessao({}, json.dumps({"nome": n, "estado": "feliz"}).encode())
+                            self.assertEqual(res.status, 200)
+                    hist = (await desp._historico({"nome": "user3", "n": "10"}, b"")).dados
+                    stats = await desp._stats({}, b"")
+                    await desp.fechar()
+                    return desp, json.loads(hist), stats
+
+                desp, hist, stats = asyncio.run(correr())
+            finally:
+                pool.parar()
+
+            self.assertEqual(len(hist["historico"]), 3)
+            self.assertEqual(sum(stats["por_worker"]), 25)
+            # cada utilizador só foi tratado pelo seu worker
+            sessoes = [w["por_rota"].get("/sessao", 0) for w in stats["workers"]]
+            esperado = [0, 0]
+            for i in range(8):
+                esperado[desp.worker_de(f"User{i}")] += 3
+            self.assertEqual(sessoes, esperado)
+
+    def test_modos_de_catalogo(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            (base / "mensagens.json").write_text(json.dumps(DADOS), encoding="utf-8")
+            for modo in ("fork", "shm"):
+                with self.subTest(modo=modo):
+                    pool = PoolWorkers(2, base / "mensagens.json", base / "perfis", workers_io=1, modo_catalogo=modo)
+                    portas = pool.iniciar()
+                    try:
+                        async def correr():
+                            respostas = []
+                            for porta in portas:
+                                c = ClienteWorker("127.0.0.1", porta)
+                                corpo = json.dumps({"nome": f"{modo}{porta}", "estado": "feliz"}).encode()
+                                respostas.append(await c.pedido("POST", "/sessao", corpo))
+                                c.fechar()
+                            return respostas
+
+                        respostas = asyncio.run(correr())
+                    finally:
+                        pool.parar()
+                    for status, corpo in respostas:
+                        self.assertEqual(status, 200)
+                        self.assertTrue(json.loads(corpo)["mensagem"].startswith("feliz"))
+
+        with self.assertRaises(ValueError):
+            PoolWorkers(2, "x.json", "perfis", modo_catalogo="fork", recarregar=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
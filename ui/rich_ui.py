@@ -1,18 +1,34 @@
 # ui/rich_ui.py
 from __future__ import annotations
 
-from typing import Any, Iterable, Optional, Sequence
+from typing import Any, Callable, Iterable, Optional, Sequence
 from datetime import datetime
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
-from rich.prompt import Prompt, Confirm
-from rich.text import Text
-from rich.align import Align
+# o rich só é importado no primeiro render (import do módulo fica barato no arranque)
+_console = None
 
 
-console = Console()
+def _consola() -> Any:
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+def __getattr__(nome: str) -> Any:
+    # `from ui.rich_ui import console` continua a funcionar, mas cria a Console só aí
+    if nome == "console":
+        return _consola()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+def precarregar() -> None:
+    """
+    Importa os módulos do rich usados pelos menus/tabelas (para correr numa thread em fundo).
+    """
+    import rich.align, rich.console, rich.panel, rich.prompt, rich.table, rich.text  # noqa: F401
 
 
 # -------------------------
@@ -48,33 +64,38 @@ def _safe_str(x: Any) -> str:
 # UI básica
 # -------------------------
 def mostrar_cabecalho(titulo: str = "Help!", subtitulo: str = "A sua app de estados de espírito") -> None:
+    from rich.panel import Panel
+    from rich.text import Text
+
     text = Text()
     text.append(titulo, style="bold cyan")
     text.append("\n")
     text.append(subtitulo, style="dim")
-    console.print(Panel(text, border_style="cyan", expand=False))
+    _consola().print(Panel(text, border_style="cyan", expand=False))
 
 
 def mostrar_info(msg: str) -> None:
-    console.print(f"[cyan]ℹ[/cyan] {_safe_str(msg)}")
+    _consola().print(f"[cyan]ℹ[/cyan] {_safe_str(msg)}")
 
 
 def mostrar_sucesso(msg: str) -> None:
-    console.print(f"[green]✅[/green] {_safe_str(msg)}")
+    _consola().print(f"[green]✅[/green] {_safe_str(msg)}")
 
 
 def mostrar_aviso(msg: str) -> None:
-    console.print(f"[yellow]⚠[/yellow] {_safe_str(msg)}")
+    _consola().print(f"[yellow]⚠[/yellow] {_safe_str(msg)}")
 
 
 def mostrar_erro(msg: str) -> None:
-    console.print(f"[bold red]✖[/bold red] {_safe_str(msg)}")
+    _consola().print(f"[bold red]✖[/bold red] {_safe_str(msg)}")
 
 
 # -------------------------
 # Inputs (Prompt)
 # -------------------------
 def pedir_nome(default: str = "utilizador") -> str:
+    from rich.prompt import Prompt
+
     nome = Prompt.ask("Olá! Qual o seu nome?", default=default).strip()
     return nome or default
 
@@ -96,6 +117,10 @@ def pedir_estado_com_emojis(
 
     Retorna o estado (ex: "ansioso").
     """
+    from rich.panel import Panel
+    from rich.prompt import Prompt
+    from rich.table import Table
+
     # layout em 2 colunas (3+3)
     items = [(k, v[0], v[1]) for k, v in sorted(mapa_opcoes.items(), key=lambda x: int(x[0]))]
     meio = (len(items) + 1) // 2
@@ -115,11 +140,11 @@ def pedir_estado_com_emojis(
         sep = "[dim]│[/dim]" if left and right else ""
         tabela.add_row(left, sep, right)
 
-    console.print(Panel(tabela, title=titulo, border_style="cyan", expand=False))
+    _consola().print(Panel(tabela, title=titulo, border_style="cyan", expand=False))
 
     extras = extras or {}
     if extras:
-        console.print("  " + "  |  ".join(f"[bold]{k.upper()}[/bold] {v}" for k, v in extras.items()))
+        _consola().print("  " + "  |  ".join(f"[bold]{k.upper()}[/bold] {v}" for k, v in extras.items()))
 
     escolhas = list(mapa_opcoes.keys()) + list(extras.keys())
     escolha = Prompt.ask("Escolha (1-6 ou H/Q)", choices=escolhas, default=default, show_choices=False)
@@ -128,11 +153,15 @@ def pedir_estado_com_emojis(
 
 # fallback para texto livre, caso queiras manter
 def pedir_estado_texto(default: str = "") -> str:
+    from rich.prompt import Prompt
+
     estado = Prompt.ask("Escreva o estado", default=default).strip()
     return estado
 
 
 def confirmar(pergunta: str) -> bool:
+    from rich.prompt import Prompt
+
     resp = Prompt.ask(
         f"{pergunta} [s/n]",
         choices=["s", "n"],
@@ -151,6 +180,10 @@ def mostrar_mensagem_final(
     frase: str,
     titulo: str = "Mensagem do dia",
 ) -> None:
+    from rich.align import Align
+    from rich.panel import Panel
+    from rich.text import Text
+
     # “aumentar” o texto duplicando linhas + espaçamento
     frase_grande = "\n\n".join([frase.upper()])
 
@@ -167,7 +200,7 @@ def mostrar_mensagem_final(
         width=70,
     )
 
-    console.print(painel)
+    _consola().print(painel)
 
 
 def mostrar_resumo_sessao(entrada: Any, frase: str) -> None:
@@ -175,6 +208,8 @@ def mostrar_resumo_sessao(entrada: Any, frase: str) -> None:
     Tenta apanhar nomes comuns:
       estado, intensidade, data/data_hora, utilizador/nome
     """
+    from rich.panel import Panel
+
     estado = _safe_str(_get(entrada, "estado"))
     intensidade = _get(entrada, "intensidade", default=3)
     data = _safe_str(_get(entrada, "data", "data_hora", "timestamp", default=""))
@@ -191,16 +226,24 @@ def mostrar_resumo_sessao(entrada: Any, frase: str) -> None:
         f"[bold]Intensidade:[/bold] {intensidade}/5\n\n"
         f"{frase}"
     )
-    console.print(Panel(corpo, title=header, border_style="magenta", expand=False))
+    _consola().print(Panel(corpo, title=header, border_style="magenta", expand=False))
 
 
-def mostrar_historico(entradas: Iterable[Any], titulo: str = "Histórico") -> None:
+def mostrar_historico(
+    entradas: Iterable[Any],
+    titulo: str = "Histórico",
+    resolver: Optional[Callable[[Any], str]] = None,
+) -> None:
     """
     Mostra histórico numa tabela.
     Cada entrada pode ser objeto ou dict.
     Campos tentados:
       data/data_hora/timestamp | estado | intensidade | mensagem/frase/texto
+    resolver(entrada) dá o texto das entradas que só têm o id da mensagem
+    (ex: ResolvedorMensagens.texto); só é chamado para as linhas mostradas.
     """
+    from rich.table import Table
+
     table = Table(title=titulo, show_lines=False)
 
     table.add_column("Data", style="dim", no_wrap=True)
@@ -222,6 +265,8 @@ def mostrar_historico(entradas: Iterable[Any], titulo: str = "Histórico") -> No
         estado = _safe_str(_get(e, "estado", default=""))
         intensidade = _safe_str(_get(e, "intensidade", default=""))
         msg = _safe_str(_get(e, "mensagem", "frase", "texto", default=""))
+        if not msg and resolver is not None:
+            msg = _safe_str(resolver(e))
 
         table.add_row(data, estado, intensidade, msg)
 
@@ -229,7 +274,7 @@ def mostrar_historico(entradas: Iterable[Any], titulo: str = "Histórico") -> No
         mostrar_aviso("Ainda não há histórico.")
         return
 
-    console.print(table)
+    _consola().print(table)
 
 
 # -------------------------
@@ -239,12 +284,15 @@ def mostrar_menu(opcoes: Sequence[str], titulo: str = "Menu", default: Optional[
     """
     Menu simples: devolve a opção escolhida (string).
     """
+    from rich.panel import Panel
+    from rich.prompt import Prompt
+
     if not opcoes:
         raise ValueError("menu sem opções")
 
     if default is None:
         default = opcoes[0]
 
-    console.print(Panel("\n".join(f"- {o}" for o in opcoes), title=titulo, border_style="blue", expand=False))
+    _consola().print(Panel("\n".join(f"- {o}" for o in opcoes), title=titulo, border_style="blue", expand=False))
     escolha = Prompt.ask("Escolhe", choices=list(opcoes), default=default, show_choices=False)
     return escolha